@@ -11,7 +11,9 @@ warnings.filterwarnings("ignore")
 import os
 import json
 import time
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional, Union
 
 from dotenv import load_dotenv
 import httpx
@@ -23,10 +25,29 @@ from typing_extensions import TypedDict
 
 # ==================== 工具导入 ====================
 from tools.equipment_depreciation_tool import EquipmentDepreciationTool
-from tools.production_volume_tool import ProductionVolumeTool
+from tools.production_volume_tool import ProductionVolumeTool, volume_tier
 from tools.energy_cost_tool import EnergyCostTool
 from tools.labor_cost_tool import LaborCostTool
-from tools.drawing_parser_tool import DrawingParserTool
+from tools.material_price_tool import MaterialCostTool
+from tools.drawing_parser_tool import DrawingParserTool, file_sha256
+from tools.step_geometry import group_by_fingerprint, iter_step_solids
+from tools.region_rates import resolve_location
+from tools.process_catalog import get_process_catalog
+from tools.consensus import collect_consensus
+from tools.circuit_breaker import collect_fallbacks
+from tools.deadline import deadline_scope, min_call_seconds
+from agent_types import (
+    COST_DIMENSIONS, AssemblyPart, AssemblyReport, CostCell, QuoteDiff, QuoteReport, stale_dimensions,
+)
+from cost_planner import CostPlan, CostPlanner, DimensionMemo, PlanStep
+from tool_cache import ToolResultCache, cache_key
+from llm_pool import LLMPool, build_llm_pool
+from storage.quote_store import get_quote_store
+from storage.geometry_index import get_geometry_index
+from storage.neighbor_index import QuoteNeighborIndex
+from storage.columnar import ResultTableWriter
+from storage.checkpoint import CellLedger, open_checkpointer
+from profiling import profile_run
 
 # ==================== 环境与代理 ====================
 load_dotenv()
@@ -34,6 +55,29 @@ load_dotenv()
 # 可选：一键关闭外部联网工具（如果后续新增了会出网的工具）
 AGENT_OFFLINE = os.getenv("AGENT_OFFLINE", "false").lower() == "true"
 
+# 每次报价写入历史报价库（路径见 QUOTE_STORE_PATH）
+QUOTE_STORE_ENABLED = os.getenv("QUOTE_STORE_ENABLED", "true").lower() == "true"
+
+# 图纸几何索引：改名/重新导出的已知图纸直接复用解析结果与历史报价
+GEOMETRY_INDEX_ENABLED = os.getenv("GEOMETRY_INDEX_ENABLED", "true").lower() == "true"
+
+# 相似零件近邻复用：近邻结果一致时直接复用，不再调用 LLM
+REUSE_ENABLED = os.getenv("REUSE_ENABLED", "true").lower() == "true"
+REUSE_K = int(os.getenv("REUSE_K", "3"))
+REUSE_TOLERANCE = float(os.getenv("REUSE_TOLERANCE", "0.05"))
+REUSE_MAX_DISTANCE = float(os.getenv("REUSE_MAX_DISTANCE", "0.1"))
+
+# 成本维度调用计划：按工艺目录规则跳过不必要的 LLM 调用（静态值/本地计算/记忆复用）
+PLANNER_ENABLED = os.getenv("PLANNER_ENABLED", "true").lower() == "true"
+# 维度记忆跨请求复用（关闭后同一请求内仍只调用一次；压测冷路径时关闭）
+PLANNER_MEMO_ENABLED = os.getenv("PLANNER_MEMO_ENABLED", "true").lower() == "true"
+
+# 工具结果缓存：按 (维度, 工艺, 地点, 产量档位) 缓存 LLM 结果，服务启动后可后台预热（见 warmup.py）
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+
+# 是否把成本分解/最终报告以 JSON 消息写入 messages（调试用；结果本身走 report 通道）
+AGENT_EMIT_MESSAGES = os.getenv("AGENT_EMIT_MESSAGES", "false").lower() == "true"
+
 # 代理三选一：PROXY_URL > HTTPS_PROXY > HTTP_PROXY
 _proxy = os.getenv("PROXY_URL") or os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
 _proxies = {"http": _proxy, "https": _proxy} if _proxy else None
@@ -50,57 +94,312 @@ if _no_proxy:
 _http_client = httpx.Client(timeout=30.0)
 
 # ==================== 模型初始化（与示例一致） ====================
-llm = AzureChatOpenAI(
-    deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-5"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview"),
-    temperature=1.0,
-    http_client=_http_client,  # 关键：确保与简单测试同一路径出网
-)
+# 配置 LLM_POOL_CONFIG 时，成本工具改走多端点 LLM 池（见 llm_pool.py），接口相同
+LLM_POOL_CONFIG = os.getenv("LLM_POOL_CONFIG")
+if LLM_POOL_CONFIG:
+    llm = build_llm_pool(LLM_POOL_CONFIG, temperature=1.0, http_client=_http_client)
+else:
+    llm = AzureChatOpenAI(
+        deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-5"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview"),
+        temperature=1.0,
+        http_client=_http_client,  # 关键：确保与简单测试同一路径出网
+    )
 
 # ==================== 工具注册 ====================
 equipment_tool = EquipmentDepreciationTool(llm).as_tool()
 volume_tool    = ProductionVolumeTool(llm).as_tool()
 energy_tool    = EnergyCostTool(llm).as_tool()
 labor_tool     = LaborCostTool(llm).as_tool()
+material_tool  = MaterialCostTool(offline=AGENT_OFFLINE).as_tool()
 drawing_tool   = DrawingParserTool().as_tool()
 
-# 如果你后续有联网工具，这里可以基于 AGENT_OFFLINE 选择性注入
+def use_llm(new_llm) -> None:
+    """
+    替换成本工具使用的 LLM（压测替身、多端点池等）
+
+    图纸解析与原材料工具不依赖 LLM，不受影响：原材料价格仍联网抓取，
+    压测等场景需在导入 agent 前设置 AGENT_OFFLINE=true 关闭。
+    """
+    for tool in (equipment_tool, volume_tool, energy_tool, labor_tool):
+        tool.func.__self__.llm = new_llm
+
+# 如果你后续有联网工具，这里可以基于 AGENT_OFFLINE 选择性注入；
+# 搜索类工具（TavilySearch 等）先用 tools.search_cache.cached_search_tool() 包装，共享搜索结果缓存
 tools = [
     drawing_tool,      # 图纸解析（本地）
     equipment_tool,    # 设备折旧（走同一 LLM）
     volume_tool,       # 产量影响（走同一 LLM）
     energy_tool,       # 能源成本（走同一 LLM）
     labor_tool,        # 人工成本（走同一 LLM）
+    material_tool,     # 原材料价格（联网抓取；AGENT_OFFLINE=true 时用兜底价格）
 ]
 
 # ==================== State 定义 ====================
 class AgentState(TypedDict):
     messages: List[BaseMessage]
     drawing_data: Optional[Dict[str, Any]]
+    drawing_hash: Optional[str]
     production_volume: Optional[int]
     location: Optional[str]
+    region: Optional[Dict[str, Any]]
     process_type: Optional[str]
-    cost_breakdown: Optional[Dict[str, Any]]
+    processes: Optional[List[str]]
+    plan: Optional[CostPlan]
+    cost_breakdown: Optional[Dict[str, CostCell]]
+    report: Optional[QuoteReport]
+    emit_messages: bool
+    thread_id: Optional[str]
+    deadline: Optional[float]       # 截止时刻（epoch 秒），None 表示不限时
+    partial: bool                   # 截止时间已到，部分单元为兜底值
+    material_as_of: Optional[str]   # 原材料按该日价格计价（None 为当前价格）
+    diff: Optional[Dict[str, Any]]  # requote：相对上一次报价的差异
+
+# ==================== 近邻复用索引 ====================
+_neighbor_index: Optional[QuoteNeighborIndex] = None
+_neighbor_index_lock = threading.Lock()
+
+def get_neighbor_index() -> QuoteNeighborIndex:
+    """首次使用时从历史报价库构建近邻索引，之后随新报价增量更新"""
+    global _neighbor_index
+    with _neighbor_index_lock:
+        if _neighbor_index is None:
+            kwargs = dict(k=REUSE_K, max_distance=REUSE_MAX_DISTANCE, tolerance=REUSE_TOLERANCE)
+            try:
+                _neighbor_index = (
+                    QuoteNeighborIndex.from_store(get_quote_store(), **kwargs)
+                    if QUOTE_STORE_ENABLED else QuoteNeighborIndex(**kwargs)
+                )
+            except Exception as e:
+                print(f"⚠️ 近邻索引加载失败: {e}")
+                _neighbor_index = QuoteNeighborIndex(**kwargs)
+    return _neighbor_index
+
+# ==================== 调用计划 ====================
+_cost_planner: Optional[CostPlanner] = None
+_cost_planner_lock = threading.Lock()
+
+def get_cost_planner() -> CostPlanner:
+    """进程内共享的计划器（维度记忆跨请求复用）"""
+    global _cost_planner
+    with _cost_planner_lock:
+        if _cost_planner is None:
+            _cost_planner = CostPlanner(get_process_catalog(), DimensionMemo(enabled=PLANNER_MEMO_ENABLED),
+                                        enabled=PLANNER_ENABLED)
+    return _cost_planner
+
+# ==================== 工具结果缓存 ====================
+_tool_cache: Optional[ToolResultCache] = None
+_tool_cache_lock = threading.Lock()
+
+def get_tool_cache() -> Optional[ToolResultCache]:
+    """进程内共享的工具结果缓存（TOOL_CACHE_ENABLED=false 时为 None）"""
+    global _tool_cache
+    if not TOOL_CACHE_ENABLED:
+        return None
+    with _tool_cache_lock:
+        if _tool_cache is None:
+            _tool_cache = ToolResultCache(max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "10000")))
+    return _tool_cache
+
+def _tool_call(dimension: str, process: str, location: str, volume: int,
+               drawing_data: Dict[str, Any], as_of: Optional[str] = None):
+    """各成本维度对应的工具与参数（各工具使用的输入见 agent_types.DIMENSION_INPUTS）"""
+    if dimension == "equipment_depreciation":
+        # 1. 设备折旧
+        return equipment_tool, {"process": process, "volume": volume}
+    if dimension == "energy":
+        # 2. 能源成本
+        return energy_tool, {
+            "process": process,
+            "location": location,
+            "surface_area": drawing_data.get("surface_area"),
+            "volume": drawing_data.get("volume")
+        }
+    if dimension == "labor":
+        # 3. 人工成本
+        return labor_tool, {"process": process, "location": location, "volume": volume}
+    if dimension == "material":
+        # 5. 原材料（合金牌号取图纸数据，缺省见 MATERIAL_ALLOY）
+        args = {"process": process, "alloy": drawing_data.get("alloy")}
+        if as_of:
+            args["as_of"] = as_of
+        return material_tool, args
+    # 4. 产量调整
+    return volume_tool, {"process": process, "volume": volume}
+
+def _refresher(dimension: str, process: str, location: str, volume: int,
+               drawing_data: Optional[Dict[str, Any]], as_of: Optional[str] = None):
+    """缓存条目过期（软 TTL）后的后台重新估算函数"""
+    def refresh() -> float:
+        tool, args = _tool_call(dimension, process, location, volume, drawing_data or {}, as_of)
+        with collect_fallbacks() as fallbacks:
+            value = _num(tool.invoke(args))
+        if fallbacks:
+            # 兜底值不写回缓存，保留旧值
+            raise RuntimeError(fallbacks[-1])
+        return value
+    return refresh
+
+def warm_cell(process: str, dimension: str, location: str, volume: int) -> Optional[float]:
+    """
+    预热单个缓存单元（无几何）；已缓存或计划中无需调用 LLM 时直接返回
+
+    Returns:
+        缓存中的值；不需要缓存的维度返回 None
+    """
+    cache = get_tool_cache()
+    region = resolve_location(location)
+    step = get_cost_planner().plan([process], volume, region).step(process, dimension)
+    if cache is None or step.mode != "llm":
+        return step.value
+    key = cache_key(dimension, process, region.canonical, volume)
+    value = cache.get(key)
+    if value is None:
+        tool, args = _tool_call(dimension, process, location, volume, {})
+        with collect_fallbacks() as fallbacks:
+            value = _num(tool.invoke(args))
+        if fallbacks:
+            raise RuntimeError(fallbacks[-1])
+        cache.put(key, value)
+        if step.memo_key is not None:
+            get_cost_planner().memo.put(step.memo_key, value)
+    return value
+
+# ==================== 持久化检查点 ====================
+_cell_ledger: Optional[CellLedger] = None
+_checkpointed_agent = None
+_checkpoint_lock = threading.Lock()
+
+def get_cell_ledger() -> CellLedger:
+    global _cell_ledger
+    with _checkpoint_lock:
+        if _cell_ledger is None:
+            _cell_ledger = CellLedger()
+    return _cell_ledger
+
+def get_checkpointed_agent():
+    """带 SQLite checkpointer 的图（首次使用时编译，路径见 AGENT_CHECKPOINT_PATH）"""
+    global _checkpointed_agent
+    with _checkpoint_lock:
+        if _checkpointed_agent is None:
+            _checkpointed_agent = workflow.compile(checkpointer=open_checkpointer())
+    return _checkpointed_agent
 
 # ==================== 节点函数 ====================
+def _extract_processes(text: str) -> List[str]:
+    """从用户消息中提取需要估算的工艺列表（工艺目录 + 多模式匹配，未提及时取默认工艺）"""
+    return get_process_catalog().extract(text)
+
 def parse_input_node(state: AgentState) -> AgentState:
     """解析用户输入，提取关键信息"""
     messages = state.get("messages", [])
-    _ = messages[-1].content if messages else ""
+    text = messages[-1].content if messages else ""
 
     volume = state.get("production_volume") or int(os.getenv("DEFAULT_PRODUCTION_VOLUME", "1100000"))
     location = state.get("location") or os.getenv("DEFAULT_LOCATION", "Ningbo, Zhejiang")
+    # 地点解析走本地费率表（微秒级），不占用 LLM 推理
+    region = resolve_location(location)
 
-    print(f"📋 解析输入 - 产量: {volume:,}, 地点: {location}")
+    print(f"📋 解析输入 - 产量: {volume:,}, 地点: {location} → {region.display}")
 
     return {
         **state,
         "production_volume": volume,
         "location": location,
+        "region": region.to_dict(),
+        "processes": _extract_processes(text),
     }
 
+def reuse_node(state: AgentState) -> AgentState:
+    """历史复用：同一几何（指纹一致）的历史报价或相似历史报价一致时直接给出结果，仅新颖的工艺进入 execution"""
+    if not REUSE_ENABLED:
+        return state
+
+    drawing_data = state.get("drawing_data") or {}
+    location = (state.get("region") or {}).get("canonical")
+    cost_breakdown: Dict[str, CostCell] = dict(state.get("cost_breakdown") or {})
+
+    # 几何指纹完全一致（同一零件的改名/重新导出图纸）：直接取同地点、同产量档位的最新报价
+    fingerprint = drawing_data.get("fingerprint")
+    if fingerprint and QUOTE_STORE_ENABLED:
+        try:
+            previous = get_quote_store().latest(
+                geometry_fingerprint=fingerprint, location=location,
+                volume_bucket=volume_tier(state["production_volume"]),
+            )
+        except Exception as e:
+            print(f"⚠️ 历史报价查询失败: {e}")
+            previous = None
+        # 早于原材料维度的历史报价缺少 material，不复用
+        for process, data in ((previous or {}).get("processes") or {}).items():
+            if process in (state.get("processes") or []) and process not in cost_breakdown and "error" not in data \
+                    and not data.get("degraded") and all(d in data for d in COST_DIMENSIONS):
+                cell = CostCell.from_dict(process, data)
+                cell.source, cell.neighbors = "reused", [previous["quote_id"]]
+                cost_breakdown[process] = cell
+                print(f"♻️ {process}: 同一几何的历史报价 #{previous['quote_id']} → {cell.total:.2f} CNY/kg")
+
+    index = get_neighbor_index()
+    for process in state.get("processes") or []:
+        if process in cost_breakdown:
+            continue
+        match = index.lookup(
+            process, location, state.get("production_volume"),
+            drawing_data.get("surface_area"), drawing_data.get("volume"),
+        )
+        if match is None:
+            continue
+        cost_breakdown[process] = CostCell.from_costs(
+            process,
+            *(match.cell[d] for d in COST_DIMENSIONS),
+            source="reused", neighbors=match.neighbors,
+        )
+        print(f"♻️ {process}: 复用 {len(match.neighbors)} 个相似历史报价 "
+              f"(差异 {match.spread:.1%}) → {match.cell['total']:.2f} CNY/kg")
+
+    return {**state, "cost_breakdown": cost_breakdown}
+
+def plan_node(state: AgentState) -> AgentState:
+    """为每个 (工艺, 成本维度) 决定调用 LLM、取静态/本地计算值，还是复用记忆结果"""
+    processes = state.get("processes") or []
+    region = resolve_location(state["location"])
+    plan = get_cost_planner().plan(
+        processes,
+        state["production_volume"],
+        region,
+        reused=[p for p in (state.get("cost_breakdown") or {}) if p in processes],
+    )
+    _use_cached(plan, region, state["production_volume"], state.get("drawing_data"), state.get("material_as_of"))
+    print(f"🧭 调用计划: {plan.summary()}")
+    return {**state, "plan": plan}
+
+def _use_cached(plan: CostPlan, region, volume: int, drawing_data: Optional[Dict[str, Any]],
+                as_of: Optional[str] = None) -> None:
+    """缓存（含预热结果）已有的单元不再调用 LLM；过期未超硬 TTL 的先用旧值，后台刷新"""
+    cache = get_tool_cache()
+    if cache is None:
+        return
+    for process, dims in plan.steps.items():
+        for dimension, step in dims.items():
+            if not step.calls_tool:
+                continue
+            value = cache.get(
+                cache_key(dimension, process, region.canonical, volume, drawing_data, as_of),
+                refresh=_refresher(dimension, process, region.canonical, volume, drawing_data, as_of),
+            )
+            if value is not None:
+                step.mode, step.value = "cached", value
+
+def _num(x) -> float:
+    # 兜底：各工具应返回数值；若不是数值则按 0 处理，避免进一步错误
+    try:
+        return float(x)
+    except Exception:
+        return 0.0
+
 def execution_node(state: AgentState) -> AgentState:
     """执行工具调用"""
     messages = state["messages"]
@@ -108,111 +407,146 @@ def execution_node(state: AgentState) -> AgentState:
     location = state["location"]
     # 关键修复：保证是 dict，而不是 None，避免 .get 报错
     drawing_data = state.get("drawing_data") or {}
-
-    # 从用户消息中提取需要估算的工艺列表
-    last_message = messages[-1].content.lower()
-    all_processes = ["melting", "casting", "machining", "inspection"]
-
-    processes = [p for p in all_processes if p in last_message]
-    if not processes:
-        processes = all_processes
-
-    if "op" in last_message or "machining" in last_message:
-        if "machining" not in processes:
-            processes.append("machining")
-
-    cost_breakdown: Dict[str, Any] = {}
-
+    as_of = state.get("material_as_of")
+
+    processes = state.get("processes") or _extract_processes(messages[-1].content)
+
+    # 已由 reuse 节点复用的工艺不再调用工具
+    cost_breakdown: Dict[str, CostCell] = dict(state.get("cost_breakdown") or {})
+
+    # 启用检查点时：已完成的 (工艺, 维度) 单元直接取记录值，每完成一个单元立即落盘
+    thread_id = state.get("thread_id")
+    ledger = get_cell_ledger() if thread_id else None
+    done = ledger.completed(thread_id) if ledger else {}
+    if done:
+        print(f"⏩ 从检查点恢复 {len(done)} 个已完成的成本单元")
+
+    # 多样本共识模式（LLM_CONSENSUS_N > 1）下各单元的中位数与离散度
+    spreads: Dict[tuple, Dict[str, Any]] = {}
+    # 使用兜底值的单元：不写入检查点 / 记忆 / 缓存，报告中标记为 degraded
+    degraded: set = set()
+
+    def _invoke(process: str, dimension: str, tool, args: Dict[str, Any]):
+        if (process, dimension) in done:
+            return done[(process, dimension)]
+        with collect_consensus() as samples, collect_fallbacks() as fallbacks:
+            value = tool.invoke(args)
+        if samples:
+            spreads[(process, dimension)] = samples[-1].to_dict()
+        if fallbacks:
+            degraded.add((process, dimension))
+            return value
+        if ledger is not None:
+            try:
+                ledger.record(thread_id, process, dimension, float(value))
+            except (TypeError, ValueError):
+                pass
+        return value
+
+    # 按计划取值：计划阶段已确定的值直接使用；记忆未命中（如首个调用失败）时退回 LLM
+    plan: CostPlan = state.get("plan") or CostPlan()
+    memo = get_cost_planner().memo
+    shared: Dict[str, float] = {}      # 本次请求内的记忆结果（跨请求记忆关闭时同样生效）
+    cache = get_tool_cache()
+    canonical = (state.get("region") or {}).get("canonical")
+
+    def _value(process: str, dimension: str, tool, args: Dict[str, Any]) -> float:
+        step = plan.step(process, dimension)
+        if step.value is not None:
+            return step.value
+        if step.mode == "memo":
+            value = shared.get(step.memo_key)
+            if value is None:
+                value = memo.get(step.memo_key)
+            if value is not None:
+                return value
+        value = _num(_invoke(process, dimension, tool, args))
+        if (process, dimension) in degraded:
+            return value
+        if step.memo_key is not None:
+            shared[step.memo_key] = value
+            memo.put(step.memo_key, value)
+        if cache is not None:
+            cache.put(cache_key(dimension, process, canonical, volume, drawing_data, as_of), value)
+        return value
+
+    # 截止时间传给工具内的每次 LLM 调用；到点后剩余单元直接走兜底值
+    deadline = state.get("deadline")
     for process in processes:
+        if process in cost_breakdown:
+            continue
         print(f"\n⚙️ 正在估算 {process} 工艺成本...")
         try:
-            # 1. 设备折旧
-            equip_cost = equipment_tool.invoke({
-                "process": process,
-                "volume": volume
-            })
-
-            # 2. 能源成本
-            energy_cost = energy_tool.invoke({
-                "process": process,
-                "location": location,
-                "surface_area": drawing_data.get("surface_area"),
-                "volume": drawing_data.get("volume")
-            })
-
-            # 3. 人工成本
-            labor_cost = labor_tool.invoke({
-                "process": process,
-                "location": location,
-                "volume": volume
-            })
-
-            # 4. 产量调整
-            volume_impact = volume_tool.invoke({
-                "process": process,
-                "volume": volume
-            })
-
-            # 兜底：各工具应返回数值；若不是数值则按 0 处理，避免进一步错误
-            def _num(x): 
-                try:
-                    return float(x)
-                except Exception:
-                    return 0.0
-
-            equip_cost_f   = _num(equip_cost)
-            energy_cost_f  = _num(energy_cost)
-            labor_cost_f   = _num(labor_cost)
-            volume_imp_f   = _num(volume_impact)
-
-            total = equip_cost_f + energy_cost_f + labor_cost_f + volume_imp_f
-
-            cost_breakdown[process] = {
-                "equipment_depreciation": round(equip_cost_f, 6),
-                "energy": round(energy_cost_f, 6),
-                "labor": round(labor_cost_f, 6),
-                "volume_adjustment": round(volume_imp_f, 6),
-                "total": round(total, 2),
-            }
-
-            print(f"✅ {process}: {total:.2f} CNY/kg")
+            # 设备折旧 / 能源 / 人工 / 产量调整 / 原材料（顺序同 COST_DIMENSIONS）
+            with deadline_scope(deadline):
+                costs = [
+                    _value(process, dimension, *_tool_call(dimension, process, location, volume, drawing_data, as_of))
+                    for dimension in COST_DIMENSIONS
+                ]
+            consensus = {d: spreads[(process, d)] for d in COST_DIMENSIONS if (process, d) in spreads}
+            fallback = [d for d in COST_DIMENSIONS if (process, d) in degraded]
+            cell = CostCell.from_costs(process, *costs, consensus=consensus or None, degraded=fallback or None)
+            cost_breakdown[process] = cell
+
+            print(f"✅ {process}: {cell.total:.2f} CNY/kg")
 
         except Exception as e:
             # 发生异常时，写入结构化错误，避免后续格式化节点再抛异常
             print(f"❌ {process} 估算失败: {e}")
-            cost_breakdown[process] = {"error": str(e)}
+            cost_breakdown[process] = CostCell.failed(process, str(e))
 
     state["cost_breakdown"] = cost_breakdown
-    state["messages"].append(
-        AIMessage(content=json.dumps(cost_breakdown, ensure_ascii=False, indent=2))
-    )
+    if deadline is not None and degraded and deadline - time.time() < min_call_seconds():
+        state["partial"] = True
+        print(f"⏱️ 截止时间已到：{len(degraded)} 个成本单元使用兜底值")
+    if state.get("emit_messages"):
+        state["messages"].append(AIMessage(content=json.dumps(
+            {p: c.to_dict() for p, c in cost_breakdown.items()}, ensure_ascii=False
+        )))
     return state
 
+def _index_new_cells(state: AgentState, quote_id: int) -> None:
+    """把本次实算（非复用）的成本单元加入近邻索引"""
+    index = get_neighbor_index()
+    drawing_data = state.get("drawing_data") or {}
+    location = (state.get("region") or {}).get("canonical")
+    for process, cell in (state.get("cost_breakdown") or {}).items():
+        if cell.reused or not cell.ok or cell.degraded:
+            continue
+        index.add(
+            process, location, cell.costs(), state.get("production_volume"),
+            drawing_data.get("surface_area"), drawing_data.get("volume"), ref=quote_id,
+        )
+
 def output_node(state: AgentState) -> AgentState:
     """格式化输出"""
-    cost_breakdown = state.get("cost_breakdown") or {}
-
-    total_cost = 0.0
-    for v in cost_breakdown.values():
-        if isinstance(v, dict) and "total" in v:
-            try:
-                total_cost += float(v.get("total", 0))
-            except Exception:
-                pass
+    report = QuoteReport(
+        location=state.get("location"),
+        production_volume=state.get("production_volume"),
+        processes=state.get("cost_breakdown") or {},
+        region=state.get("region"),
+        drawing_data=state.get("drawing_data"),
+        drawing_hash=state.get("drawing_hash"),
+        plan=state["plan"].to_dict() if state.get("plan") else None,
+        partial=bool(state.get("partial")),
+        material_as_of=state.get("material_as_of"),
+        diff=state.get("diff"),
+    )
+    output = report.to_dict()
 
-    output = {
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "location": state.get("location"),
-        "production_volume": state.get("production_volume"),
-        "unit": "CNY/kg",
-        "processes": cost_breakdown,
-        "total_cost": round(total_cost, 2),
-        "drawing_data": state.get("drawing_data"),
-    }
+    if QUOTE_STORE_ENABLED:
+        try:
+            query = state["messages"][0].content if state.get("messages") else None
+            report.quote_id = output["quote_id"] = get_quote_store().save(output, query=query)
+            if REUSE_ENABLED:
+                _index_new_cells(state, report.quote_id)
+        except Exception as e:
+            # 持久化失败不影响本次报价
+            print(f"⚠️ 报价入库失败: {e}")
 
-    state["messages"].append(
-        SystemMessage(content=json.dumps(output, ensure_ascii=False, indent=2))
-    )
+    state["report"] = report
+    if state.get("emit_messages"):
+        state["messages"].append(SystemMessage(content=json.dumps(output, ensure_ascii=False)))
 
     print("\n" + "="*60)
     print("📊 最终成本报告")
@@ -224,11 +558,15 @@ def output_node(state: AgentState) -> AgentState:
 # ==================== Graph 构建 ====================
 workflow = StateGraph(AgentState)
 workflow.add_node("parse_input", parse_input_node)
+workflow.add_node("reuse", reuse_node)
+workflow.add_node("plan", plan_node)
 workflow.add_node("execution", execution_node)
 workflow.add_node("output", output_node)
 
 workflow.add_edge(START, "parse_input")
-workflow.add_edge("parse_input", "execution")
+workflow.add_edge("parse_input", "reuse")
+workflow.add_edge("reuse", "plan")
+workflow.add_edge("plan", "execution")
 workflow.add_edge("execution", "output")
 workflow.add_edge("output", END)
 
@@ -239,8 +577,14 @@ def run_agent(
     query: str,
     drawing_path: Optional[str] = None,
     production_volume: Optional[int] = None,
-    location: Optional[str] = None
-) -> Dict[str, Any]:
+    location: Optional[str] = None,
+    as_report: bool = False,
+    emit_messages: Optional[bool] = None,
+    thread_id: Optional[str] = None,
+    profile: Optional[bool] = None,
+    drawing_data: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Union[Dict[str, Any], QuoteReport]:
     """
     运行 Agent
 
@@ -249,55 +593,314 @@ def run_agent(
         drawing_path: STP 图纸文件路径（可选）
         production_volume: 年产量（可选，默认从环境变量读取）
         location: 生产地点（可选，默认从环境变量读取）
+        as_report: 为 True 时直接返回 QuoteReport 对象（批量调用免去字典转换）
+        emit_messages: 是否把 JSON 结果写入 messages（默认取 AGENT_EMIT_MESSAGES）
+        thread_id: 可选，启用本地持久化检查点；同一 thread_id 重跑时从中断处继续，
+            已完成的成本单元不再调用 LLM，已完成的报价直接返回
+        profile: 是否输出性能剖析（cProfile / 折叠栈 / tracemalloc，见 profiling.py）；
+            默认取 AGENT_PROFILE
+        drawing_data: 可选，已解析好的几何（surface_area / volume），给出时不再解析 drawing_path
+        deadline: 可选，时间预算（秒）。剩余时间传给每次 LLM 调用，来不及完成的调用被取消，
+            未完成的单元走兜底值；此时报告带 partial=True 与 degraded_cells
 
     Returns:
-        包含成本分析结果的字典（与 simple_test.py 期待格式兼容）
+        包含成本分析结果的字典（与 simple_test.py 期待格式兼容），或 QuoteReport
     """
+    with profile_run(f"quote-{thread_id}" if thread_id else "quote", enabled=profile):
+        return _run_agent(query, drawing_path, production_volume, location, as_report, emit_messages,
+                          thread_id, drawing_data, None if deadline is None else time.time() + deadline)
+
+def _run_agent(
+    query: str,
+    drawing_path: Optional[str],
+    production_volume: Optional[int],
+    location: Optional[str],
+    as_report: bool,
+    emit_messages: Optional[bool],
+    thread_id: Optional[str],
+    drawing_data: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Union[Dict[str, Any], QuoteReport]:
     initial_state: AgentState = {
         "messages": [HumanMessage(content=query)],
         "drawing_data": None,
+        "drawing_hash": None,
         "production_volume": production_volume,
         "location": location,
+        "region": None,
         "process_type": None,
-        "cost_breakdown": None
+        "processes": None,
+        "plan": None,
+        "cost_breakdown": None,
+        "report": None,
+        "emit_messages": AGENT_EMIT_MESSAGES if emit_messages is None else emit_messages,
+        "thread_id": thread_id,
+        "deadline": deadline,
+        "partial": False,
+        "material_as_of": None,
+        "diff": None,
     }
 
+    graph = agent
+    config = None
+    if thread_id:
+        finished = get_cell_ledger().finished(thread_id)
+        if finished is not None:
+            print(f"⏩ 报价已完成，直接返回检查点结果: thread_id={thread_id}")
+            report = QuoteReport.from_dict(finished)
+            return report if as_report else report.to_dict()
+        graph = get_checkpointed_agent()
+        config = {"configurable": {"thread_id": thread_id}}
+        snapshot = graph.get_state(config)
+        if snapshot.next:
+            # 上次在图中途退出：从最后一个检查点继续
+            print(f"⏩ 从检查点继续: thread_id={thread_id}, 下一节点 {list(snapshot.next)}")
+            # 续跑使用本次调用的时间预算，而不是检查点里的旧截止时刻
+            graph.update_state(config, {"deadline": deadline})
+            return _finish_thread(graph, thread_id, graph.invoke(None, config), as_report)
+        if snapshot.values.get("report") is not None:
+            # 完成后、清理前退出：补做清理
+            return _finish_thread(graph, thread_id, snapshot.values, as_report)
+
     # 可选：解析图纸
-    if drawing_path and os.path.exists(drawing_path):
+    if drawing_data is not None:
+        initial_state["drawing_data"] = drawing_data
+    elif drawing_path and os.path.exists(drawing_path):
         print(f"📐 解析图纸: {drawing_path}")
         try:
-            drawing_data = drawing_tool.invoke({"file_path": drawing_path})
-            # 保证是 dict，后续 .get 不会报错
-            if not isinstance(drawing_data, dict):
-                drawing_data = {}
+            drawing_hash = initial_state["drawing_hash"] = file_sha256(drawing_path)
+            geometry_index = get_geometry_index() if GEOMETRY_INDEX_ENABLED else None
+            drawing_data = geometry_index.lookup_file(drawing_hash) if geometry_index else None
+            if drawing_data is not None:
+                print(f"♻️ 图纸内容已解析过，复用几何: {drawing_data.get('fingerprint')}")
+            else:
+                drawing_data = drawing_tool.invoke({"file_path": drawing_path})
+                # 保证是 dict，后续 .get 不会报错
+                if not isinstance(drawing_data, dict):
+                    drawing_data = {}
+                if geometry_index is not None and geometry_index.record(drawing_hash, drawing_data, drawing_path):
+                    print(f"♻️ 已知几何（改名或重新导出的图纸）: {drawing_data.get('fingerprint')}")
             initial_state["drawing_data"] = drawing_data
         except Exception as e:
             print(f"⚠️ 图纸解析失败: {e}")
 
-    result_state = agent.invoke(initial_state)
+    if thread_id:
+        return _finish_thread(graph, thread_id, graph.invoke(initial_state, config), as_report)
+    return _final_report(graph.invoke(initial_state, config), as_report)
 
-    # 返回一个与 simple_test 兼容的结构
-    # 如果你只想要最终输出，可以从 messages 的最后一个 SystemMessage 解析
+def _finish_thread(graph, thread_id: str, result_state: Dict[str, Any],
+                   as_report: bool) -> Union[Dict[str, Any], QuoteReport]:
+    """
+    报价完成：删除该 thread 的图检查点（检查点库不随批量运行无限增长）；
+    全部单元成功时只保留最终报告，否则保留单元记录，重跑时只补算失败/兜底的单元
+    """
+    report = _final_report(result_state, True)
+    if not report.partial and not report.degraded_cells and all(c.ok for c in report.processes.values()):
+        get_cell_ledger().finish(thread_id, report.to_dict())
     try:
-        final_msg = next(
-            (m for m in reversed(result_state["messages"]) if isinstance(m, SystemMessage)),
-            None
-        )
-        if final_msg and final_msg.content:
-            return json.loads(final_msg.content)
-    except Exception:
-        pass
+        graph.checkpointer.delete_thread(thread_id)
+    except Exception as e:
+        print(f"⚠️ 检查点清理失败: {e}")
+    return report if as_report else report.to_dict()
+
+def _final_report(result_state: Dict[str, Any], as_report: bool) -> Union[Dict[str, Any], QuoteReport]:
+    # 结果直接取 report 通道；兜底：按 cost_breakdown 构造
+    report = result_state.get("report") or QuoteReport(
+        location=result_state.get("location"),
+        production_volume=result_state.get("production_volume"),
+        processes=result_state.get("cost_breakdown") or {},
+        region=result_state.get("region"),
+        drawing_data=result_state.get("drawing_data"),
+        drawing_hash=result_state.get("drawing_hash"),
+    )
+    return report if as_report else report.to_dict()
 
-    # 兜底：构造最接近 simple_test 所需的结构
-    return {
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "location": result_state.get("location"),
-        "production_volume": result_state.get("production_volume"),
-        "unit": "CNY/kg",
-        "processes": result_state.get("cost_breakdown") or {},
-        "total_cost": 0,
-        "drawing_data": result_state.get("drawing_data"),
+# ==================== 增量重算 ====================
+REQUOTE_INPUTS = ("production_volume", "location", "drawing_data", "alloy", "material_as_of", "processes")
+
+def _geometry(drawing_data: Dict[str, Any]):
+    return drawing_data.get("surface_area"), drawing_data.get("volume")
+
+def requote(
+    previous: Union[Dict[str, Any], QuoteReport],
+    as_report: bool = False,
+    deadline: Optional[float] = None,
+    **changes: Any,
+) -> Union[Dict[str, Any], QuoteReport]:
+    """
+    增量重新报价：只重算输入变化影响到的成本单元，其余单元沿用上一次报价
+
+    失效范围由各维度声明的输入依赖决定（agent_types.DIMENSION_INPUTS）：只改产量时能源不重算，
+    只改地点时设备折旧、产量调整与原材料不重算。上一次报价中失败或使用兜底值的单元总是重算。
+
+    Args:
+        previous: 上一次报价（run_agent / requote 的结果，字典或 QuoteReport）
+        as_report: 为 True 时返回 QuoteReport 对象
+        deadline: 可选，时间预算（秒），同 run_agent
+        changes: 变化的输入：production_volume / location / drawing_data（几何，整体替换）/
+            alloy / material_as_of（原材料计价日期）/ processes（工艺列表，可增删）
+
+    Returns:
+        新报价（结构同 run_agent），diff 为相对上一次报价的差异（QuoteDiff.to_dict()）
+    """
+    unknown = set(changes) - set(REQUOTE_INPUTS)
+    if unknown:
+        raise ValueError(f"未知的报价输入: {', '.join(sorted(unknown))}")
+    before = previous if isinstance(previous, QuoteReport) else QuoteReport.from_dict(previous)
+
+    volume = changes.get("production_volume") or before.production_volume
+    location = changes.get("location") or before.location
+    region = resolve_location(location)
+    old_drawing = before.drawing_data or {}
+    drawing_data = dict(changes["drawing_data"] or {}) if "drawing_data" in changes else dict(old_drawing)
+    if changes.get("alloy"):
+        drawing_data["alloy"] = changes["alloy"]
+    as_of = changes.get("material_as_of", before.material_as_of)
+    processes = list(changes.get("processes") or before.processes)
+
+    # 变化的输入 → 失效的维度
+    changed = set()
+    if volume != before.production_volume:
+        changed.add("volume")
+    if region.canonical != ((before.region or {}).get("canonical") or resolve_location(before.location or location).canonical):
+        changed.add("location")
+    if _geometry(drawing_data) != _geometry(old_drawing):
+        changed.add("geometry")
+    if drawing_data.get("alloy") != old_drawing.get("alloy"):
+        changed.add("alloy")
+    if as_of != before.material_as_of:
+        changed.add("as_of")
+    stale = stale_dimensions(changed)
+    print(f"🔁 增量重算 - 变化: {', '.join(sorted(changed)) or '无'} → 失效维度: {', '.join(stale) or '无'}")
+
+    # 未失效的单元在计划中标记为 kept 并直接取旧值；整个工艺都未失效时原样沿用
+    plan = get_cost_planner().plan(processes, volume, region)
+    cost_breakdown: Dict[str, CostCell] = {}
+    recomputed: List[str] = []
+    for process in processes:
+        old = before.processes.get(process)
+        if old is None or not old.ok:
+            redo = set(COST_DIMENSIONS)
+        else:
+            redo = set(stale) | set(old.degraded or ())
+        if not redo:
+            cost_breakdown[process] = old
+        for dimension in COST_DIMENSIONS:
+            if dimension in redo:
+                recomputed.append(f"{process}.{dimension}")
+            else:
+                plan.steps[process][dimension] = PlanStep("kept", value=getattr(old, dimension))
+    _use_cached(plan, region, volume, drawing_data, as_of)
+    print(f"🧭 调用计划: {plan.summary()}")
+
+    state: AgentState = {
+        "messages": [HumanMessage(content=f"重新报价: {', '.join(processes)}")],
+        "drawing_data": drawing_data,
+        "drawing_hash": before.drawing_hash if "drawing_data" not in changes else None,
+        "production_volume": volume,
+        "location": location,
+        "region": region.to_dict(),
+        "process_type": None,
+        "processes": processes,
+        "plan": plan,
+        "cost_breakdown": cost_breakdown,
+        "report": None,
+        "emit_messages": AGENT_EMIT_MESSAGES,
+        "thread_id": None,
+        "deadline": None if deadline is None else time.time() + deadline,
+        "partial": False,
+        "material_as_of": as_of,
+        "diff": None,
     }
+    state = execution_node(state)
+    state["cost_breakdown"] = {p: state["cost_breakdown"][p] for p in processes}
+
+    after = QuoteReport(location=location, production_volume=volume, processes=state["cost_breakdown"])
+    state["diff"] = QuoteDiff.between(before, after, changed, recomputed).to_dict()
+    return _final_report(output_node(state), as_report)
+
+def run_assembly(
+    query: str,
+    drawing_path: str,
+    production_volume: Optional[int] = None,
+    location: Optional[str] = None,
+    workers: int = 4,
+    as_report: bool = False,
+) -> Union[Dict[str, Any], AssemblyReport]:
+    """
+    装配体报价：拆分实体、按几何指纹去重，每种零件只报价一次（并行），按数量汇总
+
+    Args:
+        query: 用户查询（各零件共用的工艺描述）
+        drawing_path: STEP 装配体文件
+        production_volume: 装配体年产量；每种零件的产量 = 装配体产量 × 单台数量
+        location: 生产地点
+        workers: 并行报价数
+        as_report: 为 True 时返回 AssemblyReport 对象
+
+    Returns:
+        装配体报告字典（parts 为每种零件的数量、几何与报价），或 AssemblyReport
+    """
+    volume = production_volume or int(os.getenv("DEFAULT_PRODUCTION_VOLUME", "1100000"))
+    print(f"📐 拆分装配体: {drawing_path}")
+    groups = group_by_fingerprint(iter_step_solids(drawing_path))
+    print(f"🧩 {sum(g.quantity for g in groups.values())} 个实体 → {len(groups)} 种零件")
+
+    def quote(item) -> AssemblyPart:
+        key, solid = item
+        geometry = {**solid.to_dict(), "unit_area": "mm²", "unit_volume": "mm³"}
+        part = AssemblyPart(fingerprint=key, quantity=solid.quantity, geometry=geometry)
+        try:
+            part.report = run_agent(
+                query,
+                production_volume=volume * solid.quantity,
+                location=location,
+                as_report=True,
+                drawing_data=geometry,
+            )
+        except Exception as e:
+            print(f"❌ 零件 {key} 报价失败: {e}")
+            part.error = str(e)
+        return part
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        parts = list(pool.map(quote, groups.items()))
+
+    report = AssemblyReport(
+        location=location or os.getenv("DEFAULT_LOCATION", "Ningbo, Zhejiang"),
+        production_volume=volume,
+        parts=parts,
+        drawing_hash=file_sha256(drawing_path),
+    )
+    return report if as_report else report.to_dict()
+
+def run_batch(
+    requests: Iterable[Dict[str, Any]],
+    output_path: str,
+    row_group_size: int = 10000,
+) -> int:
+    """
+    批量报价：结果直接累积到列式表，按行组流式写出 Parquet / CSV
+
+    Args:
+        requests: 请求序列，每项含 query，可选 request_id / drawing_path / production_volume / location
+        output_path: 输出路径（.parquet / .csv / .csv.gz）
+        row_group_size: 每个行组的行数（决定内存上限）
+
+    Returns:
+        写出的行数（每个请求 × 工艺一行）
+    """
+    with ResultTableWriter(output_path, row_group_size=row_group_size) as table:
+        for i, req in enumerate(requests):
+            report = run_agent(
+                req["query"],
+                drawing_path=req.get("drawing_path"),
+                production_volume=req.get("production_volume"),
+                location=req.get("location"),
+                as_report=True,
+            )
+            table.append_report(req.get("request_id", i), report)
+    return table.rows_written
 
 if __name__ == "__main__":
     query = "估算 melting, casting, machining, inspection 工艺的价格"
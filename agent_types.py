@@ -0,0 +1,291 @@
+# agent_types.py
+"""
+Agent 结果类型：成本单元与报价报告（__slots__ dataclass）
+
+图内节点之间直接传递这些对象，不再经消息 JSON 序列化/反序列化；
+需要与旧版字典结构兼容时调用 to_dict()。
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+COST_DIMENSIONS = ("equipment_depreciation", "energy", "labor", "volume_adjustment", "material")
+
+# 各成本维度的工具真正使用的报价输入；决定工具缓存 key（tool_cache.cache_key）
+# 与增量重算（agent.requote）时哪些单元失效
+#   volume: 年产量   location: 规范化地点   geometry: 表面积/体积   alloy: 合金牌号   as_of: 计价日期
+DIMENSION_INPUTS: Dict[str, FrozenSet[str]] = {
+    "equipment_depreciation": frozenset({"process", "volume"}),
+    "energy": frozenset({"process", "location", "geometry"}),
+    "labor": frozenset({"process", "location", "volume"}),
+    "volume_adjustment": frozenset({"process", "volume"}),
+    "material": frozenset({"process", "alloy", "as_of"}),
+}
+
+
+def stale_dimensions(changed: Iterable[str]) -> Tuple[str, ...]:
+    """输入变化后需要重算的维度（顺序同 COST_DIMENSIONS）"""
+    changed = set(changed)
+    return tuple(d for d in COST_DIMENSIONS if DIMENSION_INPUTS[d] & changed)
+
+
+@dataclass(slots=True)
+class CostCell:
+    """单个工艺的成本分解（CNY/kg）"""
+    process: str
+    equipment_depreciation: float = 0.0
+    energy: float = 0.0
+    labor: float = 0.0
+    volume_adjustment: float = 0.0
+    material: float = 0.0                    # 原材料（只计入熔炼工序）
+    total: float = 0.0
+    error: Optional[str] = None
+    source: str = "llm"                      # llm / reused
+    neighbors: Optional[List[Any]] = None    # 复用时的历史报价 ID
+    consensus: Optional[Dict[str, Dict[str, Any]]] = None   # 多样本共识：各维度中位数与离散度
+    degraded: Optional[List[str]] = None     # 使用兜底值的维度（LLM 失败 / 熔断）
+
+    @classmethod
+    def from_costs(cls, process: str, equipment: float, energy: float, labor: float,
+                   volume_adjustment: float, material: float = 0.0, **kwargs) -> "CostCell":
+        total = equipment + energy + labor + volume_adjustment + material
+        return cls(
+            process=process,
+            equipment_depreciation=round(equipment, 6),
+            energy=round(energy, 6),
+            labor=round(labor, 6),
+            volume_adjustment=round(volume_adjustment, 6),
+            material=round(material, 6),
+            total=round(total, 2),
+            **kwargs,
+        )
+
+    @classmethod
+    def failed(cls, process: str, error: str) -> "CostCell":
+        return cls(process=process, error=error)
+
+    @classmethod
+    def from_dict(cls, process: str, data: Dict[str, Any]) -> "CostCell":
+        if "error" in data:
+            return cls.failed(process, data["error"])
+        return cls(
+            process=process,
+            **{d: float(data.get(d, 0.0)) for d in COST_DIMENSIONS},
+            total=float(data.get("total", 0.0)),
+            source="reused" if data.get("reused") else data.get("source", "llm"),
+            neighbors=data.get("neighbors"),
+            consensus=data.get("consensus"),
+            degraded=data.get("degraded"),
+        )
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def reused(self) -> bool:
+        return self.source == "reused"
+
+    def costs(self) -> Dict[str, float]:
+        return {d: getattr(self, d) for d in COST_DIMENSIONS}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """旧版 cost_breakdown[process] 字典结构"""
+        if self.error is not None:
+            return {"error": self.error}
+        data: Dict[str, Any] = {**self.costs(), "total": self.total}
+        if self.source != "llm":
+            data["source"] = self.source
+        if self.reused:
+            data["reused"] = True
+            data["neighbors"] = self.neighbors
+        if self.consensus:
+            data["consensus"] = self.consensus
+        if self.degraded:
+            data["degraded"] = self.degraded
+        return data
+
+
+@dataclass(slots=True)
+class QuoteReport:
+    """一次报价的完整结果"""
+    location: Optional[str]
+    production_volume: Optional[int]
+    processes: Dict[str, CostCell]
+    region: Optional[Dict[str, Any]] = None
+    drawing_data: Optional[Dict[str, Any]] = None
+    drawing_hash: Optional[str] = None
+    unit: str = "CNY/kg"
+    timestamp: str = field(default_factory=lambda: time.strftime("%Y-%m-%d %H:%M:%S"))
+    total_cost: float = 0.0
+    quote_id: Optional[int] = None
+    plan: Optional[Dict[str, Any]] = None    # 成本维度调用计划摘要（见 cost_planner）
+    partial: bool = False                    # 截止时间内未完成，部分单元为兜底值
+    material_as_of: Optional[str] = None     # 原材料按该日价格计价（缺省为当前价格）
+    diff: Optional[Dict[str, Any]] = None    # 增量重算时相对上一次报价的差异（见 QuoteDiff）
+
+    def __post_init__(self) -> None:
+        if not self.total_cost:
+            self.total_cost = round(sum(c.total for c in self.processes.values() if c.ok), 2)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuoteReport":
+        return cls(
+            location=data.get("location"),
+            production_volume=data.get("production_volume"),
+            processes={p: CostCell.from_dict(p, c) for p, c in (data.get("processes") or {}).items()},
+            region=data.get("region"),
+            drawing_data=data.get("drawing_data"),
+            drawing_hash=data.get("drawing_hash"),
+            unit=data.get("unit", "CNY/kg"),
+            timestamp=data.get("timestamp") or time.strftime("%Y-%m-%d %H:%M:%S"),
+            total_cost=data.get("total_cost") or 0.0,
+            quote_id=data.get("quote_id"),
+            plan=data.get("plan"),
+            partial=bool(data.get("partial")),
+            material_as_of=data.get("material_as_of"),
+            diff=data.get("diff"),
+        )
+
+    @property
+    def degraded_cells(self) -> List[str]:
+        """使用兜底值的成本单元，形如 casting.energy"""
+        return [f"{p}.{d}" for p, c in self.processes.items() for d in (c.degraded or [])]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """旧版报告字典结构（与 simple_test.py / 报价库兼容）"""
+        data = {
+            "timestamp": self.timestamp,
+            "location": self.location,
+            "region": self.region,
+            "production_volume": self.production_volume,
+            "unit": self.unit,
+            "processes": {p: c.to_dict() for p, c in self.processes.items()},
+            "total_cost": self.total_cost,
+            "drawing_data": self.drawing_data,
+            "drawing_hash": self.drawing_hash,
+        }
+        if self.quote_id is not None:
+            data["quote_id"] = self.quote_id
+        if self.plan is not None:
+            data["plan"] = self.plan
+        if self.partial:
+            data["partial"] = True
+        degraded = self.degraded_cells
+        if degraded:
+            data["degraded_cells"] = degraded
+        if self.material_as_of is not None:
+            data["material_as_of"] = self.material_as_of
+        if self.diff is not None:
+            data["diff"] = self.diff
+        return data
+
+
+@dataclass(slots=True)
+class QuoteDiff:
+    """增量重算前后两次报价的差异"""
+    changed_inputs: List[str]                          # 发生变化的输入（DIMENSION_INPUTS 中的名称）
+    recomputed: List[str]                              # 重新计算的单元，形如 casting.energy
+    cells: Dict[str, Dict[str, Tuple[float, float]]]   # 工艺 → 维度 → (旧值, 新值)，只含数值变化的维度
+    added: List[str] = field(default_factory=list)     # 新增工艺
+    removed: List[str] = field(default_factory=list)   # 去掉的工艺
+    total_before: float = 0.0
+    total_after: float = 0.0
+
+    @classmethod
+    def between(cls, before: QuoteReport, after: QuoteReport, changed_inputs: Iterable[str],
+                recomputed: Iterable[str]) -> "QuoteDiff":
+        cells: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        for process, cell in after.processes.items():
+            old = before.processes.get(process)
+            if old is None or not old.ok or not cell.ok:
+                continue
+            changes = {d: (getattr(old, d), getattr(cell, d)) for d in (*COST_DIMENSIONS, "total")
+                       if getattr(old, d) != getattr(cell, d)}
+            if changes:
+                cells[process] = changes
+        return cls(
+            changed_inputs=sorted(changed_inputs),
+            recomputed=list(recomputed),
+            cells=cells,
+            added=[p for p in after.processes if p not in before.processes],
+            removed=[p for p in before.processes if p not in after.processes],
+            total_before=before.total_cost,
+            total_after=after.total_cost,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "changed_inputs": self.changed_inputs,
+            "recomputed": self.recomputed,
+            "cells": {p: {d: {"before": a, "after": b} for d, (a, b) in dims.items()} for p, dims in self.cells.items()},
+            "added": self.added,
+            "removed": self.removed,
+            "total_before": self.total_before,
+            "total_after": self.total_after,
+            "total_delta": round(self.total_after - self.total_before, 2),
+        }
+
+
+@dataclass(slots=True)
+class AssemblyPart:
+    """装配体中的一种零件（同一几何指纹）"""
+    fingerprint: str
+    quantity: int
+    geometry: Dict[str, Any]
+    report: Optional[QuoteReport] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"fingerprint": self.fingerprint, "quantity": self.quantity, "geometry": self.geometry}
+        if self.report is not None:
+            data["unit_cost"] = self.report.total_cost
+            data["report"] = self.report.to_dict()
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+@dataclass(slots=True)
+class AssemblyReport:
+    """
+    装配体报价：每种零件报价一次，按数量汇总
+
+    成本单位为 CNY/kg；整体成本按各零件体积 × 数量加权（同一材料下即质量加权）。
+    """
+    location: Optional[str]
+    production_volume: Optional[int]
+    parts: List[AssemblyPart]
+    drawing_hash: Optional[str] = None
+    unit: str = "CNY/kg"
+    timestamp: str = field(default_factory=lambda: time.strftime("%Y-%m-%d %H:%M:%S"))
+    total_cost: float = 0.0
+
+    def __post_init__(self) -> None:
+        if not self.total_cost:
+            weighted = weight = 0.0
+            for part in self.parts:
+                if part.report is None:
+                    continue
+                w = (part.geometry.get("volume") or 0.0) * part.quantity
+                weighted += part.report.total_cost * w
+                weight += w
+            self.total_cost = round(weighted / weight, 2) if weight else 0.0
+
+    @property
+    def solid_count(self) -> int:
+        return sum(p.quantity for p in self.parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "location": self.location,
+            "production_volume": self.production_volume,
+            "unit": self.unit,
+            "solid_count": self.solid_count,
+            "unique_parts": len(self.parts),
+            "parts": [p.to_dict() for p in self.parts],
+            "total_cost": self.total_cost,
+            "drawing_hash": self.drawing_hash,
+        }
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+批量报价命令行工具（JSONL 输入 / JSONL 输出，可断点续跑）
+
+输入每行一个请求：
+    {"query": "...", "drawing_path": "...", "production_volume": 1100000, "location": "Ningbo, Zhejiang"}
+可选 request_id，缺省为行号；可选 deadline（秒），超时的单元走兜底值，结果带 partial。
+
+输出每完成一个请求追加一行：
+    {"line": 12, "request_id": "...", "ok": true, "elapsed": 3.2, "result": {...}}
+输出文件本身即进度检查点：重新运行同一命令时跳过已完成的行。
+
+用法:
+    python batch_runner.py requests.jsonl -o results.jsonl --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, Optional, Set, Tuple
+
+
+def iter_requests(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """流式读取请求文件，返回 (行号, 请求)；跳过空行，无法解析的行原样交给执行阶段报错"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, {"_invalid": f"Invalid JSON: {e}"}
+
+
+def count_requests(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def load_checkpoint(output_path: str, retry_failed: bool = False) -> Set[int]:
+    """
+    从已有输出文件恢复已完成的行号
+
+    进程中途崩溃时最后一行可能不完整，先截断到最后一个换行符再续写。
+    同一行有多条记录时只保留最后一条；retry_failed 时失败记录会被重做，先从文件中删除，
+    避免重做后同一行出现新旧两条记录。有记录被删除时原子地重写输出文件。
+    """
+    done: Set[int] = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, "rb+") as f:
+        data_end = f.seek(0, os.SEEK_END)
+        if data_end:
+            f.seek(max(0, data_end - 1))
+            if f.read(1) != b"\n":
+                f.seek(0)
+                content = f.read()
+                f.truncate(content.rfind(b"\n") + 1)
+
+    latest: Dict[int, Tuple[Dict[str, Any], str]] = {}
+    total = 0
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            total += 1
+            latest.pop(record["line"], None)      # 重新插入：保持最后一条记录的写入顺序
+            latest[record["line"]] = (record, line)
+
+    kept = {n: (record, line) for n, (record, line) in latest.items() if record.get("ok") or not retry_failed}
+    if len(kept) != total:
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(line for _, line in kept.values())
+        os.replace(tmp_path, output_path)
+    return set(kept)
+
+
+def run_one(run_agent, line_no: int, request: Dict[str, Any], thread_prefix: Optional[str] = None) -> Tuple[Dict[str, Any], Any]:
+    """执行单个请求，返回 (输出记录, QuoteReport 或 None)"""
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"line": line_no, "request_id": request.get("request_id", line_no)}
+    report = None
+    try:
+        if "_invalid" in request:
+            raise ValueError(request["_invalid"])
+        report = run_agent(
+            request["query"],
+            drawing_path=request.get("drawing_path"),
+            production_volume=request.get("production_volume"),
+            location=request.get("location"),
+            as_report=True,
+            thread_id=f"{thread_prefix}:{line_no}" if thread_prefix else None,
+            profile=False,   # 批量模式按整批剖析（见 run_batch_file）
+            deadline=request.get("deadline"),
+        )
+        record["ok"] = True
+        record["result"] = report.to_dict()
+    except Exception as e:
+        record["ok"] = False
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed"] = round(time.perf_counter() - start, 3)
+    return record, report
+
+
+class Progress:
+    """实时吞吐量 / ETA（输出到 stderr）"""
+
+    def __init__(self, total: int, skipped: int, interval: float = 1.0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.interval = interval
+        self._start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, ok: bool) -> None:
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.render()
+
+    def render(self, final: bool = False) -> None:
+        elapsed = time.perf_counter() - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.skipped - self.done)
+        eta = remaining / rate if rate > 0 else float("inf")
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "--:--:--"
+        line = (
+            f"📦 {self.skipped + self.done}/{self.total} "
+            f"(本次 {self.done}, 失败 {self.failed}, 跳过 {self.skipped}) "
+            f"| {rate:.2f} req/s | 用时 {elapsed:.0f}s | ETA {eta_text}"
+        )
+        sys.stderr.write(("\n" if final else "\r") + line + ("\n" if final else ""))
+        sys.stderr.flush()
+
+
+def run_batch_file(
+    input_path: str,
+    output_path: str,
+    workers: int = 4,
+    retry_failed: bool = False,
+    table_path: Optional[str] = None,
+    quiet: bool = True,
+    checkpoint: bool = False,
+    profile: Optional[bool] = None,
+) -> Progress:
+    """
+    批量执行 JSONL 请求文件
+
+    Args:
+        input_path: 输入 JSONL
+        output_path: 输出 JSONL（追加写入，同时作为断点）
+        workers: 并发数
+        retry_failed: 续跑时是否重做失败的行
+        table_path: 可选，本次结果额外写入列式表（.parquet / .csv）
+        quiet: 屏蔽单个报价的控制台输出，只显示进度
+        checkpoint: 每行使用独立 thread_id 启用图检查点，进程崩溃时已完成的 LLM 调用不丢失
+        profile: 整批性能剖析（工作线程各挂一个 cProfile 后合并）；默认取 AGENT_PROFILE
+    """
+    from profiling import profile_run
+
+    with profile_run(f"batch-{os.path.basename(input_path)}", enabled=profile, all_threads=True):
+        return _run_batch_file(input_path, output_path, workers, retry_failed, table_path, quiet, checkpoint)
+
+
+def _run_batch_file(
+    input_path: str,
+    output_path: str,
+    workers: int,
+    retry_failed: bool,
+    table_path: Optional[str],
+    quiet: bool,
+    checkpoint: bool,
+) -> Progress:
+    from agent import run_agent
+
+    done = load_checkpoint(output_path, retry_failed=retry_failed)
+    total = count_requests(input_path)
+    progress = Progress(total=total, skipped=len(done))
+
+    table = None
+    if table_path:
+        from storage.columnar import ResultTableWriter
+        table = ResultTableWriter(table_path)
+
+    thread_prefix = os.path.abspath(input_path) if checkpoint else None
+    pending = set()
+    max_pending = max(1, workers) * 2   # 有界提交：不把 5 万行一次性放进队列
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull if quiet else sys.stdout), \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def drain(block_until_one: bool) -> None:
+            nonlocal pending
+            if not pending:
+                return
+            finished, pending = wait(pending, timeout=None if block_until_one else 0, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                record, report = fut.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if table is not None and report is not None:
+                    table.append_report(record["request_id"], report)
+                progress.update(record["ok"])
+
+        for line_no, request in iter_requests(input_path):
+            if line_no in done:
+                continue
+            while len(pending) >= max_pending:
+                drain(block_until_one=True)
+            pending.add(pool.submit(run_one, run_agent, line_no, request, thread_prefix))
+            drain(block_until_one=False)
+
+        while pending:
+            drain(block_until_one=True)
+
+    if table is not None:
+        table.close()
+    progress.render(final=True)
+    return progress
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量报价（JSONL，可断点续跑）")
+    parser.add_argument("input", help="请求文件（JSONL）")
+    parser.add_argument("-o", "--output", help="结果文件（JSONL，默认 <input>.results.jsonl）")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.getenv("BATCH_WORKERS", "4")), help="并发数")
+    parser.add_argument("--retry-failed", action="store_true", help="续跑时重做失败的行")
+    parser.add_argument("--table", help="额外写出列式结果表（.parquet / .csv / .csv.gz）")
+    parser.add_argument("--checkpoint", action="store_true", help="启用单元级检查点（崩溃后半完成的报价不重复调用 LLM）")
+    parser.add_argument("--profile", action="store_true", default=None, help="输出整批性能剖析（见 profiling.py）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示单个报价的详细输出")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    try:
+        progress = run_batch_file(
+            args.input, output,
+            workers=args.workers,
+            retry_failed=args.retry_failed,
+            table_path=args.table,
+            quiet=not args.verbose,
+            checkpoint=args.checkpoint,
+            profile=args.profile,
+        )
+    except KeyboardInterrupt:
+        sys.stderr.write("\n⏹️ 已中断，重新运行同一命令即可从断点继续\n")
+        return 130
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
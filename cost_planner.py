@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+cost_planner.py
+成本维度调用计划：按工艺目录规则，为每个 (工艺, 成本维度) 决定取值方式
+
+- llm        调用对应工具（LLM 推理）
+- fetch      调用对应工具，但不经 LLM（原材料维度联网抓取价格），不计入 LLM 调用数，也不参与缓存预热
+- memo       结果只依赖少数输入（如产量档位），按 key 记忆；同一请求内由首个工艺调用一次，
+             其余工艺及后续请求直接复用；记忆按维度过期（与工具缓存的软 TTL 相同，见 tool_cache.py）
+- static     直接取目录默认值（能耗可忽略的检测类工艺等）
+- parametric 本地计算：默认值 × 地区能源/工资系数；产量调整按档位查表
+- neighbor   已由近邻复用节点给出整行结果
+
+计划随报告输出（report["plan"]），可直接看到相比每维度都调用 LLM 节省了多少次调用。
+"""
+
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from agent_types import COST_DIMENSIONS
+from tool_cache import dimension_ttls
+from tools.process_catalog import ProcessCatalog
+from tools.production_volume_tool import volume_tier
+from tools.region_rates import RegionRates
+
+
+# 记忆 key 用字符串（如 "volume_adjustment|xlarge"），计划随图检查点序列化后仍可作字典键
+MemoKey = str
+
+# 不经 LLM 的维度：目录规则为 llm 时按 fetch 计划（工具自行取数）
+_FETCH_DIMENSIONS = {"material"}
+
+
+class DimensionMemo:
+    """跨请求的维度结果记忆（线程安全；key 由规则决定，取值空间很小；按维度 TTL 过期）"""
+
+    def __init__(self, ttls: Optional[Dict[str, Tuple[float, float]]] = None, enabled: bool = True):
+        """
+        Args:
+            ttls: 按维度覆盖 (软 TTL, 硬 TTL)，缺省同工具缓存（tool_cache.dimension_ttls）；记忆取软 TTL
+            enabled: False 时不跨请求记忆（同一请求内仍由首个工艺调用一次，见 execution_node）
+        """
+        self.ttls = dimension_ttls(ttls)
+        self.enabled = enabled
+        self._values: Dict[MemoKey, Tuple[float, float]] = {}   # key → (值, 写入时间)
+        self._lock = threading.Lock()
+
+    def _ttl(self, key: MemoKey) -> Optional[float]:
+        ttl = self.ttls.get(key.split("|", 1)[0])
+        return ttl[0] if ttl else None
+
+    def get(self, key: MemoKey) -> Optional[float]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            ttl = self._ttl(key)
+            if ttl is not None and time.time() - stored_at > ttl:
+                del self._values[key]
+                return None
+            return value
+
+    def put(self, key: MemoKey, value: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[key] = (value, time.time())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+@dataclass(slots=True)
+class PlanStep:
+    """单个 (工艺, 维度) 的取值方式"""
+    mode: str                            # llm / fetch / memo / static / parametric / neighbor / cached / kept
+    value: Optional[float] = None        # 计划阶段即可确定的值（static / parametric / 已记忆的 memo）
+    memo_key: Optional[MemoKey] = None   # llm 步骤的结果写入记忆；memo 步骤从记忆读取
+
+    @property
+    def calls_llm(self) -> bool:
+        return self.mode == "llm"
+
+    @property
+    def calls_tool(self) -> bool:
+        """需要在执行阶段调用工具（LLM 推理或联网抓取）"""
+        return self.mode in ("llm", "fetch")
+
+
+@dataclass(slots=True)
+class CostPlan:
+    """一次报价的调用计划"""
+    steps: Dict[str, Dict[str, PlanStep]] = field(default_factory=dict)
+
+    def step(self, process: str, dimension: str) -> PlanStep:
+        return self.steps.get(process, {}).get(dimension) or PlanStep("llm")
+
+    @property
+    def baseline_calls(self) -> int:
+        """无计划时的 LLM 调用数（不含联网取数的维度）"""
+        return len(self.steps) * sum(d not in _FETCH_DIMENSIONS for d in COST_DIMENSIONS)
+
+    @property
+    def llm_calls(self) -> int:
+        return sum(s.calls_llm for dims in self.steps.values() for s in dims.values())
+
+    @property
+    def fetches(self) -> int:
+        return sum(s.mode == "fetch" for dims in self.steps.values() for s in dims.values())
+
+    def summary(self) -> str:
+        text = f"LLM 调用 {self.llm_calls}/{self.baseline_calls}（节省 {self.baseline_calls - self.llm_calls}）"
+        return text + (f"，联网取数 {self.fetches}" if self.fetches else "")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "baseline_calls": self.baseline_calls,
+            "llm_calls": self.llm_calls,
+            "fetches": self.fetches,
+            "saved_calls": self.baseline_calls - self.llm_calls,
+            "cells": {p: {d: s.mode for d, s in dims.items()} for p, dims in self.steps.items()},
+        }
+
+
+class CostPlanner:
+    """根据工艺目录规则生成调用计划"""
+
+    def __init__(self, catalog: ProcessCatalog, memo: Optional[DimensionMemo] = None, enabled: bool = True):
+        """
+        Args:
+            catalog: 工艺目录（规则来源）
+            memo: 维度结果记忆，缺省为新建
+            enabled: False 时每个维度都调用 LLM（与无计划时行为一致）
+        """
+        self.catalog = catalog
+        self.memo = memo if memo is not None else DimensionMemo()
+        self.enabled = enabled
+
+    def _memo_key(self, rule: Dict[str, Any], process: str, dimension: str,
+                  volume: int, region: RegionRates) -> MemoKey:
+        fields = {
+            "process": process,
+            "volume_tier": volume_tier(volume),
+            "region": region.canonical,
+        }
+        return "|".join([dimension, *(fields[name] for name in rule.get("key", ["process"]))])
+
+    def _parametric(self, process: str, dimension: str, volume: int, region: RegionRates) -> float:
+        if dimension == "volume_adjustment":
+            return float(self.catalog.volume_adjustment_by_tier.get(volume_tier(volume), 0.0))
+        value = self.catalog.default(process, dimension, 0.0)
+        if dimension == "energy":
+            value *= region.energy_factor()
+        elif dimension == "labor":
+            value *= region.wage_factor()
+        return round(value, 2)
+
+    def plan(
+        self,
+        processes: Iterable[str],
+        volume: int,
+        region: RegionRates,
+        reused: Iterable[str] = (),
+    ) -> CostPlan:
+        """
+        Args:
+            processes: 需要估算的工艺（按执行顺序）
+            volume: 年产量
+            region: 解析后的地区费率
+            reused: 已由近邻复用给出结果的工艺
+        """
+        reused = set(reused)
+        plan = CostPlan()
+        leaders = set()   # 本次计划中已安排 LLM 调用的记忆 key
+        for process in processes:
+            dims = plan.steps.setdefault(process, {})
+            for dimension in COST_DIMENSIONS:
+                if process in reused:
+                    dims[dimension] = PlanStep("neighbor")
+                    continue
+                rule = self.catalog.plan_rule(process, dimension) if self.enabled else {"mode": "llm"}
+                mode = rule.get("mode", "llm")
+                if mode == "llm" and dimension in _FETCH_DIMENSIONS:
+                    mode = "fetch"
+                if mode == "fetch":
+                    dims[dimension] = PlanStep("fetch")
+                elif mode == "static":
+                    value = rule.get("value", self.catalog.default(process, dimension, 0.0))
+                    dims[dimension] = PlanStep("static", value=float(value))
+                elif mode == "parametric":
+                    dims[dimension] = PlanStep("parametric", value=self._parametric(process, dimension, volume, region))
+                elif mode == "memo":
+                    key = self._memo_key(rule, process, dimension, volume, region)
+                    value = self.memo.get(key)
+                    if value is not None:
+                        dims[dimension] = PlanStep("memo", value=value, memo_key=key)
+                    elif key in leaders:
+                        dims[dimension] = PlanStep("memo", memo_key=key)
+                    else:
+                        leaders.add(key)
+                        dims[dimension] = PlanStep("llm", memo_key=key)
+                else:
+                    dims[dimension] = PlanStep("llm")
+        return plan
+
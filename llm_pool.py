@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+llm_pool.py
+多端点 / 多部署的 LLM 池（与单个 AzureChatOpenAI 相同的 invoke / generate 接口）
+
+- 每个成员：一个端点 + 部署，带权重与配额（并发上限 max_concurrency、每分钟请求数 rpm）
+- 路由：least_outstanding（在途请求数 / 权重最小）或 latency（EWMA 延迟 × 在途数 / 权重最小）
+- 连续失败 eject_after 次的成员被摘除 eject_seconds 秒，到期后重新参与路由
+- 单次调用失败时换一个成员重试（最多 retries 次）；所有成员都满额时等待空位
+
+配置文件（LLM_POOL_CONFIG，JSON）：
+    {
+      "strategy": "least_outstanding",
+      "members": [
+        {"name": "east", "endpoint": "https://east.openai.azure.com/", "deployment": "gpt-4o",
+         "api_key_env": "AZURE_OPENAI_API_KEY_EAST", "weight": 2, "max_concurrency": 16, "rpm": 600},
+        {"name": "local", "base_url": "http://127.0.0.1:9001/v1", "model": "stand-in", "weight": 1}
+      ]
+    }
+有 endpoint 的成员为 AzureChatOpenAI；有 base_url 的成员为 OpenAI 兼容端点（ChatOpenAI，本地替身服务器）。
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    from langchain_openai.chat_models.base import BaseChatOpenAI
+except ImportError:
+    BaseChatOpenAI = None
+
+
+class PoolExhausted(RuntimeError):
+    """没有可用成员（全部摘除，或等待配额超时）"""
+
+
+@dataclass
+class PoolMember:
+    """池成员：一个端点 + 部署"""
+    name: str
+    llm: Any
+    weight: float = 1.0
+    max_concurrency: Optional[int] = None   # 在途请求上限
+    rpm: Optional[int] = None               # 每分钟请求数上限
+
+    outstanding: int = 0
+    latency: Optional[float] = None         # EWMA 延迟（秒）
+    calls: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    _starts: deque = field(default_factory=deque, repr=False)   # 最近一分钟的请求时刻
+
+    def available(self, now: float) -> bool:
+        if now < self.ejected_until:
+            return False
+        if self.max_concurrency is not None and self.outstanding >= self.max_concurrency:
+            return False
+        if self.rpm is not None:
+            while self._starts and now - self._starts[0] >= 60:
+                self._starts.popleft()
+            if len(self._starts) >= self.rpm:
+                return False
+        return True
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "latency": None if self.latency is None else round(self.latency, 3),
+            "calls": self.calls,
+            "failures": self.failures,
+            "ejected": now < self.ejected_until,
+        }
+
+
+class LLMPool:
+    """按在途请求数或观测延迟路由的 LLM 池（线程安全）"""
+
+    def __init__(
+        self,
+        members: List[PoolMember],
+        strategy: str = "least_outstanding",
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        retries: int = 1,
+        acquire_timeout: float = 30.0,
+        latency_alpha: float = 0.3,
+    ):
+        """
+        Args:
+            members: 成员列表
+            strategy: least_outstanding / latency
+            eject_after: 连续失败多少次后摘除
+            eject_seconds: 摘除时长
+            retries: 单次调用失败后换成员重试的次数
+            acquire_timeout: 所有成员满额时等待空位的最长时间
+            latency_alpha: 延迟 EWMA 平滑系数
+        """
+        if not members:
+            raise ValueError("LLM 池至少需要一个成员")
+        if strategy not in ("least_outstanding", "latency"):
+            raise ValueError(f"未知路由策略: {strategy}")
+        self.members = members
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.retries = retries
+        self.acquire_timeout = acquire_timeout
+        self.latency_alpha = latency_alpha
+        self._cond = threading.Condition()
+
+    @property
+    def accepts_timeout(self) -> bool:
+        """所有成员都支持按请求传 timeout 时，截止时间直接下传给 SDK（见 tools/deadline.py）"""
+        return BaseChatOpenAI is not None and all(isinstance(m.llm, BaseChatOpenAI) for m in self.members)
+
+    # ---------- 路由 ----------
+    def _score(self, member: PoolMember) -> float:
+        if self.strategy == "latency":
+            # 尚无观测的成员按 0 延迟优先探测
+            return (member.latency or 0.0) * (member.outstanding + 1) / member.weight
+        return member.outstanding / member.weight
+
+    def _acquire(self, exclude: set) -> PoolMember:
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                candidates = [m for m in self.members if m.name not in exclude and m.available(now)]
+                if candidates:
+                    best = min(self._score(m) for m in candidates)
+                    member = random.choice([m for m in candidates if self._score(m) == best])
+                    member.outstanding += 1
+                    member._starts.append(now)
+                    return member
+                healthy = [m for m in self.members if m.name not in exclude and now >= m.ejected_until]
+                if not healthy:
+                    raise PoolExhausted("LLM 池没有健康成员")
+                if now >= deadline:
+                    raise PoolExhausted(f"等待 LLM 池配额超时（{self.acquire_timeout:.0f}s）")
+                self._cond.wait(min(0.5, deadline - now))
+
+    def _release(self, member: PoolMember, ok: Optional[bool], elapsed: float) -> None:
+        """归还名额并记录结果；ok=None 表示被调用方截断，不计入健康统计"""
+        with self._cond:
+            member.outstanding -= 1
+            member.calls += 1
+            if ok is None:
+                pass
+            elif ok:
+                member.consecutive_failures = 0
+                member.latency = elapsed if member.latency is None else (
+                    self.latency_alpha * elapsed + (1 - self.latency_alpha) * member.latency
+                )
+            else:
+                member.failures += 1
+                member.consecutive_failures += 1
+                if member.consecutive_failures >= self.eject_after:
+                    member.ejected_until = time.monotonic() + self.eject_seconds
+                    member.consecutive_failures = 0
+                    print(f"⚠️ LLM 池成员 {member.name} 连续失败，摘除 {self.eject_seconds:.0f}s")
+            self._cond.notify_all()
+
+    def _call(self, method: str, *args, **kwargs):
+        tried: set = set()
+        last_error: Optional[Exception] = None
+        for _ in range(self.retries + 1):
+            try:
+                member = self._acquire(tried)
+            except PoolExhausted:
+                if last_error is not None:
+                    raise last_error
+                raise
+            tried.add(member.name)
+            start = time.monotonic()
+            try:
+                result = getattr(member.llm, method)(*args, **kwargs)
+            except Exception as e:
+                elapsed = time.monotonic() - start
+                timeout = kwargs.get("timeout")
+                if timeout is not None and elapsed >= timeout:
+                    # 调用方传入的截止时间到点（见 tools/deadline.py），不算成员失败，也不再重试
+                    self._release(member, None, elapsed)
+                    raise
+                self._release(member, False, elapsed)
+                last_error = e
+                continue
+            self._release(member, True, time.monotonic() - start)
+            return result
+        raise last_error
+
+    # ---------- 与 BaseChatModel 相同的调用接口 ----------
+    def invoke(self, input, *args, **kwargs):
+        return self._call("invoke", input, *args, **kwargs)
+
+    def generate(self, messages, *args, **kwargs):
+        return self._call("generate", messages, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            return {"strategy": self.strategy, "members": [m.to_dict(now) for m in self.members]}
+
+
+def _build_member_llm(spec: Dict[str, Any], temperature: float, http_client=None):
+    if spec.get("base_url"):
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            base_url=spec["base_url"],
+            model=spec.get("model") or spec.get("deployment") or "gpt-4o",
+            api_key=os.getenv(spec.get("api_key_env", ""), "") or spec.get("api_key") or "not-needed",
+            temperature=temperature,
+            max_retries=spec.get("max_retries", 0),
+            timeout=spec.get("timeout", 30.0),
+        )
+    from langchain_openai import AzureChatOpenAI
+    return AzureChatOpenAI(
+        deployment_name=spec["deployment"],
+        api_key=os.getenv(spec.get("api_key_env", "AZURE_OPENAI_API_KEY")),
+        azure_endpoint=spec["endpoint"],
+        api_version=spec.get("api_version") or os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview"),
+        temperature=temperature,
+        max_retries=spec.get("max_retries", 0),
+        http_client=http_client,
+    )
+
+
+def build_llm_pool(config: Any, temperature: float = 1.0, http_client=None) -> LLMPool:
+    """
+    按配置构造 LLM 池
+
+    Args:
+        config: 配置文件路径或已解析的字典（格式见模块说明）
+        http_client: Azure 成员共用的 httpx 客户端（代理设置）
+    """
+    if isinstance(config, str):
+        with open(config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    members = [
+        PoolMember(
+            name=spec.get("name") or spec.get("deployment") or spec.get("base_url"),
+            llm=_build_member_llm(spec, temperature, http_client),
+            weight=float(spec.get("weight", 1.0)),
+            max_concurrency=spec.get("max_concurrency"),
+            rpm=spec.get("rpm"),
+        )
+        for spec in config["members"]
+    ]
+    return LLMPool(
+        members,
+        strategy=config.get("strategy", "least_outstanding"),
+        eject_after=int(config.get("eject_after", 3)),
+        eject_seconds=float(config.get("eject_seconds", 30)),
+        retries=int(config.get("retries", 1)),
+    )
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+并发压测工具：逐级增加虚拟用户数（或到达率），测量单进程可承受的并发报价量
+
+- 默认使用替身 LLM（对数正态延迟 + 可配置错误率），不消耗 Azure 配额，
+  测到的是 LangGraph / LangChain / 工具层自身的开销与 GIL 竞争；
+  此时原材料工具离线（AGENT_OFFLINE=true，不写价格库），熔炼的原材料单元为兜底价格
+- --llm real 时走 .env 中配置的真实端点
+- --target http://host:port 时改为向运行中的报价服务 POST /quote（覆盖 HTTP 服务、真实端点与连接池），
+  此时 --llm / --with-store 不生效，由服务进程自身的配置决定
+- 默认关闭报价入库、近邻复用、工具结果缓存与跨请求维度记忆，每个请求都走冷路径，
+  各级的 LLM 调用数/请求保持一致（--with-store / --with-cache 分别保留）
+- 每一级输出吞吐量、延迟分位数、错误率、CPU 占用、RSS 峰值与线程数
+
+用法:
+    # 闭环：1/2/4/8/16/32 个虚拟用户，每级 20 秒
+    python load_test.py --users 1,2,4,8,16,32 --duration 20
+
+    # 开环：按泊松到达率 5/10/20 req/s 施压（延迟含排队时间）
+    python load_test.py --rates 5,10,20 --duration 30 --json load.json
+
+    # 压测运行中的报价服务（python service.py --port 8080）
+    python load_test.py --target http://127.0.0.1:8080 --users 1,2,4,8
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import contextlib
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+
+# ==================== 替身 LLM ====================
+class _Response:
+    __slots__ = ("content",)
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class StandInLLM:
+    """
+    延迟分布近似真实端点的替身 LLM
+
+    延迟 ~ LogNormal(ln(median), sigma)，截断到 max_latency；error_rate 概率抛异常
+    （工具会走默认值兜底，与真实超时/限流表现一致）。
+    """
+
+    def __init__(self, median: float = 1.2, sigma: float = 0.5, max_latency: float = 30.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.median = median
+        self.sigma = sigma
+        self.max_latency = max_latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            latency = min(self.max_latency, self._rng.lognormvariate(math.log(self.median), self.sigma))
+            failed = self._rng.random() < self.error_rate
+            value = self._rng.uniform(0.1, 2.0)
+        return latency, failed, value
+
+    def _done(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def invoke(self, prompt: Any, *args, **kwargs) -> _Response:
+        latency, failed, value = self._draw()
+        try:
+            time.sleep(latency)
+            if failed:
+                raise TimeoutError("stand-in LLM: simulated timeout")
+            return _Response(f"{value:.2f}")
+        finally:
+            self._done()
+
+
+# ==================== 统计 ====================
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """最近秩分位数（输入需已排序）"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _cpu_seconds() -> float:
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 为 KiB，macOS 为字节
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+@dataclass
+class StageResult:
+    """一级负载的测量结果"""
+    label: str
+    duration: float
+    completed: int = 0
+    errors: int = 0
+    throughput: float = 0.0          # req/s
+    p50: Optional[float] = None      # 秒
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+    max: Optional[float] = None
+    error_rate: float = 0.0
+    cpu_cores: float = 0.0           # 本级平均占用的 CPU 核数
+    max_rss_mb: Optional[float] = None
+    threads: int = 0                 # 本级线程数峰值
+    llm_calls: Optional[int] = None
+    llm_peak_in_flight: Optional[int] = None
+    latencies: List[float] = field(default_factory=list, repr=False)
+
+    def finish(self, wall: float, cpu: float) -> "StageResult":
+        self.latencies.sort()
+        self.duration = wall
+        self.throughput = self.completed / wall if wall > 0 else 0.0
+        self.p50, self.p90, self.p99 = (percentile(self.latencies, q) for q in (50, 90, 99))
+        self.max = self.latencies[-1] if self.latencies else None
+        total = self.completed + self.errors
+        self.error_rate = self.errors / total if total else 0.0
+        self.cpu_cores = cpu / wall if wall > 0 else 0.0
+        self.max_rss_mb = _max_rss_mb()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("latencies")
+        return data
+
+
+# ==================== 负载生成 ====================
+_PROCESS_MIX = ["melting", "casting", "machining", "inspection", "die casting", "T6热处理", "CMM", "leak test"]
+_LOCATIONS = ["Ningbo, Zhejiang", "Suzhou, Jiangsu", "Shenzhen, Guangdong", "Chongqing", "Xi'an, Shaanxi"]
+
+
+def random_request(rng: random.Random) -> Dict[str, Any]:
+    """随机报价请求（工艺组合 / 产量 / 地点）"""
+    processes = rng.sample(_PROCESS_MIX, rng.randint(1, 4))
+    return {
+        "query": f"估算 {', '.join(processes)} 工艺的价格",
+        "production_volume": rng.choice([50_000, 200_000, 800_000, 1_100_000, 3_000_000]),
+        "location": rng.choice(_LOCATIONS),
+    }
+
+
+class LoadRunner:
+    """逐级施压；target(request) 为一次完整报价"""
+
+    def __init__(self, target: Callable[[Dict[str, Any]], Any], llm: Optional[StandInLLM] = None,
+                 seed: Optional[int] = None):
+        self.target = target
+        self.llm = llm
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _next_request(self) -> Dict[str, Any]:
+        with self._rng_lock:
+            return random_request(self._rng)
+
+    def _record(self, stage: StageResult, lock: threading.Lock, started: float) -> None:
+        try:
+            self.target(self._next_request())
+            ok = True
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            stage.threads = max(stage.threads, threading.active_count())
+            if ok:
+                stage.completed += 1
+                stage.latencies.append(elapsed)
+            else:
+                stage.errors += 1
+
+    def _begin(self):
+        calls = self.llm.calls if self.llm else None
+        if self.llm:
+            self.llm.peak_in_flight = self.llm.in_flight
+        return time.perf_counter(), _cpu_seconds(), calls
+
+    def _end(self, stage: StageResult, begin) -> StageResult:
+        wall0, cpu0, calls0 = begin
+        stage.finish(time.perf_counter() - wall0, _cpu_seconds() - cpu0)
+        if self.llm:
+            stage.llm_calls = self.llm.calls - calls0
+            stage.llm_peak_in_flight = self.llm.peak_in_flight
+        return stage
+
+    def closed_stage(self, users: int, duration: float, think_time: float = 0.0) -> StageResult:
+        """闭环：users 个虚拟用户各自循环 请求 → 等待 think_time"""
+        stage = StageResult(label=f"{users} users", duration=duration)
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def user() -> None:
+            while time.perf_counter() < deadline:
+                self._record(stage, lock, time.perf_counter())
+                if think_time:
+                    time.sleep(think_time)
+
+        begin = self._begin()
+        threads = [threading.Thread(target=user, name=f"vu-{i}", daemon=True) for i in range(users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self._end(stage, begin)
+
+    def open_stage(self, rate: float, duration: float, max_workers: int = 256) -> StageResult:
+        """开环：泊松到达（rate req/s），延迟从计划到达时刻算起（含排队）"""
+        stage = StageResult(label=f"{rate:g} req/s", duration=duration)
+        lock = threading.Lock()
+        begin = self._begin()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vu") as pool:
+            t = 0.0
+            while True:
+                with self._rng_lock:
+                    t += self._rng.expovariate(rate)
+                if t >= duration:
+                    break
+                delay = start + t - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._record, stage, lock, start + t)
+        return self._end(stage, begin)
+
+
+# ==================== 报告 ====================
+def _fmt(x: Optional[float], unit: str = "s") -> str:
+    return "-" if x is None else f"{x:.2f}{unit}"
+
+
+def print_report(stages: List[StageResult], out=sys.stdout) -> None:
+    header = f"{'负载':>12} {'完成':>6} {'req/s':>7} {'p50':>7} {'p90':>7} {'p99':>7} {'错误率':>6} {'CPU核':>6} {'RSS':>8} {'线程':>5} {'LLM并发':>7}"
+    out.write(header + "\n" + "-" * len(header) + "\n")
+    best = 0.0
+    for s in stages:
+        note = ""
+        if best and s.throughput < best * 1.1:
+            note = "  ← 吞吐不再随负载增长"
+        best = max(best, s.throughput)
+        out.write(
+            f"{s.label:>12} {s.completed:>6} {s.throughput:>7.2f} {_fmt(s.p50):>7} {_fmt(s.p90):>7} {_fmt(s.p99):>7} "
+            f"{s.error_rate:>6.1%} {s.cpu_cores:>6.2f} {_fmt(s.max_rss_mb, 'M'):>8} {s.threads:>5} "
+            f"{s.llm_peak_in_flight if s.llm_peak_in_flight is not None else '-':>7}{note}\n"
+        )
+
+
+def isolation_env(with_store: bool = False, with_cache: bool = False, stand_in: bool = True) -> Dict[str, str]:
+    """
+    压测前需写入的环境变量（须在导入 agent 之前设置）
+
+    跨请求复用（报价库近邻、工具结果缓存、维度记忆）默认全部关闭：否则后续各级的请求
+    大多命中缓存，测到的是命中率而不是并发上限。
+    """
+    env: Dict[str, str] = {}
+    if not with_store:
+        env.update(QUOTE_STORE_ENABLED="false", REUSE_ENABLED="false")
+    if not with_cache:
+        env.update(TOOL_CACHE_ENABLED="false", PLANNER_MEMO_ENABLED="false")
+    if stand_in:
+        # use_llm 不覆盖原材料工具：替身压测不联网抓取价格，也不把结果写入价格库
+        env.update(AGENT_OFFLINE="true", MATERIAL_PRICE_STORE_ENABLED="false")
+    return env
+
+
+def agent_target() -> Callable[[Dict[str, Any]], Any]:
+    """以 run_agent 为压测目标（返回 QuoteReport，跳过字典转换）"""
+    from agent import run_agent
+
+    def target(request: Dict[str, Any]):
+        return run_agent(request["query"], production_volume=request["production_volume"],
+                         location=request["location"], as_report=True, profile=False)
+    return target
+
+
+def http_target(base_url: str, timeout: float = 120.0) -> Callable[[Dict[str, Any]], Any]:
+    """以运行中的报价服务为压测目标：POST {base_url}/quote，非 2xx 响应视为错误"""
+    url = base_url.rstrip("/") + "/quote"
+
+    def target(request: Dict[str, Any]):
+        body = json.dumps(request, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=timeout) as resp:   # 非 2xx 抛 HTTPError
+            return json.loads(resp.read())
+    return target
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Agent 并发压测")
+    parser.add_argument("--users", default="1,2,4,8,16", help="闭环虚拟用户数（逗号分隔，逐级施压）")
+    parser.add_argument("--rates", help="开环到达率 req/s（逗号分隔）；指定时忽略 --users")
+    parser.add_argument("--duration", type=float, default=20.0, help="每级持续秒数")
+    parser.add_argument("--think-time", type=float, default=0.0, help="闭环用户两次请求间隔（秒）")
+    parser.add_argument("--llm", choices=["stand-in", "real"], default="stand-in", help="替身 LLM 或真实端点")
+    parser.add_argument("--llm-median", type=float, default=1.2, help="替身 LLM 延迟中位数（秒）")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="替身 LLM 对数正态 sigma")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="替身 LLM 错误率")
+    parser.add_argument("--with-store", action="store_true", help="保留报价入库与近邻复用（默认关闭，避免污染历史库）")
+    parser.add_argument("--with-cache", action="store_true",
+                        help="保留工具结果缓存与跨请求维度记忆（默认关闭，否则后续各级主要测到缓存命中率）")
+    parser.add_argument("--target", help="报价服务地址（如 http://127.0.0.1:8080），指定时经 HTTP 压测 /quote")
+    parser.add_argument("--timeout", type=float, default=120.0, help="--target 模式单次请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="结果另存为 JSON")
+    args = parser.parse_args(argv)
+
+    if args.target:
+        return _report(_run_stages(LoadRunner(http_target(args.target, args.timeout), seed=args.seed), args), args)
+
+    os.environ.update(isolation_env(args.with_store, args.with_cache, args.llm == "stand-in"))
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import agent
+        llm = None
+        if args.llm == "stand-in":
+            llm = StandInLLM(args.llm_median, args.llm_sigma, error_rate=args.llm_error_rate, seed=args.seed)
+            agent.use_llm(llm)
+        stages = _run_stages(LoadRunner(agent_target(), llm=llm, seed=args.seed), args)
+    return _report(stages, args)
+
+
+def _run_stages(runner: LoadRunner, args) -> List[StageResult]:
+    """按 --rates / --users 逐级施压；中断时返回已完成的各级"""
+    stages: List[StageResult] = []
+    try:
+        if args.rates:
+            for rate in (float(x) for x in args.rates.split(",")):
+                stages.append(runner.open_stage(rate, args.duration))
+                sys.stderr.write(f"✔ {stages[-1].label}: {stages[-1].throughput:.2f} req/s\n")
+        else:
+            for users in (int(x) for x in args.users.split(",")):
+                stages.append(runner.closed_stage(users, args.duration, args.think_time))
+                sys.stderr.write(f"✔ {stages[-1].label}: {stages[-1].throughput:.2f} req/s\n")
+    except KeyboardInterrupt:
+        sys.stderr.write("\n⏹️ 已中断，输出已完成的各级结果\n")
+    return stages
+
+
+def _report(stages: List[StageResult], args) -> int:
+    print_report(stages)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([s.to_dict() for s in stages], f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+profiling.py
+可选的性能剖析钩子（run_agent / batch_runner）
+
+开启方式：环境变量 AGENT_PROFILE 或调用参数
+    AGENT_PROFILE=true|all   cProfile + 栈采样 + tracemalloc
+    AGENT_PROFILE=cpu        仅 cProfile + 栈采样
+    AGENT_PROFILE=mem        仅 tracemalloc
+    AGENT_PROFILE_DIR        输出目录（默认 data/profiles）
+
+每次剖析写出：
+    <name>.prof       cProfile 统计（pstats / snakeviz 可读）
+    <name>.collapsed  折叠栈（flamegraph.pl / speedscope / inferno 可读）
+    <name>.txt        热点函数 Top-N + 内存分配点 Top-N + 峰值内存
+
+未开启时 profile_run() 只返回 nullcontext，不安装任何钩子。
+
+多个剖析会话可以重叠（服务 / 压测 / 批量并发报价）：tracemalloc 与新线程钩子按引用计数共享，
+最后一个会话结束时才关闭；会话重叠期间的峰值内存为进程内合计。
+
+cProfile 的作用范围随 Python 版本不同：
+    < 3.12   基于 sys.setprofile，只统计调用线程；all_threads=True 时为新线程各挂一个并合并
+    >= 3.12  基于 sys.monitoring，进程内同时只能有一个，且覆盖所有线程。此时使用一个进程级
+             cProfile：最先开始的会话持有它（统计含同时段其他线程/请求的帧），与之重叠的会话
+             只有栈采样，报告中注明。并发批量报价请整批剖析（batch_runner --profile）
+"""
+
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import contextlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles")
+
+_MODES = {"true": {"cpu", "mem"}, "all": {"cpu", "mem"}, "1": {"cpu", "mem"}, "cpu": {"cpu"}, "mem": {"mem"}}
+
+# 分配点统计中忽略剖析工具自身
+_IGNORED_ALLOC_FILES = (__file__, tracemalloc.__file__, cProfile.__file__, pstats.__file__, "<frozen importlib._bootstrap>")
+
+_seq_lock = threading.Lock()
+_seq = 0
+
+# 进程级钩子（tracemalloc、threading.setprofile）由各会话共享，按引用计数开关
+_hooks_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False            # tracemalloc 由本模块启动（结束时由本模块关闭）
+_thread_sessions: List["RunProfiler"] = []   # 为新线程挂 cProfile 的会话（最近开始的优先）
+
+# Python 3.12+ 的 cProfile 基于 sys.monitoring：进程级、同时只能有一个
+_PROCESS_WIDE_CPROFILE = sys.version_info >= (3, 12)
+_process_profile_owner: Optional["RunProfiler"] = None
+
+
+def _thread_hook(*_):
+    """新线程的第一个调用事件：交给最近开始、仍在运行的 all_threads 会话"""
+    sys.setprofile(None)
+    with _hooks_lock:
+        session = _thread_sessions[-1] if _thread_sessions else None
+    if session is not None:
+        session._new_profile(timer=session._thread_timer)
+
+
+def profile_modes(value: Optional[str] = None) -> set:
+    """解析 AGENT_PROFILE，返回 {"cpu", "mem"} 的子集"""
+    value = os.getenv("AGENT_PROFILE", "") if value is None else value
+    return set(_MODES.get(value.strip().lower(), set()))
+
+
+class StackSampler(threading.Thread):
+    """定时采样所有线程调用栈，累积为折叠栈计数（不依赖 cProfile，覆盖工作线程）"""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._labels: Dict[Any, str] = {}     # code 对象 → 帧标签
+        self._stop_event = threading.Event()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels: List[str] = []
+                while frame is not None:
+                    labels.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@dataclass
+class ProfileResult:
+    """一次剖析的输出文件"""
+    stats_path: Optional[str] = None
+    collapsed_path: Optional[str] = None
+    report_path: Optional[str] = None
+    elapsed: float = 0.0
+    peak_memory: Optional[int] = None     # bytes
+
+
+class RunProfiler:
+    """
+    单次运行（或整批）的剖析会话
+
+    all_threads=True 时为之后新建的线程各自挂一个 cProfile（批量模式的线程池），
+    结束时合并统计；需在线程池创建前 start()。
+    """
+
+    def __init__(
+        self,
+        name: str = "quote",
+        modes: Optional[set] = None,
+        output_dir: Optional[str] = None,
+        top_n: int = 25,
+        all_threads: bool = False,
+        sample_interval: float = 0.005,
+    ):
+        global _seq
+        with _seq_lock:
+            _seq += 1
+            seq = _seq
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)[:60]
+        self.name = f"{safe}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{seq}"
+        self.modes = profile_modes() if modes is None else set(modes)
+        self.output_dir = output_dir or os.getenv("AGENT_PROFILE_DIR") or DEFAULT_PROFILE_DIR
+        self.top_n = top_n
+        self.all_threads = all_threads
+        self.sample_interval = sample_interval
+
+        self._profiles: List[cProfile.Profile] = []
+        self._profiles_lock = threading.Lock()
+        self._sampler: Optional[StackSampler] = None
+        self._main_profile: Optional[cProfile.Profile] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._cpu_note: Optional[str] = None
+        self._stopped = False
+        self._start = 0.0
+
+    # ---------- cProfile ----------
+    def _new_profile(self, timer=None) -> Optional[cProfile.Profile]:
+        profile = cProfile.Profile(timer) if timer is not None else cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 同一时刻只允许一个 profiler 的解释器（3.12+）：跳过确定性统计，仍有栈采样
+            return None
+        with self._profiles_lock:
+            self._profiles.append(profile)
+        return profile
+
+    def _thread_timer(self) -> float:
+        """工作线程 cProfile 的计时器：会话结束后在该线程内摘除钩子（disable() 只作用于调用它的线程）"""
+        if self._stopped:
+            sys.setprofile(None)
+        return time.perf_counter()
+
+    # ---------- 进程级钩子 ----------
+    def _acquire_tracemalloc(self) -> None:
+        global _tracemalloc_users, _tracemalloc_owned
+        with _hooks_lock:
+            if _tracemalloc_users == 0:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                    _tracemalloc_owned = True
+                # 峰值只在没有其他会话时重置，避免破坏重叠会话的 peak_memory
+                tracemalloc.reset_peak()
+            _tracemalloc_users += 1
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def _release_tracemalloc(self) -> Tuple[Optional[tracemalloc.Snapshot], Optional[int]]:
+        global _tracemalloc_users, _tracemalloc_owned
+        with _hooks_lock:
+            after = peak = None
+            if tracemalloc.is_tracing():
+                after = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and _tracemalloc_owned:
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                _tracemalloc_owned = False
+        return after, peak
+
+    def _register_thread_hook(self) -> None:
+        with _hooks_lock:
+            if not _thread_sessions:
+                threading.setprofile(_thread_hook)
+            _thread_sessions.append(self)
+
+    def _unregister_thread_hook(self) -> None:
+        with _hooks_lock:
+            if self in _thread_sessions:
+                _thread_sessions.remove(self)
+            if not _thread_sessions:
+                threading.setprofile(None)
+
+    def _acquire_process_profile(self) -> None:
+        """3.12+：进程级 cProfile 由最先开始的会话持有，重叠的会话只做栈采样"""
+        global _process_profile_owner
+        with _hooks_lock:
+            owner = _process_profile_owner
+            if owner is None:
+                _process_profile_owner = self
+        if owner is not None:
+            self._cpu_note = f"与会话 {owner.name} 重叠：进程级 cProfile 由其持有，本会话只有栈采样"
+            return
+        self._main_profile = self._new_profile()
+        if self._main_profile is None:
+            self._release_process_profile()
+            self._cpu_note = "进程内已有其他 cProfile，本会话只有栈采样"
+        else:
+            self._cpu_note = "进程级 cProfile（Python 3.12+）：统计含同时段所有线程，包括其他请求"
+
+    def _release_process_profile(self) -> None:
+        global _process_profile_owner
+        with _hooks_lock:
+            if _process_profile_owner is self:
+                _process_profile_owner = None
+
+    def start(self) -> "RunProfiler":
+        self._start = time.perf_counter()
+        if "mem" in self.modes:
+            self._acquire_tracemalloc()
+        if "cpu" in self.modes:
+            self._sampler = StackSampler(self.sample_interval)
+            self._sampler.start()
+            if _PROCESS_WIDE_CPROFILE:
+                self._acquire_process_profile()
+            else:
+                if self.all_threads:
+                    self._register_thread_hook()
+                self._main_profile = self._new_profile()
+        return self
+
+    def stop(self) -> ProfileResult:
+        result = ProfileResult(elapsed=time.perf_counter() - self._start)
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.name)
+        report = io.StringIO()
+        report.write(f"# {self.name}  用时 {result.elapsed:.3f}s\n")
+
+        self._stopped = True
+        if "cpu" in self.modes:
+            if self.all_threads:
+                self._unregister_thread_hook()
+            with self._profiles_lock:
+                profiles = list(self._profiles)
+            for profile in profiles:
+                profile.disable()
+            self._release_process_profile()
+            self._sampler.stop()
+            if self._cpu_note:
+                report.write(f"注: {self._cpu_note}\n")
+            result.collapsed_path = base + ".collapsed"
+            self._sampler.write_collapsed(result.collapsed_path)
+
+            if profiles:
+                stats = pstats.Stats(profiles[0], stream=report)
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                result.stats_path = base + ".prof"
+                stats.dump_stats(result.stats_path)
+                stats.strip_dirs()
+                report.write(f"\n## 热点函数（累计耗时 Top {self.top_n}）\n")
+                stats.sort_stats("cumulative").print_stats(self.top_n)
+                report.write(f"\n## 热点函数（自身耗时 Top {self.top_n}）\n")
+                stats.sort_stats("tottime").print_stats(self.top_n)
+
+        after = None
+        if "mem" in self.modes and self._snapshot is not None:
+            after, result.peak_memory = self._release_tracemalloc()
+        if after is not None:
+            filters = [tracemalloc.Filter(False, f) for f in _IGNORED_ALLOC_FILES]
+            diff = after.filter_traces(filters).compare_to(self._snapshot.filter_traces(filters), "lineno")
+            report.write(f"\n## 内存分配点（净增长 Top {self.top_n}）\n")
+            report.write(f"峰值内存: {result.peak_memory / 1024 / 1024:.2f} MiB\n")
+            for stat in diff[:self.top_n]:
+                report.write(f"{stat}\n")
+
+        result.report_path = base + ".txt"
+        with open(result.report_path, "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        return result
+
+
+@contextlib.contextmanager
+def _profiling(name: str, modes: set, **kwargs):
+    profiler = RunProfiler(name, modes=modes, **kwargs).start()
+    try:
+        yield profiler
+    finally:
+        result = profiler.stop()
+        print(f"🔬 性能剖析已写入: {result.report_path}", file=sys.stderr)
+
+
+def profile_run(name: str = "quote", enabled: Optional[bool] = None, **kwargs):
+    """
+    剖析上下文；未开启时为空上下文
+
+    Args:
+        name: 输出文件名前缀
+        enabled: True/False 强制开关；None 时取 AGENT_PROFILE
+        **kwargs: 传给 RunProfiler（top_n / output_dir / all_threads ...）
+    """
+    if enabled is False:
+        return contextlib.nullcontext()
+    modes = profile_modes()
+    if enabled and not modes:
+        modes = {"cpu", "mem"}
+    if not modes:
+        return contextlib.nullcontext()
+    return _profiling(name, modes, **kwargs)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+service.py
+报价 HTTP 服务（标准库 ThreadingHTTPServer，无额外依赖）
+
+    GET  /health   存活检查，始终 200（含缓存命中率、预热进度与 LLM 熔断器状态；
+                   熔断器打开时 status 为 "degraded"）
+    GET  /metrics  Prometheus 文本格式指标（熔断器、LLM 池、工具缓存、搜索缓存、预热）
+    GET  /ready    就绪检查：缓存预热进度达到 WARMUP_READY_THRESHOLD 前返回 503，
+                   负载均衡器据此暂缓放流量；响应体含 ready_percent
+    POST /quote    {"query", "drawing_path"?, "production_volume"?, "location"?, "deadline"?} → 报价报告
+                   deadline 为时间预算（秒），或请求头 X-Deadline-Seconds；超时返回 partial 报告
+
+启动时在后台预热工具结果缓存（见 warmup.py；WARMUP_ENABLED=false 关闭）。
+
+用法:
+    python service.py --port 8080
+"""
+
+import os
+import sys
+import json
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+
+class QuoteService:
+    """服务状态：预热器与报价入口"""
+
+    def __init__(self, warmer=None):
+        self.warmer = warmer
+
+    def readiness(self) -> Dict[str, Any]:
+        if self.warmer is None:
+            return {"ready": True, "ready_percent": 100.0}
+        return self.warmer.readiness()
+
+    def health(self) -> Dict[str, Any]:
+        import agent
+        from tools.circuit_breaker import OPEN, get_llm_breaker
+        from tools.search_cache import get_search_cache
+        cache = agent.get_tool_cache()
+        search_cache = get_search_cache()
+        breaker = get_llm_breaker().to_dict()
+        return {
+            "status": "degraded" if breaker["state"] == OPEN else "ok",
+            "llm_breaker": breaker,
+            "llm_pool": agent.llm.stats() if isinstance(agent.llm, agent.LLMPool) else None,
+            "warmup": self.readiness(),
+            "tool_cache": cache.stats() if cache is not None else None,
+            "search_cache": search_cache.stats() if search_cache is not None else None,
+        }
+
+    def metrics(self) -> str:
+        """Prometheus 文本格式"""
+        health = self.health()
+        breaker = health["llm_breaker"]
+        lines = [
+            "# TYPE llm_breaker_state gauge",
+            *[f'llm_breaker_state{{state="{state}"}} {int(breaker["state"] == state)}'
+              for state in ("closed", "open", "half_open")],
+            "# TYPE llm_breaker_calls_total counter",
+            f"llm_breaker_calls_total {breaker['calls']}",
+            "# TYPE llm_breaker_failures_total counter",
+            f"llm_breaker_failures_total {breaker['failures']}",
+            "# TYPE llm_breaker_rejected_total counter",
+            f"llm_breaker_rejected_total {breaker['rejected']}",
+            "# TYPE llm_breaker_opened_total counter",
+            f"llm_breaker_opened_total {breaker['opened']}",
+            "# TYPE llm_breaker_window_error_rate gauge",
+            f"llm_breaker_window_error_rate {breaker['window_error_rate']}",
+            "# TYPE warmup_ready_percent gauge",
+            f"warmup_ready_percent {health['warmup']['ready_percent']}",
+            "# TYPE warmup_timed_out gauge",
+            f"warmup_timed_out {int(health['warmup'].get('timed_out', False))}",
+        ]
+        pool = health["llm_pool"]
+        if pool is not None:
+            lines += ["# TYPE llm_pool_outstanding gauge", "# TYPE llm_pool_failures_total counter",
+                      "# TYPE llm_pool_ejected gauge"]
+            for member in pool["members"]:
+                label = f'{{member="{member["name"]}"}}'
+                lines += [f"llm_pool_outstanding{label} {member['outstanding']}",
+                          f"llm_pool_failures_total{label} {member['failures']}",
+                          f"llm_pool_ejected{label} {int(member['ejected'])}"]
+        cache = health["tool_cache"]
+        if cache is not None:
+            for key in ("hits", "stale_hits", "misses", "refreshes", "refresh_errors"):
+                lines += [f"# TYPE tool_cache_{key}_total counter", f"tool_cache_{key}_total {cache[key]}"]
+            lines += ["# TYPE tool_cache_entries gauge", f"tool_cache_entries {cache['entries']}"]
+        search = health["search_cache"]
+        if search is not None:
+            for key in ("hits", "negative_hits", "deduped", "misses", "errors"):
+                lines += [f"# TYPE search_cache_{key}_total counter", f"search_cache_{key}_total {search[key]}"]
+            lines += ["# TYPE search_cache_entries gauge", f"search_cache_entries {search['entries']}"]
+        return "\n".join(lines) + "\n"
+
+    def quote(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from agent import run_agent
+        return run_agent(
+            request["query"],
+            drawing_path=request.get("drawing_path"),
+            production_volume=request.get("production_volume"),
+            location=request.get("location"),
+            deadline=request.get("deadline"),
+        )
+
+
+def make_handler(service: QuoteService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, service.health())
+            elif self.path == "/metrics":
+                data = service.metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif self.path == "/ready":
+                readiness = service.readiness()
+                self._send(200 if readiness["ready"] else 503, readiness)
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/quote":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("请求体应为 JSON 对象")
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send(400, {"error": f"Invalid JSON: {e}"})
+                return
+            if not request.get("query"):
+                self._send(400, {"error": "缺少 query"})
+                return
+            try:
+                deadline = request.get("deadline")
+                if deadline is None and self.headers.get("X-Deadline-Seconds"):
+                    deadline = self.headers["X-Deadline-Seconds"]
+                if deadline is not None:
+                    deadline = float(deadline)
+                    if not deadline > 0 or deadline == float("inf"):
+                        raise ValueError(deadline)
+                request["deadline"] = deadline
+            except (TypeError, ValueError):
+                self._send(400, {"error": f"deadline 应为正的秒数: {deadline!r}"})
+                return
+            try:
+                self._send(200, service.quote(request))
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, fmt, *args):
+            sys.stderr.write(f"[service] {self.address_string()} {fmt % args}\n")
+
+    return Handler
+
+
+def serve(host: Optional[str] = None, port: Optional[int] = None, warmup: Optional[bool] = None) -> None:
+    host = host or os.getenv("SERVICE_HOST", "0.0.0.0")
+    port = port or int(os.getenv("SERVICE_PORT", "8080"))
+    if warmup is None:
+        warmup = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+
+    warmer = None
+    if warmup:
+        from warmup import start_warmup
+        warmer = start_warmup()
+
+    server = ThreadingHTTPServer((host, port), make_handler(QuoteService(warmer)))
+    print(f"🚀 报价服务已启动: http://{host}:{port}  (/health /ready /metrics /quote)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="制造成本报价 HTTP 服务")
+    parser.add_argument("--host", default=None, help="监听地址（默认 SERVICE_HOST 或 0.0.0.0）")
+    parser.add_argument("--port", type=int, default=None, help="端口（默认 SERVICE_PORT 或 8080）")
+    parser.add_argument("--no-warmup", action="store_true", help="不预热缓存，启动即就绪")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, warmup=False if args.no_warmup else None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+storage 包初始化
+"""
+
+from .quote_store import QuoteStore, get_quote_store
+from .geometry_index import GeometryIndex, get_geometry_index
+from .price_store import MaterialPriceStore, get_material_price_store
+
+__all__ = [
+    'QuoteStore',
+    'get_quote_store',
+    'GeometryIndex',
+    'get_geometry_index',
+    'MaterialPriceStore',
+    'get_material_price_store',
+]
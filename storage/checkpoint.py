@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+checkpoint.py
+本地持久化检查点：LangGraph SQLite checkpointer + 执行阶段单元级完成记录
+
+- LangGraph checkpointer 在每个节点结束时保存图状态（按 thread_id）
+- CellLedger 在 execution 节点内部记录每个 (工艺, 成本维度) 的完成值，
+  进程中途退出后用同一 thread_id 重跑，只补算缺失的单元
+- 报价完成后只保留最终报告（CellLedger.finish），该 thread 的图检查点与单元记录随即删除，
+  批量 --checkpoint 运行时数据库不会随中间状态无限增长
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    SQLITE_CHECKPOINT_AVAILABLE = True
+except ImportError:
+    SQLITE_CHECKPOINT_AVAILABLE = False
+
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "agent_checkpoints.db"
+)
+
+_LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cell_progress (
+    thread_id  TEXT NOT NULL,
+    process    TEXT NOT NULL,
+    dimension  TEXT NOT NULL,
+    value      REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, process, dimension)
+);
+CREATE TABLE IF NOT EXISTS finished_quotes (
+    thread_id   TEXT PRIMARY KEY,
+    report      TEXT NOT NULL,
+    finished_at REAL NOT NULL
+);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class CellLedger:
+    """单元级完成记录与已完成报价（线程安全）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("AGENT_CHECKPOINT_PATH") or DEFAULT_CHECKPOINT_PATH
+        self._lock = threading.Lock()
+        self._conn = _connect(self.path)
+        with self._lock:
+            self._conn.executescript(_LEDGER_SCHEMA)
+
+    def completed(self, thread_id: str) -> Dict[Tuple[str, str], float]:
+        """返回该 thread 已完成的 {(工艺, 维度): 值}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT process, dimension, value FROM cell_progress WHERE thread_id = ?", (thread_id,)
+            ).fetchall()
+        return {(p, d): v for p, d, v in rows}
+
+    def record(self, thread_id: str, process: str, dimension: str, value: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cell_progress VALUES (?, ?, ?, ?, ?)",
+                (thread_id, process, dimension, float(value), time.time()),
+            )
+
+    def clear(self, thread_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cell_progress WHERE thread_id = ?", (thread_id,))
+
+    def finish(self, thread_id: str, report: Dict[str, Any]) -> None:
+        """记录已完成的报价并删除其单元记录（同一事务）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO finished_quotes VALUES (?, ?, ?)",
+                (thread_id, json.dumps(report, ensure_ascii=False), time.time()),
+            )
+            self._conn.execute("DELETE FROM cell_progress WHERE thread_id = ?", (thread_id,))
+
+    def finished(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """已完成报价的报告字典；未完成时为 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT report FROM finished_quotes WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def open_checkpointer(path: Optional[str] = None):
+    """创建 SQLite checkpointer（需要 langgraph-checkpoint-sqlite）"""
+    if not SQLITE_CHECKPOINT_AVAILABLE:
+        raise ImportError("持久化检查点需要安装 langgraph-checkpoint-sqlite")
+    path = path or os.getenv("AGENT_CHECKPOINT_PATH") or DEFAULT_CHECKPOINT_PATH
+    return SqliteSaver(_connect(path))
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+columnar.py
+批量报价结果的列式累积与流式写出（Parquet / CSV）
+
+- 每个 (请求, 工艺) 一行，各成本维度、total、地点、产量、几何为类型化列
+- 浮点列用 array('d')（缺失为 NaN），整数列用 array('q')（缺失为 -1）
+- 每累积 row_group_size 行写出一个行组并清空缓冲，内存占用与批量大小无关
+"""
+
+import csv
+import gzip
+import math
+from array import array
+from typing import Dict, Any, List, Optional, Union
+
+from agent_types import QuoteReport
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+# (列名, 类型)：str / float / int
+COLUMNS = [
+    ("request_id", "str"),
+    ("process", "str"),
+    ("equipment_depreciation", "float"),
+    ("energy", "float"),
+    ("labor", "float"),
+    ("volume_adjustment", "float"),
+    ("material", "float"),
+    ("total", "float"),
+    ("source", "str"),
+    ("error", "str"),
+    ("location", "str"),
+    ("canonical_location", "str"),
+    ("production_volume", "int"),
+    ("surface_area", "float"),
+    ("part_volume", "float"),
+    ("drawing_hash", "str"),
+    ("quote_total", "float"),
+    ("timestamp", "str"),
+]
+
+_NAN = float("nan")
+_INT_NULL = -1
+
+
+class _CsvSink:
+    def __init__(self, path: str):
+        opener = gzip.open if path.endswith(".gz") else open
+        self._file = opener(path, "wt", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in COLUMNS])
+
+    def write(self, columns: Dict[str, List[Any]]) -> None:
+        self._writer.writerows(zip(*(columns[name] for name, _ in COLUMNS)))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetSink:
+    def __init__(self, path: str):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("写出 Parquet 需要安装 pyarrow（或改用 .csv 输出）")
+        types = {"str": pa.string(), "float": pa.float64(), "int": pa.int64()}
+        self._schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, columns: Dict[str, List[Any]]) -> None:
+        table = pa.Table.from_pydict({name: columns[name] for name, _ in COLUMNS}, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class ResultTableWriter:
+    """
+    列式结果表（流式写出）
+
+    用法:
+        with ResultTableWriter("results.parquet") as table:
+            table.append_report("req-1", report)
+    """
+
+    def __init__(self, path: str, row_group_size: int = 10000, fmt: Optional[str] = None):
+        """
+        Args:
+            path: 输出路径（.parquet / .csv / .csv.gz）
+            row_group_size: 每个行组的行数
+            fmt: "parquet" 或 "csv"，缺省按扩展名判断
+        """
+        fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv")
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._sink = _ParquetSink(path) if fmt == "parquet" else _CsvSink(path)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._buf: Dict[str, Union[array, List[Any]]] = {}
+        for name, kind in COLUMNS:
+            self._buf[name] = array("d") if kind == "float" else array("q") if kind == "int" else []
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self.rows_written + self._n
+
+    def append_row(self, row: Dict[str, Any]) -> None:
+        for name, kind in COLUMNS:
+            value = row.get(name)
+            if kind == "float":
+                self._buf[name].append(_NAN if value is None else float(value))
+            elif kind == "int":
+                self._buf[name].append(_INT_NULL if value is None else int(value))
+            else:
+                self._buf[name].append(None if value is None else str(value))
+        self._n += 1
+        if self._n >= self.row_group_size:
+            self.flush()
+
+    def append_report(self, request_id: Any, report: Union[QuoteReport, Dict[str, Any]]) -> int:
+        """把一份报价展开为每个工艺一行，返回新增行数"""
+        if isinstance(report, dict):
+            report = QuoteReport.from_dict(report)
+        drawing = report.drawing_data or {}
+        common = {
+            "request_id": request_id,
+            "location": report.location,
+            "canonical_location": (report.region or {}).get("canonical"),
+            "production_volume": report.production_volume,
+            "surface_area": drawing.get("surface_area"),
+            "part_volume": drawing.get("volume"),
+            "drawing_hash": report.drawing_hash,
+            "quote_total": report.total_cost,
+            "timestamp": report.timestamp,
+        }
+        for process, cell in report.processes.items():
+            costs = cell.costs() if cell.ok else {}
+            self.append_row({
+                **common,
+                **costs,
+                "process": process,
+                "total": cell.total if cell.ok else None,
+                "source": cell.source,
+                "error": cell.error,
+            })
+        return len(report.processes)
+
+    def flush(self) -> None:
+        """写出当前缓冲为一个行组"""
+        if not self._n:
+            return
+        columns: Dict[str, List[Any]] = {}
+        for name, kind in COLUMNS:
+            buf = self._buf[name]
+            if kind == "float":
+                columns[name] = [None if math.isnan(v) else v for v in buf]
+            elif kind == "int":
+                columns[name] = [None if v == _INT_NULL else v for v in buf]
+            else:
+                columns[name] = buf
+        self._sink.write(columns)
+        self.rows_written += self._n
+        self._reset()
+
+    def close(self) -> None:
+        self.flush()
+        self._sink.close()
+
+    def __enter__(self) -> "ResultTableWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+geometry_index.py
+图纸几何索引：文件哈希 → 几何指纹 → 解析结果（SQLite 持久化 + 内存缓存）
+
+- 同一文件改名后再次上传：按内容哈希命中，直接取解析结果，不再调用 OpenCascade
+- 不同 CAD 导出的同一零件：字节不同但几何指纹相同，解析一次后即可关联到历史报价
+- 查询均为主键查找，命中后进入进程内字典缓存
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+
+from .quote_store import DEFAULT_STORE_PATH
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drawing_files (
+    sha256      TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    file_name   TEXT,
+    file_size   INTEGER,
+    created_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS geometries (
+    fingerprint  TEXT PRIMARY KEY,
+    faces        INTEGER,
+    edges        INTEGER,
+    solids       INTEGER,
+    volume       REAL,
+    surface_area REAL,
+    data         TEXT NOT NULL,
+    created_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drawing_files_fp ON drawing_files(fingerprint);
+"""
+
+
+class GeometryIndex:
+    """几何指纹索引（线程安全，默认与历史报价库同一数据库文件）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("GEOMETRY_INDEX_PATH") or os.getenv("QUOTE_STORE_PATH") or DEFAULT_STORE_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._by_file: Dict[str, str] = {}
+        self._by_fingerprint: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def lookup(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """按几何指纹取解析结果"""
+        with self._lock:
+            data = self._by_fingerprint.get(fingerprint)
+            if data is None:
+                row = self._conn.execute(
+                    "SELECT data FROM geometries WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+                if row is None:
+                    return None
+                data = self._by_fingerprint[fingerprint] = json.loads(row[0])
+        return dict(data)
+
+    def lookup_file(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """按文件内容哈希取解析结果（改名的同一文件）"""
+        with self._lock:
+            fingerprint = self._by_file.get(sha256)
+            if fingerprint is None:
+                row = self._conn.execute(
+                    "SELECT fingerprint FROM drawing_files WHERE sha256 = ?", (sha256,)
+                ).fetchone()
+                if row is None:
+                    return None
+                fingerprint = self._by_file[sha256] = row[0]
+        return self.lookup(fingerprint)
+
+    def record(self, sha256: str, data: Dict[str, Any], file_path: Optional[str] = None) -> bool:
+        """
+        记录一次解析结果（需含 fingerprint）
+
+        Returns:
+            该几何此前是否已存在（即改名/重新导出的已知零件）
+        """
+        fingerprint = data.get("fingerprint")
+        if not fingerprint:
+            return False
+        now = time.time()
+        size = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else None
+        with self._lock, self._conn:
+            known = self._conn.execute(
+                "SELECT 1 FROM geometries WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone() is not None
+            if not known:
+                self._conn.execute(
+                    "INSERT INTO geometries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fingerprint, data.get("faces"), data.get("edges"), data.get("solid_count"),
+                     data.get("volume"), data.get("surface_area"),
+                     json.dumps(data, ensure_ascii=False, separators=(",", ":")), now),
+                )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO drawing_files VALUES (?, ?, ?, ?, ?)",
+                (sha256, fingerprint, os.path.basename(file_path) if file_path else None, size, now),
+            )
+            self._by_file[sha256] = fingerprint
+        return known
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geometries").fetchone()[0]
+
+
+_default_index: Optional[GeometryIndex] = None
+_default_lock = threading.Lock()
+
+
+def get_geometry_index() -> GeometryIndex:
+    """进程内共享的几何索引"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = GeometryIndex()
+    return _default_index
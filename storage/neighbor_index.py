@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+neighbor_index.py
+历史成本单元的近邻索引（内存），用于相似零件直接复用报价
+
+- 工艺、规范化地点、是否带图纸几何为精确分区键
+- 分区内特征为 log10(年产量)、log10(表面积)、log10(零件体积)
+- 分区内按 log10(年产量) 排序，检索时先二分截取半径窗口，再计算完整距离
+"""
+
+import math
+import bisect
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from agent_types import COST_DIMENSIONS
+
+
+def cell_features(
+    production_volume: Optional[float],
+    surface_area: Optional[float] = None,
+    part_volume: Optional[float] = None,
+) -> Optional[Tuple[float, ...]]:
+    """构造特征向量；无有效产量时返回 None，几何缺失时只用产量"""
+    if not production_volume or production_volume <= 0:
+        return None
+    if surface_area and part_volume and surface_area > 0 and part_volume > 0:
+        return (math.log10(production_volume), math.log10(surface_area), math.log10(part_volume))
+    return (math.log10(production_volume),)
+
+
+@dataclass
+class _Partition:
+    keys: List[float] = field(default_factory=list)          # 排序后的 log10(年产量)
+    rows: List[Tuple[Tuple[float, ...], Dict[str, float], Any]] = field(default_factory=list)
+
+    def insert(self, features: Tuple[float, ...], costs: Dict[str, float], ref: Any) -> None:
+        pos = bisect.bisect_right(self.keys, features[0])
+        self.keys.insert(pos, features[0])
+        self.rows.insert(pos, (features, costs, ref))
+
+
+@dataclass
+class ReuseMatch:
+    """近邻复用结果"""
+    cell: Dict[str, Any]
+    neighbors: List[Any]
+    spread: float
+
+
+class QuoteNeighborIndex:
+    """历史成本单元近邻索引（线程安全）"""
+
+    def __init__(self, k: int = 3, max_distance: float = 0.1, tolerance: float = 0.05, min_neighbors: int = 2):
+        """
+        Args:
+            k: 参与判断的近邻数
+            max_distance: 特征空间最大欧氏距离（log10 单位，0.1 约为 ±26%）
+            tolerance: 各成本维度近邻之间允许的相对极差
+            min_neighbors: 至少需要的近邻数
+        """
+        self.k = k
+        self.max_distance = max_distance
+        self.tolerance = tolerance
+        self.min_neighbors = min_neighbors
+        self._partitions: Dict[Tuple[str, str, bool], _Partition] = {}
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(
+        self,
+        process: str,
+        location: str,
+        costs: Dict[str, Any],
+        production_volume: Optional[float],
+        surface_area: Optional[float] = None,
+        part_volume: Optional[float] = None,
+        ref: Any = None,
+    ) -> bool:
+        """加入一个成本单元；缺少特征或成本不完整时忽略"""
+        features = cell_features(production_volume, surface_area, part_volume)
+        if features is None:
+            return False
+        try:
+            values = {d: float(costs[d]) for d in COST_DIMENSIONS}
+        except (KeyError, TypeError, ValueError):
+            return False
+        key = (process.lower(), location, len(features) > 1)
+        with self._lock:
+            self._partitions.setdefault(key, _Partition()).insert(features, values, ref)
+            self._size += 1
+        return True
+
+    @classmethod
+    def from_store(cls, store, **kwargs) -> "QuoteNeighborIndex":
+        """从历史报价库加载（只取 LLM 实算的单元，不把复用结果再当作样本）"""
+        index = cls(**kwargs)
+        for row in store.iter_cells():
+            if row.get("error") or row.get("source") not in (None, "llm"):
+                continue
+            index.add(
+                row["process"], row["canonical_location"], row,
+                row["production_volume"], row["surface_area"], row["part_volume"],
+                ref=row["quote_id"],
+            )
+        return index
+
+    def neighbors(
+        self,
+        process: str,
+        location: str,
+        production_volume: Optional[float],
+        surface_area: Optional[float] = None,
+        part_volume: Optional[float] = None,
+    ) -> List[Tuple[float, Dict[str, float], Any]]:
+        """半径内最近的 k 个单元，返回 [(距离, 成本, ref)]，按距离升序"""
+        features = cell_features(production_volume, surface_area, part_volume)
+        if features is None:
+            return []
+        part = self._partitions.get((process.lower(), location, len(features) > 1))
+        if part is None:
+            return []
+
+        r = self.max_distance
+        with self._lock:
+            lo = bisect.bisect_left(part.keys, features[0] - r)
+            hi = bisect.bisect_right(part.keys, features[0] + r)
+            window = part.rows[lo:hi]
+
+        found = []
+        for feats, costs, ref in window:
+            dist = math.sqrt(sum((a - b) ** 2 for a, b in zip(feats, features)))
+            if dist <= r:
+                found.append((dist, costs, ref))
+        found.sort(key=lambda x: x[0])
+        return found[: self.k]
+
+    def lookup(
+        self,
+        process: str,
+        location: str,
+        production_volume: Optional[float],
+        surface_area: Optional[float] = None,
+        part_volume: Optional[float] = None,
+    ) -> Optional[ReuseMatch]:
+        """近邻数量足够且各维度结果一致（相对极差 ≤ tolerance）时返回中位数成本，否则 None"""
+        found = self.neighbors(process, location, production_volume, surface_area, part_volume)
+        if len(found) < self.min_neighbors:
+            return None
+
+        # 以工艺单元总成本为尺度，避免接近 0 的维度（如产量调整）被放大
+        scale = max(abs(sum(c[d] for d in COST_DIMENSIONS)) for _, c, _ in found) or 1.0
+        cell: Dict[str, Any] = {}
+        spread = 0.0
+        for dim in COST_DIMENSIONS:
+            values = sorted(c[dim] for _, c, _ in found)
+            n = len(values)
+            median = values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+            dim_spread = (values[-1] - values[0]) / scale
+            if dim_spread > self.tolerance:
+                return None
+            spread = max(spread, dim_spread)
+            cell[dim] = round(median, 6)
+
+        cell["total"] = round(sum(cell[d] for d in COST_DIMENSIONS), 2)
+        return ReuseMatch(cell=cell, neighbors=[ref for _, _, ref in found], spread=spread)
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+price_store.py
+原材料价格时间序列（SQLite）与内存索引
+
+- 每次抓取到的价格写入 material_prices（材料、价格、来源、时间）
+- 内存索引：每种材料一条按时间排序的序列，最新价与「截至某日」价格都是 O(log n) 查找
+- 增量刷新：只抓取距上次价格超过刷新间隔的材料（MATERIAL_PRICE_REFRESH_SECONDS，
+  可按材料覆盖：MATERIAL_PRICE_REFRESH_ALUMINUM=3600）
+- 抓取失败的材料在短退避期内不再重试（MATERIAL_PRICE_RETRY_SECONDS）；并发刷新同一材料时
+  只有一个调用方抓取，其余等待其结果（同 SearchCache 的 in-flight 合并）
+"""
+
+import os
+import time
+import bisect
+import sqlite3
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .quote_store import TimeLike, _to_epoch
+
+
+DEFAULT_PRICE_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "material_prices.db"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS material_prices (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    material   TEXT    NOT NULL,
+    price      REAL    NOT NULL,
+    currency   TEXT    NOT NULL DEFAULT 'CNY',
+    unit       TEXT    NOT NULL DEFAULT 'kg',
+    source     TEXT,
+    fetched_at REAL    NOT NULL,
+    notes      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_material_prices ON material_prices(material, fetched_at);
+"""
+
+
+@dataclass(slots=True)
+class PricePoint:
+    """某一时刻的材料价格（CNY/kg）"""
+    material: str
+    price: float
+    source: Optional[str]
+    fetched_at: float
+    notes: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "material": self.material,
+            "price": self.price,
+            "source": self.source,
+            "fetched_at": datetime.fromtimestamp(self.fetched_at).isoformat(timespec="seconds"),
+            "notes": self.notes,
+        }
+
+
+def _as_of_epoch(when: TimeLike) -> float:
+    """"2025-03-01" 这样的纯日期按当天结束计（包含当天的价格）"""
+    if isinstance(when, str) and len(when) == 10:
+        return _to_epoch(when) + 86400 - 1e-6
+    return _to_epoch(when)
+
+
+class MaterialPriceStore:
+    """材料价格时间序列（线程安全，单连接 + 锁，WAL 模式）"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        refresh_seconds: Optional[float] = None,
+        intervals: Optional[Dict[str, float]] = None,
+        retry_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            path: 数据库路径（缺省 MATERIAL_PRICE_STORE_PATH 或 data/material_prices.db）
+            refresh_seconds: 默认刷新间隔（缺省 MATERIAL_PRICE_REFRESH_SECONDS，6 小时）
+            intervals: 按材料覆盖的刷新间隔
+            retry_seconds: 抓取失败后的退避时间（缺省 MATERIAL_PRICE_RETRY_SECONDS，5 分钟）
+        """
+        self.path = path or os.getenv("MATERIAL_PRICE_STORE_PATH") or DEFAULT_PRICE_STORE_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else \
+            float(os.getenv("MATERIAL_PRICE_REFRESH_SECONDS", str(6 * 3600)))
+        self.intervals = dict(intervals or {})
+        self.retry_seconds = retry_seconds if retry_seconds is not None else \
+            float(os.getenv("MATERIAL_PRICE_RETRY_SECONDS", "300"))
+
+        self._lock = threading.Lock()
+        self._failed_at: Dict[str, float] = {}      # 材料 -> 最近一次抓取失败时间（仅内存）
+        self._inflight: Dict[str, Future] = {}      # 材料 -> 正在进行的抓取
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        # 材料 -> (时间序列, 价格点)，两者按时间升序对齐
+        self._series: Dict[str, Tuple[List[float], List[PricePoint]]] = {}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            rows = self._conn.execute(
+                "SELECT material, price, source, fetched_at, notes FROM material_prices ORDER BY fetched_at, id"
+            ).fetchall()
+        for material, price, source, fetched_at, notes in rows:
+            self._insert(PricePoint(material, price, source, fetched_at, notes))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _insert(self, point: PricePoint) -> None:
+        times, points = self._series.setdefault(point.material, ([], []))
+        i = bisect.bisect_right(times, point.fetched_at)
+        times.insert(i, point.fetched_at)
+        points.insert(i, point)
+
+    # ---------- 写入 ----------
+    def record(
+        self,
+        material: str,
+        price: float,
+        source: Optional[str] = None,
+        at: Optional[TimeLike] = None,
+        notes: Optional[str] = None,
+    ) -> PricePoint:
+        """写入一个价格点（at 缺省为当前时间）"""
+        point = PricePoint(material, float(price), source, _to_epoch(at) if at is not None else time.time(), notes)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO material_prices (material, price, source, fetched_at, notes) VALUES (?, ?, ?, ?, ?)",
+                (point.material, point.price, point.source, point.fetched_at, point.notes),
+            )
+            self._insert(point)
+        return point
+
+    # ---------- 查询 ----------
+    def latest(self, material: str) -> Optional[PricePoint]:
+        with self._lock:
+            series = self._series.get(material)
+            return series[1][-1] if series else None
+
+    def as_of(self, material: str, when: TimeLike) -> Optional[PricePoint]:
+        """截至某时刻（含）的最后一个价格；该时刻之前没有记录时为 None"""
+        t = _as_of_epoch(when)
+        with self._lock:
+            times, points = self._series.get(material, ([], []))
+            i = bisect.bisect_right(times, t)
+            return points[i - 1] if i else None
+
+    def history(self, material: str, since: Optional[TimeLike] = None,
+                until: Optional[TimeLike] = None) -> List[PricePoint]:
+        with self._lock:
+            times, points = self._series.get(material, ([], []))
+            lo = bisect.bisect_left(times, _to_epoch(since)) if since is not None else 0
+            hi = bisect.bisect_right(times, _as_of_epoch(until)) if until is not None else len(times)
+            return points[lo:hi]
+
+    def materials(self) -> List[str]:
+        with self._lock:
+            return sorted(self._series)
+
+    # ---------- 增量刷新 ----------
+    def interval(self, material: str) -> float:
+        if material in self.intervals:
+            return self.intervals[material]
+        value = os.getenv(f"MATERIAL_PRICE_REFRESH_{material.upper()}")
+        return float(value) if value else self.refresh_seconds
+
+    def is_fresh(self, material: str, now: Optional[float] = None) -> bool:
+        point = self.latest(material)
+        now = now if now is not None else time.time()
+        return point is not None and now - point.fetched_at < self.interval(material)
+
+    def due(self, materials: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """超过刷新间隔（或从未记录）的材料"""
+        now = now if now is not None else time.time()
+        return [m for m in materials if not self.is_fresh(m, now)]
+
+    def backing_off(self, material: str, now: Optional[float] = None) -> bool:
+        """最近抓取失败、仍在退避期内"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            failed_at = self._failed_at.get(material)
+        return failed_at is not None and now - failed_at < self.retry_seconds
+
+    def _claim(self, materials: List[str]) -> Tuple[List[str], Dict[str, Future]]:
+        """
+        Returns:
+            (由本调用方抓取的材料, 其他调用方正在抓取的 {材料: Future})
+        """
+        mine, waiting = [], {}
+        with self._lock:
+            for material in materials:
+                future = self._inflight.get(material)
+                if future is not None:
+                    waiting[material] = future
+                else:
+                    self._inflight[material] = Future()
+                    mine.append(material)
+        return mine, waiting
+
+    def _finish(self, materials: List[str], recorded: Dict[str, PricePoint]) -> None:
+        now = time.time()
+        with self._lock:
+            futures = [(m, self._inflight.pop(m)) for m in materials]
+            for material in materials:
+                if material in recorded:
+                    self._failed_at.pop(material, None)
+                else:
+                    self._failed_at[material] = now
+        for material, future in futures:
+            future.set_result(recorded.get(material))
+
+    def refresh(self, finder, materials: Iterable[str], timeout: Optional[float] = None) -> Dict[str, PricePoint]:
+        """
+        增量刷新：只为到期的材料抓取价格并写入
+
+        到期但仍在失败退避期内的材料跳过；其他调用方正在抓取的材料不重复抓取，等待其结果。
+
+        Args:
+            finder: MaterialPriceFinder（prices(materials, timeout) -> {材料: MaterialPrice}）
+
+        Returns:
+            本次新写入的 {材料: 价格点}（含等待到的其他调用方结果）；未取得价格的材料不写入
+        """
+        now = time.time()
+        due = [m for m in self.due(materials, now) if not self.backing_off(m, now)]
+        if not due:
+            return {}
+        mine, waiting = self._claim(due)
+        recorded: Dict[str, PricePoint] = {}
+        if mine:
+            try:
+                found = finder.prices(mine, timeout=timeout)
+                for material, result in found.items():
+                    if material in mine and result.price_per_unit is not None:
+                        recorded[material] = self.record(material, result.price_per_unit, result.source,
+                                                         notes=result.notes)
+            finally:
+                self._finish(mine, recorded)
+        for material, future in waiting.items():
+            try:
+                point = future.result(timeout=timeout)
+            except FutureTimeout:
+                continue
+            if point is not None:
+                recorded[material] = point
+        return recorded
+
+
+_default_store: Optional[MaterialPriceStore] = None
+_default_lock = threading.Lock()
+
+
+def get_material_price_store() -> MaterialPriceStore:
+    """进程内共享的材料价格库（路径取 MATERIAL_PRICE_STORE_PATH，默认 data/material_prices.db）"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = MaterialPriceStore()
+    return _default_store
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+quote_store.py
+历史报价持久化（SQLite）与索引查询
+
+- 每次报价写入 quotes（报价头）与 quote_cells（每个工艺一行）
+- 索引：工艺、规范化地点/省份、产量档位、图纸哈希、几何指纹、时间
+- 支持「某零件在某地点的最新报价」「浙江上月所有 machining 报价」等查询，
+  以及 CSV / JSONL 批量导出
+"""
+
+import os
+import csv
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Union
+
+from tools.region_rates import resolve_location
+from tools.production_volume_tool import volume_tier
+
+
+DEFAULT_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "quote_history.db"
+)
+
+COST_FIELDS = ["equipment_depreciation", "energy", "labor", "volume_adjustment", "material", "total"]
+
+TimeLike = Union[float, int, str, datetime]
+
+# 旧库升级：表已存在时 CREATE TABLE 不会补列，按需 ALTER TABLE
+_MIGRATIONS = {
+    "quote_cells": {"source": "TEXT", "material": "REAL"},
+    "quotes": {"geometry_fingerprint": "TEXT"},
+}
+
+# 依赖迁移新增列的索引，在 _migrate() 之后创建
+_POST_MIGRATION_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_quotes_geometry  ON quotes(geometry_fingerprint, canonical_location, created_at);
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at         REAL    NOT NULL,
+    query              TEXT,
+    location           TEXT,
+    canonical_location TEXT,
+    province           TEXT,
+    production_volume  INTEGER,
+    volume_bucket      TEXT,
+    drawing_hash       TEXT,
+    geometry_fingerprint TEXT,
+    surface_area       REAL,
+    part_volume        REAL,
+    total_cost         REAL,
+    report             TEXT    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quote_cells (
+    quote_id               INTEGER NOT NULL REFERENCES quotes(id) ON DELETE CASCADE,
+    process                TEXT    NOT NULL,
+    equipment_depreciation REAL,
+    energy                 REAL,
+    labor                  REAL,
+    volume_adjustment      REAL,
+    material               REAL,
+    total                  REAL,
+    error                  TEXT,
+    source                 TEXT,
+    PRIMARY KEY (quote_id, process)
+);
+CREATE INDEX IF NOT EXISTS idx_quotes_created   ON quotes(created_at);
+CREATE INDEX IF NOT EXISTS idx_quotes_location  ON quotes(canonical_location, created_at);
+CREATE INDEX IF NOT EXISTS idx_quotes_province  ON quotes(province, created_at);
+CREATE INDEX IF NOT EXISTS idx_quotes_bucket    ON quotes(volume_bucket, created_at);
+CREATE INDEX IF NOT EXISTS idx_quotes_drawing   ON quotes(drawing_hash, canonical_location, created_at);
+CREATE INDEX IF NOT EXISTS idx_cells_process    ON quote_cells(process);
+"""
+
+
+def _to_epoch(value: Optional[TimeLike]) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+class QuoteStore:
+    """历史报价库（线程安全，单连接 + 锁，WAL 模式）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("QUOTE_STORE_PATH") or DEFAULT_STORE_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(_SCHEMA)
+            self._migrate()
+
+    def _migrate(self) -> None:
+        for table, columns in _MIGRATIONS.items():
+            existing = {r["name"] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+            for name, decl in columns.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        self._conn.executescript(_POST_MIGRATION_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def save(
+        self,
+        report: Dict[str, Any],
+        query: Optional[str] = None,
+        drawing_hash: Optional[str] = None,
+        created_at: Optional[TimeLike] = None,
+    ) -> int:
+        """
+        保存一份报价（output_node 的报告结构）
+
+        Returns:
+            报价 ID
+        """
+        drawing_hash = drawing_hash or report.get("drawing_hash")
+        region = report.get("region") or resolve_location(report.get("location")).to_dict()
+        drawing = report.get("drawing_data") or {}
+        volume = report.get("production_volume")
+
+        row = (
+            _to_epoch(created_at) or time.time(),
+            query,
+            report.get("location"),
+            region.get("canonical"),
+            region.get("province"),
+            volume,
+            volume_tier(volume) if volume is not None else None,
+            drawing_hash,
+            drawing.get("fingerprint"),
+            drawing.get("surface_area"),
+            drawing.get("volume"),
+            report.get("total_cost"),
+            json.dumps(report, ensure_ascii=False, separators=(",", ":")),
+        )
+        cells = []
+        for process, cell in (report.get("processes") or {}).items():
+            if not isinstance(cell, dict):
+                continue
+            source = "reused" if cell.get("reused") else cell.get("source", "llm")
+            if cell.get("degraded") and source == "llm":
+                source = "degraded"     # 含兜底值：不进入近邻复用
+            cells.append((process, *[cell.get(f) for f in COST_FIELDS], cell.get("error"), source))
+
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO quotes (created_at, query, location, canonical_location, province, "
+                "production_volume, volume_bucket, drawing_hash, geometry_fingerprint, surface_area, "
+                "part_volume, total_cost, report) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            quote_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO quote_cells (quote_id, process, equipment_depreciation, energy, labor, "
+                "volume_adjustment, material, total, error, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(quote_id, *c) for c in cells],
+            )
+        return quote_id
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _where(
+        location: Optional[str] = None,
+        province: Optional[str] = None,
+        volume_bucket: Optional[str] = None,
+        drawing_hash: Optional[str] = None,
+        since: Optional[TimeLike] = None,
+        until: Optional[TimeLike] = None,
+        geometry_fingerprint: Optional[str] = None,
+    ) -> tuple:
+        clauses, params = [], []
+        if location is not None:
+            clauses.append("q.canonical_location = ?")
+            params.append(resolve_location(location).canonical)
+        if province is not None:
+            clauses.append("q.province = ?")
+            params.append(resolve_location(province).province)
+        if volume_bucket is not None:
+            clauses.append("q.volume_bucket = ?")
+            params.append(volume_bucket)
+        if drawing_hash is not None:
+            clauses.append("q.drawing_hash = ?")
+            params.append(drawing_hash)
+        if geometry_fingerprint is not None:
+            clauses.append("q.geometry_fingerprint = ?")
+            params.append(geometry_fingerprint)
+        if since is not None:
+            clauses.append("q.created_at >= ?")
+            params.append(_to_epoch(since))
+        if until is not None:
+            clauses.append("q.created_at < ?")
+            params.append(_to_epoch(until))
+        return clauses, params
+
+    def get(self, quote_id: int) -> Optional[Dict[str, Any]]:
+        """按 ID 取完整报告"""
+        with self._lock:
+            row = self._conn.execute("SELECT report FROM quotes WHERE id = ?", (quote_id,)).fetchone()
+        return json.loads(row["report"]) if row else None
+
+    def latest(
+        self,
+        drawing_hash: Optional[str] = None,
+        location: Optional[str] = None,
+        process: Optional[str] = None,
+        volume_bucket: Optional[str] = None,
+        geometry_fingerprint: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """某零件（图纸哈希或几何指纹）在某地点的最新报价，返回完整报告"""
+        clauses, params = self._where(
+            location=location, volume_bucket=volume_bucket, drawing_hash=drawing_hash,
+            geometry_fingerprint=geometry_fingerprint,
+        )
+        if process is not None:
+            clauses.append("EXISTS (SELECT 1 FROM quote_cells c WHERE c.quote_id = q.id AND c.process = ?)")
+            params.append(process)
+        sql = "SELECT q.id, q.report FROM quotes q"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY q.created_at DESC, q.id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        if not row:
+            return None
+        report = json.loads(row["report"])
+        report["quote_id"] = row["id"]
+        return report
+
+    def find_cells(
+        self,
+        process: Optional[str] = None,
+        location: Optional[str] = None,
+        province: Optional[str] = None,
+        volume_bucket: Optional[str] = None,
+        drawing_hash: Optional[str] = None,
+        since: Optional[TimeLike] = None,
+        until: Optional[TimeLike] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        按条件查询成本单元（每个报价 × 工艺一行），按时间倒序
+
+        例：store.find_cells(process="machining", province="浙江", since=time.time() - 30 * 86400)
+        """
+        return list(self.iter_cells(
+            process=process, location=location, province=province, volume_bucket=volume_bucket,
+            drawing_hash=drawing_hash, since=since, until=until, limit=limit,
+        ))
+
+    def hot_combinations(self, limit: int = 50, since: Optional[TimeLike] = None) -> List[Dict[str, Any]]:
+        """
+        最常报价的 (工艺, 规范化地点, 产量档位) 组合，按次数倒序（缓存预热用）
+
+        Returns:
+            [{"process", "location", "volume_bucket", "production_volume"（组内平均产量）, "count"}]
+        """
+        clauses, params = self._where(since=since)
+        clauses.append("c.error IS NULL")
+        sql = (
+            "SELECT c.process, q.canonical_location AS location, q.volume_bucket, "
+            "CAST(AVG(q.production_volume) AS INTEGER) AS production_volume, COUNT(*) AS count "
+            "FROM quote_cells c JOIN quotes q ON q.id = c.quote_id "
+            "WHERE " + " AND ".join(clauses) + " "
+            "GROUP BY c.process, q.canonical_location, q.volume_bucket "
+            "ORDER BY count DESC, MAX(q.created_at) DESC LIMIT ?"
+        )
+        params.append(int(limit))
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def iter_cells(self, process: Optional[str] = None, limit: Optional[int] = None, **filters) -> Iterator[Dict[str, Any]]:
+        """流式遍历成本单元（批量导出/分析用，不一次性加载）"""
+        clauses, params = self._where(**filters)
+        if process is not None:
+            clauses.append("c.process = ?")
+            params.append(process)
+        sql = (
+            "SELECT q.id AS quote_id, q.created_at, q.location, q.canonical_location, q.province, "
+            "q.production_volume, q.volume_bucket, q.drawing_hash, q.surface_area, q.part_volume, "
+            "c.process, " + ", ".join(f"c.{f}" for f in COST_FIELDS) + ", c.error, c.source "
+            "FROM quote_cells c JOIN quotes q ON q.id = c.quote_id"
+        )
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY q.created_at DESC, q.id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        # 独立游标分批取数，避免长时间持锁
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            batch = cur.fetchmany(500)
+        while batch:
+            for row in batch:
+                yield dict(row)
+            with self._lock:
+                batch = cur.fetchmany(500)
+
+    # ------------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------------
+    def export_csv(self, path: str, **filters) -> int:
+        """导出成本单元为 CSV，返回行数"""
+        count = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = None
+            for row in self.iter_cells(**filters):
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def export_jsonl(self, path: str, **filters) -> int:
+        """导出成本单元为 JSONL，返回行数"""
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for row in self.iter_cells(**filters):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+
+_default_store: Optional[QuoteStore] = None
+_default_lock = threading.Lock()
+
+
+def get_quote_store() -> QuoteStore:
+    """进程内共享的报价库（路径取 QUOTE_STORE_PATH，默认 data/quote_history.db）"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = QuoteStore()
+    return _default_store
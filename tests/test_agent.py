@@ -11,10 +11,12 @@ load_dotenv()
 import sys
 import os
 
+import pytest
+
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from agent import run_agent
+from agent import requote, run_agent
 
 
 def test_basic_query():
@@ -106,6 +108,139 @@ def test_volume_impact():
     print("\n✅ 测试4完成")
 
 
+@pytest.fixture
+def stand_in_agent(tmp_path, monkeypatch):
+    """替身 LLM + 固定材料价格 + 临时存储目录（不访问 Azure / 外网，不写 data/）"""
+    import agent
+    import storage.geometry_index as geometry_index
+    import storage.price_store as price_store
+    import storage.quote_store as quote_store
+    import tools.consensus as consensus
+    from load_test import StandInLLM
+    from tools.circuit_breaker import CircuitBreaker
+    from tools.material_price_tool import DEFAULT_PRICES, MaterialPrice
+
+    class FixedPriceFinder:
+        can_fetch = True
+
+        def prices(self, materials, timeout=None):
+            return {m: MaterialPrice(m, DEFAULT_PRICES[m], "stand-in", "", "q") for m in materials}
+
+    for key, name in (("QUOTE_STORE_PATH", "quotes.db"), ("GEOMETRY_INDEX_PATH", "geometry.db"),
+                      ("AGENT_CHECKPOINT_PATH", "checkpoints.db"), ("MATERIAL_PRICE_STORE_PATH", "prices.db")):
+        monkeypatch.setenv(key, str(tmp_path / name))
+    monkeypatch.setattr(quote_store, "_default_store", None)
+    monkeypatch.setattr(geometry_index, "_default_index", None)
+    monkeypatch.setattr(price_store, "_default_store", None)
+    for name in ("_neighbor_index", "_cost_planner", "_tool_cache", "_cell_ledger", "_checkpointed_agent"):
+        monkeypatch.setattr(agent, name, None)
+    monkeypatch.setattr(consensus, "get_llm_breaker", lambda breaker=CircuitBreaker(): breaker)
+
+    material = agent.material_tool.func.__self__
+    monkeypatch.setattr(material, "_finder", FixedPriceFinder())
+    monkeypatch.setattr(material, "_store", None)
+    monkeypatch.setattr(material, "use_store", False)
+    monkeypatch.setattr(material, "offline", False)
+
+    llm = StandInLLM(median=0.001, sigma=0.1, seed=7)
+    previous = agent.equipment_tool.func.__self__.llm
+    agent.use_llm(llm)
+    yield agent
+    agent.use_llm(previous)
+
+
+def test_requote(stand_in_agent):
+    """测试5：增量重算（只改产量 / 地点），替身 LLM"""
+    query = "估算 melting, casting, machining, inspection 这4个工艺的费率"
+    first = stand_in_agent.run_agent(query=query, production_volume=1_100_000, location="Ningbo, Zhejiang")
+    assert not first.get("degraded_cells")
+
+    # 产量变化：只重算设备折旧、人工与产量调整
+    second = stand_in_agent.requote(first, production_volume=300_000)
+    assert second["diff"]["changed_inputs"] == ["volume"]
+    assert {cell.split(".")[1] for cell in second["diff"]["recomputed"]} == \
+        {"equipment_depreciation", "labor", "volume_adjustment"}
+    assert second["plan"]["cells"]["casting"]["energy"] == "kept"
+
+    # 地点变化：只重算能源与人工
+    third = stand_in_agent.requote(second, location="Suzhou, Jiangsu")
+    assert third["diff"]["changed_inputs"] == ["location"]
+    assert {cell.split(".")[1] for cell in third["diff"]["recomputed"]} == {"energy", "labor"}
+    assert third["diff"]["total_after"] == third["total_cost"]
+
+    # 输入未变：不重算任何单元
+    assert stand_in_agent.requote(third, location="Suzhou, Jiangsu")["diff"]["recomputed"] == []
+
+
+def test_load_test_stages_measure_cold_requests(stand_in_agent, monkeypatch):
+    """测试6：压测默认关闭跨请求复用，各级每个请求的 LLM 调用数相同"""
+    from load_test import LoadRunner, agent_target, isolation_env
+
+    for name, value in isolation_env(stand_in=False).items():   # 模拟导入 agent 前写入的环境变量
+        monkeypatch.setattr(stand_in_agent, name, value == "true")
+    llm = stand_in_agent.equipment_tool.func.__self__.llm
+    target = agent_target()
+    request = {"query": "估算 melting, casting, machining 这3个工艺的费率",
+               "production_volume": 1_100_000, "location": "Ningbo, Zhejiang"}
+    runner = LoadRunner(lambda _: target(request), llm=llm, seed=1)
+
+    stages = [runner.closed_stage(users, duration=0.5) for users in (1, 2)]
+    assert all(stage.completed and not stage.errors for stage in stages)
+    per_request = [stage.llm_calls / stage.completed for stage in stages]
+    assert per_request[0] == per_request[1] > 0
+
+
+def test_checkpoint_resumes_interrupted_quote(stand_in_agent, monkeypatch):
+    """测试7：执行中途退出后用同一 thread_id 续跑，已完成单元不再调用 LLM；完成后重跑直接返回报告"""
+    from load_test import StandInLLM
+
+    class Crash(BaseException):
+        """模拟进程中途退出（不被工具的异常兜底捕获）"""
+
+    class CrashingLLM(StandInLLM):
+        def __init__(self, crash_after=None):
+            super().__init__(median=0.001, sigma=0.1, seed=3)
+            self.crash_after = crash_after
+
+        def invoke(self, prompt, *args, **kwargs):
+            if self.crash_after is not None and self.calls >= self.crash_after:
+                raise Crash()
+            return super().invoke(prompt, *args, **kwargs)
+
+    for name in ("TOOL_CACHE_ENABLED", "PLANNER_MEMO_ENABLED", "REUSE_ENABLED", "QUOTE_STORE_ENABLED"):
+        monkeypatch.setattr(stand_in_agent, name, False)
+    query = "估算 melting, casting, machining 这3个工艺的费率"
+    kwargs = dict(query=query, production_volume=1_100_000, location="Ningbo, Zhejiang")
+
+    baseline = CrashingLLM()
+    stand_in_agent.use_llm(baseline)
+    stand_in_agent.run_agent(**kwargs)
+    assert baseline.calls > 4
+
+    stand_in_agent.use_llm(CrashingLLM(crash_after=4))
+    with pytest.raises(Crash):
+        stand_in_agent.run_agent(**kwargs, thread_id="batch:1")
+    recorded = stand_in_agent.get_cell_ledger().completed("batch:1")
+    assert len([cell for cell in recorded if cell[1] != "material"]) == 4   # 原材料为联网取数，不计 LLM
+
+    resumed = CrashingLLM()
+    stand_in_agent.use_llm(resumed)
+    first = stand_in_agent.run_agent(**kwargs, thread_id="batch:1")
+    assert resumed.calls == baseline.calls - 4
+    assert set(first["processes"]) == {"melting", "casting", "machining"}
+
+    # 完成后：图检查点与单元记录已删除，只保留最终报告
+    graph = stand_in_agent.get_checkpointed_agent()
+    assert list(graph.checkpointer.list({"configurable": {"thread_id": "batch:1"}})) == []
+    assert stand_in_agent.get_cell_ledger().completed("batch:1") == {}
+
+    rerun = CrashingLLM(crash_after=0)
+    stand_in_agent.use_llm(rerun)
+    again = stand_in_agent.run_agent(**kwargs, thread_id="batch:1")
+    assert rerun.calls == 0
+    assert again["total_cost"] == first["total_cost"] and again["processes"] == first["processes"]
+
+
 if __name__ == "__main__":
     # 运行所有测试
     test_basic_query()
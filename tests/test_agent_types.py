@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+测试报价结果类型（CostCell / QuoteReport）与旧版字典结构的兼容性
+"""
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_types import AssemblyPart, AssemblyReport, CostCell, QuoteDiff, QuoteReport, stale_dimensions
+
+
+def test_report_round_trip():
+    cells = {
+        "casting": CostCell.from_costs("casting", 1.2, 1.1, 0.6, -0.3),
+        "inspection": CostCell.failed("inspection", "timeout"),
+    }
+    report = QuoteReport(location="Ningbo, Zhejiang", production_volume=1_100_000, processes=cells)
+    data = report.to_dict()
+
+    assert data["total_cost"] == 2.6
+    assert data["processes"]["casting"] == {
+        "equipment_depreciation": 1.2, "energy": 1.1, "labor": 0.6, "volume_adjustment": -0.3, "material": 0.0,
+        "total": 2.6,
+    }
+    assert data["processes"]["inspection"] == {"error": "timeout"}
+    assert QuoteReport.from_dict(data).to_dict() == data
+
+
+def test_cells_are_slotted():
+    cell = CostCell.from_costs("melting", 0.5, 2.5, 0.4, -0.3, source="reused", neighbors=[1, 2])
+    assert not hasattr(cell, "__dict__")
+    assert cell.to_dict()["reused"] is True
+
+
+def test_assembly_total_is_volume_weighted():
+    def part(key, quantity, volume, cost):
+        report = QuoteReport("Ningbo", 1000, {"casting": CostCell.from_costs("casting", cost, 0, 0, 0)})
+        return AssemblyPart(key, quantity, {"volume": volume}, report=report)
+
+    assembly = AssemblyReport("Ningbo", 1000, [part("bolt", 10, 1.0, 4.0), part("housing", 1, 90.0, 2.0)])
+    assert assembly.solid_count == 11
+    # (4×10 + 2×90) / 100
+    assert assembly.total_cost == 2.2
+    assert assembly.to_dict()["parts"][0]["unit_cost"] == 4.0
+
+
+def test_stale_dimensions_follow_declared_inputs():
+    assert stale_dimensions(["volume"]) == ("equipment_depreciation", "labor", "volume_adjustment")
+    assert stale_dimensions(["location"]) == ("energy", "labor")
+    assert stale_dimensions(["geometry"]) == ("energy",)
+    assert stale_dimensions(["alloy", "as_of"]) == ("material",)
+    assert stale_dimensions([]) == ()
+
+
+def test_quote_diff_between_reports():
+    before = QuoteReport(location="Ningbo, Zhejiang", production_volume=1_100_000, processes={
+        "casting": CostCell.from_costs("casting", 1.2, 1.1, 0.6, -0.3),
+        "inspection": CostCell.from_costs("inspection", 0.2, 0.1, 0.5, 0.0),
+    })
+    after = QuoteReport(location="Ningbo, Zhejiang", production_volume=300_000, processes={
+        "casting": CostCell.from_costs("casting", 1.5, 1.1, 0.7, 0.2),
+        "melting": CostCell.from_costs("melting", 0.5, 2.0, 0.3, 0.0, 19.4),
+    }, material_as_of="2024-06-30")
+    diff = QuoteDiff.between(before, after, ["volume"], ["casting.labor"])
+    data = diff.to_dict()
+
+    assert set(data["cells"]["casting"]) == {"equipment_depreciation", "labor", "volume_adjustment", "total"}
+    assert data["cells"]["casting"]["total"] == {"before": 2.6, "after": 3.5}
+    assert (data["added"], data["removed"]) == (["melting"], ["inspection"])
+    assert data["total_delta"] == round(after.total_cost - before.total_cost, 2)
+
+    after.diff = data
+    round_trip = QuoteReport.from_dict(after.to_dict())
+    assert round_trip.diff == data and round_trip.material_as_of == "2024-06-30"
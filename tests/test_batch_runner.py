@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+测试批量报价的断点续跑（纯本地，不启动 Agent）
+"""
+import os
+import sys
+import json
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_runner import load_checkpoint
+
+
+def _write(path, records, tail=""):
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(r) + "\n" for r in records)
+        f.write(tail)
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [(r["line"], r["ok"]) for r in map(json.loads, f)]
+
+
+def test_checkpoint_truncates_partial_line_and_keeps_failures(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    _write(path, [{"line": 1, "ok": True}, {"line": 2, "ok": False}], tail='{"line": 3, "ok')
+    assert load_checkpoint(path) == {1, 2}
+    assert _lines(path) == [(1, True), (2, False)]
+
+
+def test_retry_failed_drops_superseded_failure_records(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    _write(path, [{"line": 1, "ok": True}, {"line": 2, "ok": False}, {"line": 3, "ok": False},
+                  {"line": 3, "ok": True}])
+    assert load_checkpoint(path, retry_failed=True) == {1, 3}
+    assert _lines(path) == [(1, True), (3, True)]      # 行 2 将被重做，旧失败记录已删除
+
+    with open(path, "a", encoding="utf-8") as f:         # 重做后追加新记录
+        f.write(json.dumps({"line": 2, "ok": True}) + "\n")
+    assert load_checkpoint(path, retry_failed=True) == {1, 2, 3}
+    assert sorted(_lines(path)) == [(1, True), (2, True), (3, True)]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+测试 LLM 熔断器与兜底值标记（无需 LLM）
+"""
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, collect_fallbacks,
+)
+from tools.equipment_depreciation_tool import EquipmentDepreciationTool
+
+
+def _fail(breaker):
+    with pytest.raises(RuntimeError):
+        with breaker.guard():
+            raise RuntimeError("timeout")
+
+
+def test_opens_on_error_rate_and_recovers_via_half_open():
+    breaker = CircuitBreaker(min_calls=4, error_rate=0.5, open_seconds=0.05)
+    with breaker.guard():
+        pass
+    for _ in range(3):
+        _fail(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            pass
+    assert breaker.to_dict()["rejected"] == 1
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    _fail(breaker)                  # 探测失败 → 重新打开
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    with breaker.guard():           # 探测成功 → 关闭
+        pass
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_slow_calls():
+    breaker = CircuitBreaker(min_calls=2, slow_call_seconds=0.0, slow_rate=1.0)
+    for _ in range(2):
+        breaker.record(True, 0.5)
+    assert breaker.state == OPEN
+
+
+def test_open_breaker_returns_flagged_fallback_instantly(monkeypatch):
+    from tools import consensus
+
+    breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+    breaker.record(False, 30.0)
+    monkeypatch.setattr(consensus, "get_llm_breaker", lambda: breaker)
+
+    class SlowLLM:
+        def invoke(self, prompt):
+            time.sleep(5)
+
+    tool = EquipmentDepreciationTool(SlowLLM()).as_tool()
+    start = time.monotonic()
+    with collect_fallbacks() as fallbacks:
+        value = tool.invoke({"process": "casting", "volume": 100000})
+    assert time.monotonic() - start < 1
+    assert value > 0
+    assert fallbacks and "熔断器" in fallbacks[0]
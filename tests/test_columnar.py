@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+测试批量结果列式表（CSV 行组流式写出）
+"""
+import os
+import sys
+import csv
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_types import CostCell, QuoteReport
+from storage.columnar import ResultTableWriter
+
+
+def _report():
+    return QuoteReport(
+        location="Ningbo, Zhejiang",
+        production_volume=1_100_000,
+        processes={
+            "casting": CostCell.from_costs("casting", 1.2, 1.1, 0.6, -0.3),
+            "inspection": CostCell.failed("inspection", "timeout"),
+        },
+        drawing_data={"surface_area": 1000.0, "volume": 500.0},
+    )
+
+
+def test_rows_flushed_in_groups():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.csv")
+        table = ResultTableWriter(path, row_group_size=3)
+        for i in range(5):
+            table.append_report(f"req-{i}", _report())
+        # 10 行中已写出 3 个完整行组，缓冲里只剩 1 行
+        assert table.rows_written == 9
+        table.close()
+
+        with open(path, encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 10
+        assert rows[0]["process"] == "casting" and float(rows[0]["total"]) == 2.6
+        assert rows[1]["error"] == "timeout" and rows[1]["total"] == ""
+        assert rows[0]["production_volume"] == "1100000"
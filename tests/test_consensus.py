@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+测试多样本共识估算（替身 LLM，无需 Azure）
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tools.consensus as consensus
+from tools.circuit_breaker import CircuitBreaker
+from tools.consensus import collect_consensus, estimate, robust_consensus
+from tools.labor_cost_tool import LaborCostTool
+
+
+@pytest.fixture(autouse=True)
+def fresh_breaker(monkeypatch):
+    """每个测试用独立的熔断器，不受其他测试打开的进程级熔断器影响"""
+    breaker = CircuitBreaker()
+    monkeypatch.setattr(consensus, "get_llm_breaker", lambda: breaker)
+    return breaker
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+
+class SequenceLLM:
+    """依次返回预设文本（线程安全），记录调用次数"""
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt, *args, **kwargs):
+        with self._lock:
+            text = self.outputs[self.calls % len(self.outputs)]
+            self.calls += 1
+        return _Response(text)
+
+
+def test_robust_consensus_rejects_outliers():
+    result = robust_consensus([1.20, 1.25, 1.18, 1.22, 9.50])
+    assert result.median == 1.21
+    assert result.rejected == 1 and result.samples == 5
+    assert round(result.spread, 2) == 0.07
+
+    # 多数样本相同（MAD=0）时不会把小幅差异判为离群
+    same = robust_consensus([2.0, 2.0, 2.0, 2.05])
+    assert same.rejected == 0 and same.median == 2.0
+
+
+def test_estimate_falls_back_to_concurrent_calls():
+    llm = SequenceLLM(["0.80", "0.85\n说明", "abc", "0.82", "40"])
+    with collect_consensus() as collected:
+        value = estimate(llm, "prompt", n=5)
+    assert llm.calls == 5
+    assert value == 0.82
+    assert collected[0].samples == 4 and collected[0].rejected == 1
+
+    single = SequenceLLM(["1.5"])
+    assert estimate(single, "prompt", n=1) == 1.5 and single.calls == 1
+
+
+def test_tool_uses_consensus_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_CONSENSUS_N", "3")
+    llm = SequenceLLM(["1.10", "1.30", "1.20"])
+    tool = LaborCostTool(llm).as_tool()
+    with collect_consensus() as collected:
+        value = tool.invoke({"process": "casting", "location": "Ningbo, Zhejiang", "volume": 100000})
+    assert value == 1.2 and llm.calls == 3
+    assert collected[0].to_dict()["spread"] == 0.2
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+测试成本维度调用计划（纯本地，无需 LLM）
+"""
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cost_planner import CostPlanner, DimensionMemo
+from tools.process_catalog import ProcessCatalog
+from tools.region_rates import resolve_location
+
+
+def _planner(**kwargs):
+    return CostPlanner(ProcessCatalog.from_file(), **kwargs)
+
+
+def test_catalog_rules_skip_llm_calls():
+    """检测能耗走本地计算；产量调整同一档位只调用一次"""
+    plan = _planner().plan(["melting", "inspection"], 1_100_000, resolve_location("Ningbo, Zhejiang"))
+    assert plan.step("inspection", "energy").mode == "parametric"
+    assert plan.step("melting", "volume_adjustment").mode == "llm"
+    assert plan.step("inspection", "volume_adjustment").mode == "memo"
+    assert plan.step("melting", "material").mode == "fetch"           # 联网抓价，不计入 LLM 调用
+    assert plan.step("inspection", "material").mode == "static"     # 原材料只在熔炼计价
+    assert plan.to_dict()["baseline_calls"] == 8                    # 原材料不是 LLM 调用，不计入基线
+    assert plan.llm_calls == 6 and plan.fetches == 1
+    assert plan.to_dict()["saved_calls"] == 2
+    assert plan.summary() == "LLM 调用 6/8（节省 2），联网取数 1"
+
+
+def test_memo_reused_across_requests():
+    planner = _planner()
+    region = resolve_location("Ningbo, Zhejiang")
+    first = planner.plan(["machining"], 1_100_000, region)
+    planner.memo.put(first.step("machining", "volume_adjustment").memo_key, -0.25)
+
+    second = planner.plan(["casting"], 2_000_000, region)
+    step = second.step("casting", "volume_adjustment")
+    assert (step.mode, step.value) == ("memo", -0.25)
+    # 不同产量档位不复用
+    assert planner.plan(["casting"], 50_000, region).step("casting", "volume_adjustment").mode == "llm"
+
+
+def test_disabled_and_neighbor_reuse():
+    region = resolve_location("Ningbo, Zhejiang")
+    plan = _planner(enabled=False).plan(["inspection", "cmm"], 1_100_000, region, reused=["cmm"])
+    assert plan.llm_calls == 4 and plan.step("inspection", "material").mode == "fetch"
+    assert set(plan.to_dict()["cells"]["cmm"].values()) == {"neighbor"}
+
+
+def test_memo_expires_with_dimension_ttl():
+    planner = _planner(memo=DimensionMemo(ttls={"volume_adjustment": (0.05, 0.05)}))
+    region = resolve_location("Ningbo, Zhejiang")
+    key = planner.plan(["machining"], 1_100_000, region).step("machining", "volume_adjustment").memo_key
+    planner.memo.put(key, -0.25)
+    assert planner.memo.get(key) == -0.25
+    time.sleep(0.06)
+    assert planner.memo.get(key) is None
+    assert planner.plan(["casting"], 1_100_000, region).step("casting", "volume_adjustment").mode == "llm"
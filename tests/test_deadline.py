@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+测试报价截止时间的传播与兜底（替身 LLM，无需 Azure）
+"""
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_types import CostCell, QuoteReport
+from tools.circuit_breaker import CLOSED, CircuitBreaker, collect_fallbacks
+from tools.deadline import DeadlineExceeded, deadline_scope, remaining, run_within_deadline
+from tools.labor_cost_tool import LaborCostTool
+
+
+class _Response:
+    content = "0.80"
+
+
+class SlowLLM:
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt, *args, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return _Response()
+
+
+def test_scope_nests_to_earliest_deadline():
+    assert remaining() is None
+    now = time.time()
+    with deadline_scope(now + 10):
+        with deadline_scope(now + 1):
+            assert remaining() < 1.01
+        with deadline_scope(None):
+            assert remaining() > 9
+    assert remaining() is None
+
+
+def test_run_within_deadline_abandons_slow_call():
+    with deadline_scope(time.time() + 0.2):
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            run_within_deadline(time.sleep, 2)
+        assert time.monotonic() - start < 0.5
+    with deadline_scope(time.time() + 0.1):
+        # 剩余时间不足以发起调用：不调用
+        with pytest.raises(DeadlineExceeded):
+            run_within_deadline(pytest.fail, "不应被调用")
+
+
+def test_tool_falls_back_at_deadline_without_tripping_breaker(monkeypatch):
+    from tools import consensus
+
+    breaker = CircuitBreaker(min_calls=1)
+    monkeypatch.setattr(consensus, "get_llm_breaker", lambda: breaker)
+    llm = SlowLLM(delay=2)
+    tool = LaborCostTool(llm).as_tool()
+    start = time.monotonic()
+    with deadline_scope(time.time() + 0.7), collect_fallbacks() as fallbacks:
+        value = tool.invoke({"process": "casting", "location": "Ningbo, Zhejiang", "volume": 100000})
+    assert time.monotonic() - start < 1.2
+    assert value > 0 and fallbacks
+    assert breaker.state == CLOSED and breaker.calls == 0
+
+
+def test_partial_report_lists_degraded_cells():
+    cell = CostCell.from_costs("casting", 1.0, 0.5, 0.5, 0.0, degraded=["energy", "labor"])
+    report = QuoteReport(location="宁波", production_volume=1000, processes={"casting": cell}, partial=True)
+    data = report.to_dict()
+    assert data["partial"] is True
+    assert data["degraded_cells"] == ["casting.energy", "casting.labor"]
+    assert QuoteReport.from_dict(data).partial is True
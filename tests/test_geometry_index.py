@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+测试图纸几何索引（SQLite，本地临时文件，无需 OpenCascade / LLM）
+"""
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.geometry_index import GeometryIndex
+from storage.quote_store import QuoteStore
+
+
+_GEOMETRY = {"surface_area": 1000.0, "volume": 500.0, "fingerprint": "fp-housing",
+             "faces": 42, "edges": 96, "solid_count": 1}
+
+
+def test_renamed_and_reexported_drawings():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.db")
+        index = GeometryIndex(path)
+        assert index.lookup_file("sha-a") is None
+        assert index.record("sha-a", _GEOMETRY, "housing_v1.stp") is False
+
+        # 重新导出：字节不同，几何指纹相同
+        assert index.record("sha-b", dict(_GEOMETRY), "HOUSING-export.step") is True
+        assert len(index) == 1
+        index.close()
+
+        # 重新打开后按内容哈希命中（改名的同一文件）
+        reopened = GeometryIndex(path)
+        assert reopened.lookup_file("sha-a")["volume"] == 500.0
+        assert reopened.lookup_file("sha-b")["fingerprint"] == "fp-housing"
+        assert reopened.record("sha-c", {"volume": 1.0}) is False   # 无指纹不入索引
+        reopened.close()
+
+
+def test_latest_quote_by_geometry_fingerprint():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = QuoteStore(os.path.join(tmp, "quotes.db"))
+        report = {
+            "location": "Ningbo, Zhejiang", "production_volume": 500000, "total_cost": 3.0,
+            "processes": {"casting": {"equipment_depreciation": 1.0, "energy": 1.0, "labor": 0.5,
+                                      "volume_adjustment": 0.5, "total": 3.0}},
+            "drawing_data": _GEOMETRY,
+        }
+        quote_id = store.save(report, drawing_hash="sha-a")
+        found = store.latest(geometry_fingerprint="fp-housing", location="宁波", volume_bucket="medium")
+        assert found["quote_id"] == quote_id
+        assert store.latest(geometry_fingerprint="fp-other") is None
+        store.close()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+测试多端点 LLM 池（本地 OpenAI 兼容替身服务器，无需 Azure）
+"""
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+
+from llm_pool import LLMPool, PoolMember, build_llm_pool
+
+
+class StandInServer:
+    """OpenAI 兼容的 /v1/chat/completions 替身：固定回复、可配置延迟与失败"""
+
+    def __init__(self, reply="0.50", delay=0.0, status=200):
+        self.reply, self.delay, self.status = reply, delay, status
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                time.sleep(server.delay)
+                if server.status != 200:
+                    payload = {"error": {"message": "unavailable", "type": "server_error"}}
+                else:
+                    payload = {
+                        "id": "x", "object": "chat.completion", "created": 0, "model": body["model"],
+                        "choices": [{"index": i, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": server.reply}}
+                                    for i in range(body.get("n", 1))],
+                        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                    }
+                data = json.dumps(payload).encode()
+                self.send_response(server.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server = StandInServer(**kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.close()
+
+
+def test_pool_routes_and_ejects_unhealthy_member(servers):
+    good_a, good_b, bad = servers(reply="0.50"), servers(reply="0.50"), servers(status=503)
+    pool = build_llm_pool({
+        "members": [{"name": name, "base_url": s.base_url, "model": "stand-in"}
+                    for name, s in (("a", good_a), ("b", good_b), ("bad", bad))],
+        "eject_after": 2, "eject_seconds": 60,
+    })
+    for _ in range(12):
+        assert pool.invoke("估算").content == "0.50"     # 失败成员的调用转到其他成员重试
+    stats = {m["name"]: m for m in pool.stats()["members"]}
+    assert stats["bad"]["ejected"] and bad.requests == 2
+    assert good_a.requests > 0 and good_b.requests > 0
+    assert pool.accepts_timeout
+
+
+def test_least_outstanding_spreads_concurrent_calls_by_weight(servers):
+    fast, slow = servers(delay=0.2), servers(delay=0.2)
+    pool = build_llm_pool({"members": [
+        {"name": "heavy", "base_url": fast.base_url, "weight": 3},
+        {"name": "light", "base_url": slow.base_url, "weight": 1},
+    ]})
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: pool.invoke("x"), range(8)))
+    assert fast.requests == 6 and slow.requests == 2
+
+
+class _FakeLLM:
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return prompt
+
+
+def test_latency_strategy_prefers_faster_member_and_respects_quota():
+    fast, slow = _FakeLLM(0.01), _FakeLLM(0.1)
+    pool = LLMPool([PoolMember("fast", fast), PoolMember("slow", slow)], strategy="latency")
+    for _ in range(10):
+        pool.invoke("x")
+    assert fast.calls >= 8
+
+    capped = _FakeLLM(0.05)
+    quota = LLMPool([PoolMember("capped", capped, max_concurrency=1)])
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: quota.invoke("x"), range(4)))
+    assert capped.calls == 4 and quota.stats()["members"][0]["outstanding"] == 0
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+测试压测工具的负载生成与统计（纯本地，不启动 Agent）
+"""
+import os
+import sys
+import json
+import threading
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import LoadRunner, StandInLLM, http_target, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+
+
+def test_stand_in_llm_latency_and_errors():
+    llm = StandInLLM(median=0.001, sigma=0.1, error_rate=1.0, seed=1)
+    try:
+        llm.invoke("prompt")
+    except TimeoutError:
+        pass
+    assert llm.calls == 1 and llm.in_flight == 0
+
+
+def test_closed_stage_counts_requests_and_errors():
+    llm = StandInLLM(median=0.005, sigma=0.2, seed=1)
+    counter = itertools.count(1)
+    calls = []
+
+    def target(request):
+        n = next(counter)
+        calls.append(n)
+        llm.invoke(request["query"])
+        if n % 5 == 0:
+            raise RuntimeError("boom")
+
+    stage = LoadRunner(target, llm=llm, seed=1).closed_stage(users=4, duration=0.3)
+    assert stage.completed + stage.errors == len(calls)
+    assert stage.errors == len(calls) // 5
+    assert stage.p50 <= stage.p99
+    assert stage.llm_calls == len(calls)
+    assert stage.llm_peak_in_flight <= 4
+    assert "latencies" not in stage.to_dict()
+
+
+def test_http_target_posts_quotes_and_counts_server_errors():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            received.append(request)
+            status = 500 if len(received) % 3 == 0 else 200
+            body = json.dumps({"total_cost": 1.0}).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        target = http_target(f"http://127.0.0.1:{server.server_port}/", timeout=5)
+        stage = LoadRunner(target, seed=1).closed_stage(users=2, duration=0.3)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert stage.completed + stage.errors == len(received) > 0
+    assert stage.errors == len(received) // 3
+    assert all(r["query"] and r["location"] for r in received)
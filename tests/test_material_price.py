@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+测试原材料价格工具（本地 HTTP 替身页面，无需外网）
+"""
+import os
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("aiohttp")
+os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+
+from tools.circuit_breaker import collect_fallbacks
+from tools.material_price_tool import (
+    DEFAULT_PRICES, MaterialCostTool, MaterialPriceFinder, PriceScanner, html_to_text, parse_price_from_text,
+)
+
+
+class PricePages:
+    """按路径返回固定 HTML 的替身站点，记录请求数与最大并发"""
+
+    def __init__(self, pages, delay=0.0):
+        self.pages, self.delay = pages, delay
+        self.requests = self.active = self.peak = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site._lock:
+                    site.requests += 1
+                    site.active += 1
+                    site.peak = max(site.peak, site.active)
+                time.sleep(site.delay)
+                body = site.pages.get(self.path)
+                data = (body or "not found").encode("utf-8")
+                try:
+                    self.send_response(200 if body is not None else 404)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except ConnectionError:
+                    pass    # 客户端提前停止读取
+                finally:
+                    with site._lock:
+                        site.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+PAGES = {
+    "/al": "<html><script>var x = '1/kg';</script><p>A00 铝锭 均价 20,150 元/吨</p></html>",
+    "/si": "<html><p>工业硅 553#: 13.2 元/kg</p></html>",
+    "/mn": "<html><p>电解锰 14,600 CNY/ton</p></html>",
+    "/none": "<html><p>暂无报价</p></html>",
+    "/cheap": "<html><p>运费 0.5 元/kg</p></html>",
+    # 价格在页面前部，后面是几 MB 的行情列表
+    "/portal": "<html><p>运费 0.5 元/kg</p><p>A00 铝 20,300 元/吨</p>" + "<tr><td>历史 19,800 元/吨</td></tr>" * 200_000,
+    # 价格在读取上限之后
+    "/late": "<html>" + "<p>行情</p>" * 100_000 + "<p>21.0 元/kg</p></html>",
+}
+
+
+@pytest.fixture
+def site():
+    pages = PricePages(PAGES)
+    yield pages
+    pages.close()
+
+
+def test_parse_price_from_text():
+    assert parse_price_from_text("现货 21.5 元/kg", "Aluminum")[0] == 21.5
+    assert parse_price_from_text("A00 20,150 元/吨", "Aluminum")[0] == pytest.approx(20.15)
+    assert parse_price_from_text("运费 0.5 元/kg", "Aluminum")[0] is None      # 低于合理下限
+    assert parse_price_from_text("暂无报价", "Silicon")[0] is None
+    assert html_to_text("<p>a</p><style>p{}</style><b>b</b>") == "a b"
+    # 跳过不合理的数字，取后面第一个合理价格
+    assert parse_price_from_text("运费 0.5 元/kg，现货 21.3 元/kg", "Aluminum")[0] == 21.3
+
+
+def test_scanner_matches_across_chunks_and_stops_early():
+    scanner = PriceScanner("Aluminum")
+    for chunk in ("<p>A00 均价 20,1", "50 元/", "吨</p><p>21.0 元/kg</p>"):
+        scanner.feed(chunk)
+    assert scanner.done and scanner.price == pytest.approx(20.15)
+
+
+def test_streaming_fetch_reads_only_page_head(site):
+    finder = MaterialPriceFinder(sources={"Aluminum": [site.url("/portal")], "Silicon": [site.url("/late")]},
+                                 max_bytes=256 * 1024)
+    try:
+        prices = finder.prices(["Aluminum", "Silicon"], timeout=10)
+        assert prices["Aluminum"].price_per_unit == pytest.approx(20.3)
+        assert prices["Silicon"].price_per_unit is None
+        assert "first 262144 bytes" in prices["Silicon"].notes
+        assert len(PAGES["/portal"]) > 5_000_000
+        # 铝页面找到价格即停止；硅页面读满上限
+        assert finder.bytes_read <= 256 * 1024 + 2 * finder.chunk_size
+    finally:
+        finder.close()
+
+
+def test_finder_picks_first_valid_source_and_caches(site):
+    finder = MaterialPriceFinder(sources={
+        "Aluminum": [site.url("/none"), site.url("/cheap"), site.url("/al")],
+        "Silicon": [site.url("/si")],
+        "Manganese": [site.url("/missing"), site.url("/mn")],
+    })
+    try:
+        prices = finder.prices(["Aluminum", "Silicon", "Manganese"], timeout=10)
+        assert prices["Aluminum"].price_per_unit == pytest.approx(20.15)
+        assert prices["Aluminum"].source.endswith("/al")
+        assert prices["Silicon"].price_per_unit == 13.2
+        assert prices["Manganese"].price_per_unit == pytest.approx(14.6)
+        assert site.requests == 6
+
+        # (材料, 来源) 缓存命中：不再请求替身站点；失败（404）的来源不缓存
+        finder.prices(["Aluminum", "Silicon"], timeout=10)
+        assert site.requests == 6
+        finder.prices(["Manganese"], timeout=10)
+        assert site.requests == 7
+    finally:
+        finder.close()
+
+
+def test_per_host_limit_and_search_injection():
+    slow = PricePages(PAGES, delay=0.1)
+    searched = []
+
+    async def search(query, max_results):
+        searched.append(query)
+        return [slow.url(p) for p in ("/none", "/cheap", "/al")]
+
+    finder = MaterialPriceFinder(search=search, per_host=2)
+    try:
+        prices = finder.prices(["Aluminum", "Silicon", "Manganese"], timeout=10)
+        assert len(searched) == 3 and slow.requests == 9
+        assert slow.peak <= 2
+        assert prices["Aluminum"].price_per_unit == pytest.approx(20.15)
+    finally:
+        finder.close()
+        slow.close()
+
+
+def test_material_cost_tool_weights_composition_and_flags_fallback(site):
+    finder = MaterialPriceFinder(sources={
+        "Aluminum": [site.url("/al")], "Silicon": [site.url("/si")], "Manganese": [site.url("/none")],
+    })
+    tool = MaterialCostTool(finder, use_store=False)
+    try:
+        assert tool.run("machining") == 0.0        # 原材料只计入熔炼工序
+        with collect_fallbacks() as fallbacks:
+            cost = tool.run("melting", alloy="AlSi9Mn")
+        expected = 0.895 * 20.15 + 0.100 * 13.2 + 0.005 * DEFAULT_PRICES["Manganese"]
+        assert cost == round(expected, 2)
+        assert fallbacks and "Manganese" in fallbacks[0]
+
+        with collect_fallbacks() as fallbacks:
+            assert tool.run("melting", alloy="AlSi7Mg") == round(0.93 * 20.15 + 0.07 * 13.2, 2)
+        assert not fallbacks
+    finally:
+        finder.close()
+
+
+def test_no_search_provider_fails_fast(monkeypatch):
+    import tools.material_price_tool as material_price_tool
+
+    monkeypatch.setattr(material_price_tool, "search_provider", lambda: None)
+    finder = MaterialPriceFinder()
+    tool = MaterialCostTool(finder, use_store=False)
+    try:
+        assert not finder.can_fetch
+        start = time.monotonic()
+        with collect_fallbacks() as fallbacks:
+            cost = tool.run("melting", alloy="AlSi9Mn")
+        assert time.monotonic() - start < 1.0 and finder.fetches == 0
+        assert cost == round(sum(DEFAULT_PRICES[m] * s for m, s in MaterialCostTool.composition("AlSi9Mn")[1].items()), 2)
+        assert fallbacks
+    finally:
+        finder.close()
+
+
+def test_offline_default_prices_are_flagged_degraded():
+    tool = MaterialCostTool(MaterialPriceFinder(sources={}), offline=True, use_store=False)
+    try:
+        with collect_fallbacks() as fallbacks:
+            tool.run("melting", alloy="AlSi9Mn")
+        assert fallbacks and tool.finder.fetches == 0
+    finally:
+        tool.finder.close()
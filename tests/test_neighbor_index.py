@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+测试历史报价近邻复用索引（纯本地，无需 LLM）
+"""
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.neighbor_index import QuoteNeighborIndex
+
+
+def _cell(equip, energy=1.2, labor=0.6, adj=-0.3):
+    return {"equipment_depreciation": equip, "energy": energy, "labor": labor, "volume_adjustment": adj, "material": 0.0}
+
+
+def test_reuse_when_neighbors_agree():
+    index = QuoteNeighborIndex(k=3, max_distance=0.1, tolerance=0.05)
+    loc = "Ningbo, Zhejiang"
+    index.add("casting", loc, _cell(1.20), 1_000_000, 12000.0, 50000.0, ref=1)
+    index.add("casting", loc, _cell(1.22), 1_100_000, 12500.0, 51000.0, ref=2)
+    index.add("casting", loc, _cell(1.21), 1_050_000, 11800.0, 49000.0, ref=3)
+
+    match = index.lookup("casting", loc, 1_080_000, 12100.0, 50500.0)
+    assert match is not None
+    assert sorted(match.neighbors) == [1, 2, 3]
+    assert match.cell["equipment_depreciation"] == 1.21
+    assert match.cell["total"] == round(1.21 + 1.2 + 0.6 - 0.3, 2)
+
+
+def test_no_reuse_when_neighbors_disagree_or_far():
+    index = QuoteNeighborIndex(k=3, max_distance=0.1, tolerance=0.05)
+    loc = "Ningbo, Zhejiang"
+    index.add("casting", loc, _cell(1.2), 1_000_000, ref=1)
+    index.add("casting", loc, _cell(2.4), 1_050_000, ref=2)
+    assert index.lookup("casting", loc, 1_020_000) is None          # 结果不一致
+    assert index.lookup("casting", loc, 5_000_000) is None          # 产量差距过大
+    assert index.lookup("casting", "Chengdu, Sichuan", 1_020_000) is None
+    assert index.lookup("casting", loc, 1_020_000, 100.0, 50.0) is None  # 有几何 vs 无几何不混用
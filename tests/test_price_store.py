@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+测试材料价格时间序列库（纯本地）
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.price_store import MaterialPriceStore
+from tools.circuit_breaker import collect_fallbacks
+from tools.material_price_tool import DEFAULT_PRICES, MaterialCostTool, MaterialPrice
+
+
+class FakeFinder:
+    """记录被请求的材料，返回固定价格"""
+
+    def __init__(self, prices):
+        self.prices_by_material = prices
+        self.requested = []
+
+    def prices(self, materials, timeout=None):
+        materials = list(materials)
+        self.requested.append(materials)
+        return {m: MaterialPrice(m, self.prices_by_material.get(m), f"https://stand-in/{m}", "", "q")
+                for m in materials}
+
+
+def test_latest_as_of_and_reload():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.db")
+        store = MaterialPriceStore(path)
+        store.record("Aluminum", 19.8, "a", at="2025-01-10T09:00:00")
+        store.record("Aluminum", 20.6, "b", at="2025-03-01T09:00:00")
+        store.record("Aluminum", 20.1, "c", at="2025-02-01T09:00:00")   # 乱序写入
+        assert store.latest("Aluminum").price == 20.6
+        assert store.as_of("Aluminum", "2025-02-15").price == 20.1
+        assert store.as_of("Aluminum", "2025-03-01").price == 20.6       # 纯日期含当天
+        assert store.as_of("Aluminum", datetime(2025, 1, 1)) is None
+        assert [p.price for p in store.history("Aluminum", since="2025-02-01")] == [20.1, 20.6]
+        store.close()
+
+        reopened = MaterialPriceStore(path)
+        assert reopened.as_of("Aluminum", "2025-02-15").source == "c"
+        assert reopened.materials() == ["Aluminum"]
+        reopened.close()
+
+
+def test_incremental_refresh_only_fetches_due_materials():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MaterialPriceStore(os.path.join(tmp, "prices.db"), refresh_seconds=3600,
+                                   intervals={"Manganese": 0})
+        store.record("Aluminum", 20.0, "fresh")
+        finder = FakeFinder({"Silicon": 13.0, "Manganese": 14.5})
+        recorded = store.refresh(finder, ["Aluminum", "Silicon", "Manganese"])
+        assert finder.requested == [["Silicon", "Manganese"]]
+        assert set(recorded) == {"Silicon", "Manganese"}
+        # 锰的刷新间隔为 0：每次都到期；铝、硅仍在间隔内
+        store.refresh(finder, ["Aluminum", "Silicon", "Manganese"])
+        assert finder.requested[-1] == ["Manganese"]
+        store.close()
+
+
+def test_tool_prices_from_store_and_reprices_history():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MaterialPriceStore(os.path.join(tmp, "prices.db"), refresh_seconds=3600)
+        for material, old, new in (("Aluminum", 18.0, 20.0), ("Silicon", 11.0, 13.0), ("Manganese", 12.0, 14.0)):
+            store.record(material, old, "archive", at="2024-06-01T12:00:00")
+            store.record(material, new, "live")
+        finder = FakeFinder({})
+        tool = MaterialCostTool(finder, store=store)
+
+        with collect_fallbacks() as fallbacks:
+            current = tool.run("melting", alloy="AlSi9Mn")
+        assert finder.requested == [] and not fallbacks          # 价格库未过期，不联网
+        assert current == round(0.895 * 20.0 + 0.1 * 13.0 + 0.005 * 14.0, 2)
+
+        historical = tool.run("melting", alloy="AlSi9Mn", as_of="2024-06-30")
+        assert historical == round(0.895 * 18.0 + 0.1 * 11.0 + 0.005 * 12.0, 2)
+
+        with collect_fallbacks() as fallbacks:
+            tool.run("melting", alloy="AlSi9Mn", as_of="2020-01-01")
+        assert fallbacks                                          # 该日期前没有价格：兜底值
+        store.close()
+
+
+def test_tool_keeps_last_stored_price_when_refresh_fails():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MaterialPriceStore(os.path.join(tmp, "prices.db"), refresh_seconds=0)
+        store.record("Aluminum", 21.0, "yesterday")
+        tool = MaterialCostTool(FakeFinder({}), store=store)
+        with collect_fallbacks() as fallbacks:
+            cost = tool.run("melting", alloy="AlSi7Mg")
+        assert cost == round(0.93 * 21.0 + 0.07 * DEFAULT_PRICES["Silicon"], 2)
+        assert "Silicon" in fallbacks[0] and "Aluminum" not in fallbacks[0]
+        store.close()
+
+
+def test_failed_fetch_backs_off_and_concurrent_refreshes_share_one_fetch():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MaterialPriceStore(os.path.join(tmp, "prices.db"), refresh_seconds=0, retry_seconds=3600)
+        finder = FakeFinder({"Aluminum": 20.0})
+        store.refresh(finder, ["Aluminum", "Silicon"])
+        assert finder.requested == [["Aluminum", "Silicon"]]
+        store.refresh(finder, ["Aluminum", "Silicon"])            # 硅抓取失败，退避期内不再请求
+        assert finder.requested[-1] == ["Aluminum"]
+        assert store.backing_off("Silicon") and not store.backing_off("Aluminum")
+
+        release = threading.Event()
+
+        class SlowFinder(FakeFinder):
+            def prices(self, materials, timeout=None):
+                release.wait(5)
+                return super().prices(materials, timeout)
+
+        slow = SlowFinder({"Copper": 70.0})
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(store.refresh(slow, ["Copper"], timeout=5)))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        while not store._inflight:
+            time.sleep(0.01)
+        time.sleep(0.2)                                            # 其余线程进入等待
+        release.set()
+        for t in threads:
+            t.join()
+        assert slow.requested == [["Copper"]]
+        assert [r["Copper"].price for r in results] == [70.0] * 4
+        assert len(store.history("Copper")) == 1
+        store.close()
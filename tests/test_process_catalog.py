@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+测试工艺目录与工艺提取（纯本地，无需 LLM）
+"""
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.process_catalog import ProcessCatalog
+
+
+def _catalog():
+    return ProcessCatalog.from_file()
+
+
+def test_no_process_falls_back_to_defaults():
+    """未提及工艺时返回默认工艺；"op" 不再误命中 shop / cooperation"""
+    catalog = _catalog()
+    assert catalog.match("please quote this part for our shop, thanks for the cooperation") == []
+    assert catalog.extract("hello") == ["melting", "casting", "machining", "inspection"]
+
+
+def test_op_code_maps_to_machining():
+    assert _catalog().match("OP10 粗加工, OP20 精加工") == ["machining"]
+
+
+def test_leftmost_longest_and_flow_order():
+    """长别名优先（die casting 不再额外命中 casting），结果按工艺流程排序"""
+    catalog = _catalog()
+    found = catalog.match("CMM report, die casting + T6热处理 + 抛丸 + 浸渗")
+    assert found == ["die_casting", "t6_heat_treatment", "shot_blasting", "impregnation", "cmm"]
+    assert catalog.match("气密检测") == ["leak_test"]
+    assert catalog.match("castings and machining") == ["casting", "machining"]
+
+
+def test_defaults():
+    catalog = _catalog()
+    assert catalog.default("Melting", "energy", 1.0) == 2.50
+    assert catalog.default("unknown", "labor", 0.5) == 0.5
+    assert catalog.default("die_casting", "equipment_depreciation", 0.5) == 1.60
+
+
+def test_volume_fallback_reads_catalog_tiers(monkeypatch):
+    """产量调整的兜底值只来自工艺目录"""
+    from tools import production_volume_tool
+    from tools import consensus
+    from tools.circuit_breaker import CircuitBreaker, collect_fallbacks
+
+    class DownLLM:
+        def invoke(self, prompt, *args, **kwargs):
+            raise TimeoutError("endpoint down")
+
+    catalog = _catalog()
+    catalog.volume_adjustment_by_tier = {"xlarge": -0.42, "small": 0.33}
+    monkeypatch.setattr(production_volume_tool, "get_process_catalog", lambda: catalog)
+    monkeypatch.setattr(consensus, "get_llm_breaker", lambda breaker=CircuitBreaker(): breaker)
+
+    tool = production_volume_tool.ProductionVolumeTool(DownLLM())
+    with collect_fallbacks() as fallbacks:
+        assert tool.run("casting", 2_000_000) == -0.42
+        assert tool.run("casting", 50_000) == 0.33
+        assert tool.run("casting", 300_000) == 0.0        # 目录中缺失的档位
+    assert len(fallbacks) == 3
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+测试性能剖析钩子（纯本地，无需 LLM）
+"""
+import os
+import sys
+import contextlib
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiling
+from profiling import RunProfiler, profile_modes, profile_run
+
+
+def _busy():
+    return sorted(str(i) for i in range(20000))
+
+
+def test_profile_modes_and_disabled(monkeypatch):
+    monkeypatch.delenv("AGENT_PROFILE", raising=False)
+    assert profile_modes() == set()
+    assert profile_modes("cpu") == {"cpu"}
+    assert profile_modes("TRUE") == {"cpu", "mem"}
+    assert isinstance(profile_run("x"), contextlib.nullcontext)
+
+
+def test_run_profiler_writes_reports(tmp_path):
+    profiler = RunProfiler("unit", modes={"cpu", "mem"}, output_dir=str(tmp_path), top_n=5).start()
+    _busy()
+    result = profiler.stop()
+
+    report = open(result.report_path, encoding="utf-8").read()
+    assert "_busy" in report
+    assert "峰值内存" in report
+    assert result.peak_memory > 0
+    assert os.path.getsize(result.stats_path) > 0
+    for line in open(result.collapsed_path, encoding="utf-8"):
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+
+
+def test_overlapping_sessions_share_process_hooks(tmp_path):
+    import threading
+    import tracemalloc
+
+    first = RunProfiler("first", modes={"cpu", "mem"}, output_dir=str(tmp_path), all_threads=True).start()
+    second = RunProfiler("second", modes={"cpu", "mem"}, output_dir=str(tmp_path), all_threads=True).start()
+
+    # 会话期间启动的常驻工作线程（如缓存刷新线程）
+    stop = threading.Event()
+    seen = []
+
+    def worker():
+        while not stop.wait(0.01):
+            sorted(range(100))
+        seen.append(sys.getprofile())
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    _busy()
+
+    first_result = first.stop()
+    # 第一个会话结束后，第二个会话的 tracemalloc 与线程钩子仍然有效
+    assert tracemalloc.is_tracing()
+    # 3.12+ 为进程级 cProfile，不挂新线程钩子
+    assert (threading.getprofile() is not None) != profiling._PROCESS_WIDE_CPROFILE
+    _busy()
+    second_result = second.stop()
+
+    assert first_result.peak_memory > 0 and second_result.peak_memory > 0
+    assert "峰值内存" in open(second_result.report_path, encoding="utf-8").read()
+    assert not tracemalloc.is_tracing()
+    assert threading.getprofile() is None
+
+    # 会话结束后工作线程不再被剖析
+    stop.set()
+    thread.join(2)
+    assert seen == [None]
+
+
+def test_process_wide_cprofile_is_owned_by_one_session(tmp_path, monkeypatch):
+    """3.12+：进程级 cProfile 由最先开始的会话持有，重叠会话只做栈采样并在报告中注明"""
+    import threading
+
+    monkeypatch.setattr(profiling, "_PROCESS_WIDE_CPROFILE", True)
+    owner = RunProfiler("owner", modes={"cpu"}, output_dir=str(tmp_path), all_threads=True).start()
+    assert threading.getprofile() is None          # 进程级统计已覆盖所有线程，无需新线程钩子
+
+    results = []
+
+    def request():
+        session = RunProfiler("request", modes={"cpu"}, output_dir=str(tmp_path)).start()
+        _busy()
+        results.append(session.stop())
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    thread.join()
+    _busy()
+    owned = owner.stop()
+
+    overlapped = results[0]
+    assert owned.stats_path and overlapped.stats_path is None
+    assert "owner" in open(overlapped.report_path, encoding="utf-8").read()
+    assert "进程级" in open(owned.report_path, encoding="utf-8").read()
+
+    # 持有者结束后，下一个会话重新持有进程级 cProfile
+    assert RunProfiler("next", modes={"cpu"}, output_dir=str(tmp_path)).start().stop().stats_path
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+测试历史报价库（SQLite，本地临时文件，无需 LLM）
+"""
+import os
+import sys
+import time
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.quote_store import QuoteStore
+
+
+def _report(location, volume, total, process="machining"):
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "location": location,
+        "production_volume": volume,
+        "unit": "CNY/kg",
+        "processes": {process: {"equipment_depreciation": 0.8, "energy": 1.8, "labor": 0.5,
+                                "volume_adjustment": -0.3, "total": total}},
+        "total_cost": total,
+        "drawing_data": {"surface_area": 1000.0, "volume": 500.0},
+    }
+
+
+def test_latest_and_filters():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = QuoteStore(os.path.join(tmp, "quotes.db"))
+        now = time.time()
+        store.save(_report("Ningbo, Zhejiang", 1_100_000, 2.8), drawing_hash="abc", created_at=now - 40 * 86400)
+        new_id = store.save(_report("宁波", 1_100_000, 2.9), drawing_hash="abc", created_at=now)
+        store.save(_report("Hangzhou", 200_000, 3.1), created_at=now - 86400)
+        store.save(_report("Chengdu", 200_000, 2.5, process="casting"), created_at=now)
+
+        latest = store.latest(drawing_hash="abc", location="Ningbo")
+        assert latest["quote_id"] == new_id
+        assert latest["total_cost"] == 2.9
+
+        last_month = store.find_cells(process="machining", province="浙江", since=now - 30 * 86400)
+        assert [c["total"] for c in last_month] == [2.9, 3.1]
+        assert store.find_cells(volume_bucket="medium", process="casting")[0]["canonical_location"] == "Chengdu, Sichuan"
+
+        out = os.path.join(tmp, "cells.csv")
+        assert store.export_csv(out) == 4
+        store.close()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+测试地区费率表与地点解析（纯本地，无需 LLM）
+"""
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.region_rates import RegionIndex
+
+
+def _index():
+    return RegionIndex.from_file()
+
+
+def test_resolve_english_and_chinese():
+    """中英文写法解析到同一城市"""
+    index = _index()
+    en = index.resolve("Ningbo, Zhejiang")
+    zh = index.resolve("浙江省宁波市北仑区")
+    assert en.canonical == zh.canonical == "Ningbo, Zhejiang"
+    assert en.electricity == 0.65
+
+
+def test_ambiguous_city_uses_province():
+    """同名城市（Taizhou）按省份消歧"""
+    index = _index()
+    assert index.resolve("Taizhou, Jiangsu").province == "Jiangsu"
+    assert index.resolve("台州").province == "Zhejiang"
+
+
+def test_prefix_and_multi_word():
+    index = _index()
+    assert index.resolve("zhejian").province == "Zhejiang"
+    assert index.resolve("Inner Mongolia").province == "Inner Mongolia"
+    assert index.resolve("Xi'an").city == "Xi'an"
+
+
+def test_unknown_location_falls_back_to_national():
+    rates = _index().resolve("Mars Base 1")
+    assert not rates.matched
+    assert rates.canonical == "China"
+    assert abs(rates.energy_factor() - 1.0) < 1e-9
+    assert rates.wage_factor() == 1.0
+
+
+def test_city_overrides_province():
+    index = _index()
+    city = index.resolve("Shenzhen")
+    province = index.resolve("Guangdong")
+    assert city.wage > province.wage
+    assert city.electricity == province.electricity
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+测试搜索结果缓存（替身搜索函数，无需外网）
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.tools import StructuredTool
+
+from tools.search_cache import SearchCache, cached_search_tool, normalize_query
+
+
+def test_key_normalizes_query_and_params():
+    assert normalize_query("  Latest ＡＬＵＭＩＮＵＭ   price ") == "latest aluminum price"
+    assert SearchCache.key("tavily", "Al price", max_results=3, depth="basic") == \
+        SearchCache.key("tavily", "al  PRICE", depth="basic", max_results=3)
+    assert SearchCache.key("tavily", "al price", max_results=3) != SearchCache.key("ddgs", "al price", max_results=3)
+    assert SearchCache.key("tavily", "al price", max_results=3) != SearchCache.key("tavily", "al price", max_results=5)
+
+
+def test_ttl_and_negative_caching():
+    cache = SearchCache(ttl=60, negative_ttl=0.05)
+    calls = []
+
+    def search(result):
+        def fn():
+            calls.append(result)
+            return result
+        return fn
+
+    assert cache.search("ddgs", "aluminum", search(["u1"])) == ["u1"]
+    assert cache.search("ddgs", "Aluminum ", search(["u2"])) == ["u1"]       # 命中
+    assert cache.search("ddgs", "no such thing", search([])) == []
+    assert cache.search("ddgs", "no such thing", search(["late"])) == []       # 负缓存
+    time.sleep(0.06)
+    assert cache.search("ddgs", "no such thing", search(["late"])) == ["late"]  # 负缓存过期
+    assert len(calls) == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (1, 1, 3)
+
+
+def test_errors_are_not_cached():
+    cache = SearchCache()
+
+    def boom():
+        raise RuntimeError("quota exceeded")
+
+    with pytest.raises(RuntimeError):
+        cache.search("tavily", "q", boom)
+    assert cache.search("tavily", "q", lambda: ["ok"]) == ["ok"]
+    assert cache.stats()["errors"] == 1
+
+
+def test_inflight_dedup_across_threads_and_event_loops():
+    cache = SearchCache()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return ["u"]
+
+    async def aslow():
+        return await asyncio.to_thread(slow)
+
+    with ThreadPoolExecutor(6) as pool:
+        futures = [pool.submit(cache.search, "tavily", "same query", slow) for _ in range(4)]
+        futures += [pool.submit(asyncio.run, cache.asearch("tavily", "SAME query", aslow)) for _ in range(2)]
+        time.sleep(0.2)
+        release.set()
+        assert [f.result() for f in futures] == [["u"]] * 6
+    assert len(calls) == 1
+    assert cache.stats()["deduped"] == 5
+
+
+def test_cached_search_tool_wraps_langchain_tool(monkeypatch):
+    monkeypatch.setenv("SEARCH_CACHE_ENABLED", "true")
+    calls = []
+
+    def search(query: str, max_results: int = 3) -> dict:
+        calls.append(query)
+        return {"results": [{"url": f"https://example.com/{len(calls)}"}]}
+
+    tool = cached_search_tool(StructuredTool.from_function(func=search, name="fake_search_for_test",
+                                                           description="search"))
+    first = tool.invoke({"query": "AlSi9Mn price", "max_results": 2})
+    assert tool.invoke({"query": "alsi9mn  price", "max_results": 2}) == first
+    tool.invoke({"query": "alsi9mn price", "max_results": 5})
+    assert len(calls) == 2 and tool.name == "fake_search_for_test"
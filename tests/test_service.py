@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+测试报价服务的请求校验（纯本地，不启动 Agent）
+"""
+import os
+import sys
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service import QuoteService, make_handler
+
+
+class RecordingService(QuoteService):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def quote(self, request):
+        self.requests.append(request)
+        return {"total_cost": 1.0}
+
+
+@pytest.fixture
+def server():
+    service = RecordingService()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield service, f"http://127.0.0.1:{httpd.server_port}/quote"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _post(url, body, headers=None):
+    req = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_deadline_is_coerced_to_seconds(server):
+    service, url = server
+    assert _post(url, {"query": "q", "deadline": "12.5"})[0] == 200
+    assert _post(url, {"query": "q"}, {"X-Deadline-Seconds": "3"})[0] == 200
+    assert _post(url, {"query": "q"})[0] == 200
+    assert [r["deadline"] for r in service.requests] == [12.5, 3.0, None]
+
+
+@pytest.mark.parametrize("deadline", ["10s", "null", [5], {"s": 1}, 0, -1, "nan"])
+def test_invalid_deadline_is_rejected(server, deadline):
+    service, url = server
+    status, body = _post(url, {"query": "q", "deadline": deadline})
+    assert status == 400 and "deadline" in body["error"]
+    assert service.requests == []
+
+
+def test_non_object_body_is_rejected(server):
+    service, url = server
+    assert _post(url, ["q"])[0] == 400
+    assert _post(url, {"deadline": 5})[0] == 400
+    assert service.requests == []
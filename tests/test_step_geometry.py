@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+测试逐实体几何汇总（纯本地，不依赖 OpenCascade）
+"""
+import os
+import sys
+import math
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import step_geometry
+from tools.step_geometry import (
+    RssTracker, SolidGeometry, StepUsage, group_by_fingerprint, principal_moments, solid_quantities,
+    summarize_solids,
+)
+
+
+def test_principal_moments_rotation_invariant():
+    assert principal_moments([[3, 0, 0], [0, 1, 0], [0, 0, 2]]) == (3, 2, 1)
+    # diag(4, 2, 1) 绕 z 轴旋转 30°
+    c, s = math.cos(math.pi / 6), math.sin(math.pi / 6)
+    m = [[4 * c * c + 2 * s * s, (4 - 2) * c * s, 0], [(4 - 2) * c * s, 4 * s * s + 2 * c * c, 0], [0, 0, 1]]
+    assert [round(x, 9) for x in principal_moments(m)] == [4, 2, 1]
+
+
+def test_summarize_counts_quantities_and_caps_detail():
+    solids = (
+        SolidGeometry(i, volume=10.0, surface_area=5.0, bbox=(3, 2, 1), inertia=(1, 1, 1),
+                      faces=6, edges=12, quantity=i + 1)
+        for i in range(3)
+    )
+    data = summarize_solids(solids, max_detail=2)
+    assert data["solid_count"] == 6 and data["unique_solids"] == 3
+    assert data["volume"] == 60.0 and data["surface_area"] == 30.0
+    assert len(data["solids"]) == 2 and data["solids_truncated"] == 1
+
+
+def test_rss_tracker():
+    tracker = RssTracker()
+    tracker.sample()
+    stats = tracker.to_dict()
+    assert stats["peak_rss_mb"] is None or stats["peak_rss_mb"] > 0
+
+
+def _solid(index, volume=100.0, bbox=(5.0, 4.0, 3.0), quantity=1):
+    return SolidGeometry(index, volume=volume, surface_area=80.0, bbox=bbox, inertia=(2.0, 1.5, 1.0),
+                         faces=6, edges=12, quantity=quantity)
+
+
+def test_fingerprint_groups_identical_solids():
+    """导出误差内的相同零件合并，数量累加；不同零件不合并"""
+    groups = group_by_fingerprint([
+        _solid(0), _solid(1, volume=100.00001), _solid(2, quantity=3), _solid(3, bbox=(6.0, 4.0, 3.0)),
+    ])
+    assert sorted(g.quantity for g in groups.values()) == [1, 5]
+    assert _solid(0).fingerprint() == _solid(9, volume=100.0).fingerprint()
+    assert _solid(0).fingerprint() != _solid(0, volume=101.0).fingerprint()
+
+
+def test_drawing_fingerprint_includes_topology():
+    solid = _solid(0)
+    resplit = SolidGeometry(0, volume=100.0, surface_area=80.0, bbox=(5.0, 4.0, 3.0), inertia=(2.0, 1.5, 1.0),
+                            faces=8, edges=16)
+    assert solid.fingerprint() == resplit.fingerprint()
+    assert solid.fingerprint(topology=True) != resplit.fingerprint(topology=True)
+    # 图纸级指纹与实体顺序无关
+    a = summarize_solids([_solid(0), _solid(1, volume=7.0)])["fingerprint"]
+    b = summarize_solids([_solid(0, volume=7.0), _solid(1)])["fingerprint"]
+    assert a == b
+
+
+def test_normal_and_large_parse_modes_share_drawing_fingerprint(monkeypatch, tmp_path):
+    """同一几何分别走普通解析与大文件模式，图纸级指纹一致"""
+    from tools import drawing_parser_tool as parser
+
+    housing, bracket = _solid(0), _solid(1, volume=7.0)
+    # 大文件模式：同一根内的两个 bracket 实例合并为 quantity=2
+    large = [housing, SolidGeometry(1, volume=7.0, surface_area=80.0, bbox=(5.0, 4.0, 3.0),
+                                    inertia=(2.0, 1.5, 1.0), faces=6, edges=12, quantity=2)]
+    # 普通解析：复合体中的实体逐个出现
+    normal = [housing, bracket, _solid(2, volume=7.0)]
+
+    class FakeShape:
+        wrapped = object()
+
+    class FakeResult:
+        def vals(self):
+            return [FakeShape()]
+
+    class FakeCq:
+        Shape = FakeShape
+
+    monkeypatch.setattr(parser, "cq", FakeCq, raising=False)
+    monkeypatch.setattr(parser, "measure_solid", lambda shape: SolidGeometry(
+        0, volume=114.0, surface_area=240.0, bbox=(5.0, 4.0, 3.0), inertia=(2.0, 1.5, 1.0), faces=18, edges=36, solids=3))
+    monkeypatch.setattr(parser, "solids_of", lambda shape: normal)
+    monkeypatch.setattr(parser, "iter_step_solids", lambda path, tracker=None: iter(large))
+
+    drawing = tmp_path / "part.stp"
+    drawing.write_bytes(b"ISO-10303-21;")
+    tool = parser.DrawingParserTool()
+    assert tool._fingerprint(FakeResult())["fingerprint"] == tool.run_large(str(drawing))["fingerprint"]
+
+
+def test_solid_quantities_follow_assembly_references():
+    # 顶层装配 1 → 子装配 2（2 个实例）→ 零件 3（每个子装配 4 个实例）；零件 5 直接挂在顶层
+    usage = StepUsage(
+        solids={30: [31], 50: [51, 52], 60: [61]},
+        product_reps=[(1, 10), (2, 20), (3, 33), (5, 50)],
+        assembly=[(1, 2), (1, 2), (2, 3), (2, 3), (2, 3), (2, 3), (1, 5)],
+        rep_links=[(33, 30)],                 # 零件表示 → 其几何表示
+        mapped=[(50, 60), (50, 60)],          # 零件 5 内映射两次的子表示
+    )
+    assert solid_quantities(usage) == {31: 8, 51: 1, 52: 1, 61: 2}
+    # 无装配结构的单根多实体文件：每个实体各 1 个
+    assert solid_quantities(StepUsage(solids={9: [4, 5, 6]})) == {4: 1, 5: 1, 6: 1}
+
+
+def test_single_root_multi_solid_file_is_transferred_solid_by_solid(monkeypatch):
+    """单根、多实体的文件逐实体转换：取到第一个实体时，其余实体尚未构建"""
+    events = []
+
+    class FakeModel:
+        def Value(self, number):
+            return f"brep#{number}"
+
+    class FakeReader:
+        def ReadFile(self, path):
+            return "done"
+
+        def StepModel(self):
+            return FakeModel()
+
+        def TransferEntity(self, entity):
+            events.append(("transfer", entity))
+            self.shape = entity
+
+        def NbShapes(self):
+            return 1
+
+        def Shape(self, i):
+            return self.shape
+
+        def ClearShapes(self):
+            events.append(("clear", self.shape))
+
+        def TransferRoot(self, root):
+            raise AssertionError("不应整根转换")
+
+    monkeypatch.setattr(step_geometry, "OCP_AVAILABLE", True)
+    monkeypatch.setattr(step_geometry, "STEPControl_Reader", FakeReader, raising=False)
+    monkeypatch.setattr(step_geometry, "IFSelect_RetDone", "done", raising=False)
+    monkeypatch.setattr(step_geometry, "_step_usage", lambda model: StepUsage(solids={1: [7, 8, 9]}))
+    monkeypatch.setattr(step_geometry, "solids_of",
+                        lambda shape, index, tracker=None: [_solid(index, volume=float(shape[-1]))])
+
+    solids = step_geometry.iter_step_solids("assembly.stp")
+    first = next(solids)
+    assert (first.index, first.volume) == (0, 7.0)
+    assert events == [("transfer", "brep#7"), ("clear", "brep#7")]
+    rest = list(solids)
+    assert [s.volume for s in rest] == [8.0, 9.0] and [s.index for s in rest] == [1, 2]
+    assert [e for e in events if e[0] == "transfer"] == [("transfer", f"brep#{n}") for n in (7, 8, 9)]
+
+
+def test_normal_and_large_parse_modes_sum_volume_over_all_solids(monkeypatch, tmp_path):
+    """多实体图纸：普通解析与大文件模式的体积、表面积都是全部实体之和"""
+    from tools import drawing_parser_tool as parser
+
+    class Val:
+        def __init__(self, area=0.0, volume=0.0):
+            self.area, self.volume = area, volume
+
+        def Area(self):
+            return self.area
+
+        def Volume(self):
+            return self.volume
+
+    class Selection(list):
+        def vals(self):
+            return list(self)
+
+    class FakeResult:
+        def faces(self):
+            return Selection([Val(area=80.0)] * 3)
+
+        def solids(self):
+            return Selection([Val(volume=100.0), Val(volume=7.0), Val(volume=7.0)])
+
+        def val(self):
+            return self.solids()[0]          # 旧实现只取第一个实体
+
+    class FakeCq:
+        class importers:
+            importStep = staticmethod(lambda path: FakeResult())
+
+    monkeypatch.setattr(parser, "CADQUERY_AVAILABLE", True)
+    monkeypatch.setattr(parser, "cq", FakeCq, raising=False)
+    monkeypatch.setattr(parser.DrawingParserTool, "_fingerprint", staticmethod(lambda result: {}))
+    monkeypatch.setattr(parser, "iter_step_solids", lambda path, tracker=None: iter([
+        _solid(0), SolidGeometry(1, volume=7.0, surface_area=80.0, bbox=(5.0, 4.0, 3.0),
+                                 inertia=(2.0, 1.5, 1.0), faces=6, edges=12, quantity=2)]))
+
+    drawing = tmp_path / "part.stp"
+    drawing.write_bytes(b"ISO-10303-21;")
+    tool = parser.DrawingParserTool()
+    normal, large = tool.run(str(drawing), large_file=False), tool.run(str(drawing), large_file=True)
+    assert normal["volume"] == large["volume"] == 114.0
+    assert normal["surface_area"] == large["surface_area"] == 240.0
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+测试工具结果缓存与启动预热（无需 LLM）
+"""
+import os
+import sys
+import time
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cost_planner import CostPlanner, DimensionMemo
+from storage.quote_store import QuoteStore
+from tool_cache import ToolResultCache, cache_key
+from tools.process_catalog import get_process_catalog
+from warmup import CacheWarmer, RateLimiter, expand_cells
+
+
+def test_cache_key_only_uses_relevant_inputs():
+    # 设备折旧与地点无关、同档位产量共用
+    assert cache_key("equipment_depreciation", "Casting", "Ningbo, Zhejiang", 1100000) == \
+        cache_key("equipment_depreciation", "casting", "Suzhou, Jiangsu", 2000000)
+    assert cache_key("labor", "casting", "Ningbo, Zhejiang", 1100000) != \
+        cache_key("labor", "casting", "Suzhou, Jiangsu", 1100000)
+    geometry = {"surface_area": 1000.0, "volume": 500.0}
+    assert cache_key("energy", "casting", "Ningbo, Zhejiang", 1, geometry) != \
+        cache_key("energy", "casting", "Ningbo, Zhejiang", 1)
+    # 能源与产量无关；原材料按合金与计价日期区分
+    assert cache_key("energy", "casting", "Ningbo, Zhejiang", 50_000) == \
+        cache_key("energy", "casting", "Ningbo, Zhejiang", 5_000_000)
+    assert cache_key("material", "melting", "Ningbo, Zhejiang", 1, {"alloy": "AlSi7Mg"}) != \
+        cache_key("material", "melting", "Ningbo, Zhejiang", 1, {"alloy": "AlSi9Mn"})
+    assert cache_key("material", "melting", None, 1, as_of="2024-06-30") != cache_key("material", "melting", None, 1)
+
+
+def test_cache_lru_and_ttl():
+    cache = ToolResultCache(max_entries=2)
+    cache.put("a", 1.0)
+    cache.put("b", 2.0)
+    assert cache.get("a") == 1.0
+    cache.put("c", 3.0)          # 淘汰最久未用的 b
+    assert "b" not in cache and cache.get("c") == 3.0
+    assert cache.stats()["hits"] == 2
+
+    expired = ToolResultCache(ttls={"energy": (0.01, 0.01)})
+    expired.put("energy|a", 1.0)
+    expired.put("labor|a", 1.0)
+    time.sleep(0.02)
+    assert expired.get("energy|a") is None
+    assert expired.get("labor|a") == 1.0      # 按维度的 TTL
+
+
+def test_stale_while_revalidate_refreshes_once():
+    cache = ToolResultCache(ttls={"energy": (0.01, 60)})
+    cache.put("energy|casting", 1.0)
+    time.sleep(0.02)
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        time.sleep(0.05)
+        return 2.0
+
+    # 软/硬 TTL 之间：立即返回旧值，并发请求只触发一次后台刷新
+    assert [cache.get("energy|casting", refresh) for _ in range(5)] == [1.0] * 5
+    deadline = time.time() + 2
+    while cache.stats()["refreshes"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(calls) == 1
+    assert cache.get("energy|casting") == 2.0
+    assert cache.stats()["stale_hits"] == 5
+
+
+def test_expand_cells_dedups_and_skips_non_llm():
+    planner = CostPlanner(get_process_catalog(), DimensionMemo())
+    combos = [
+        {"process": "machining", "location": "Ningbo, Zhejiang", "production_volume": 1100000},
+        {"process": "machining", "location": "Suzhou, Jiangsu", "production_volume": 1200000},
+        {"process": "packaging", "location": "Ningbo, Zhejiang", "production_volume": 1100000},
+    ]
+    cells = expand_cells(combos, planner)
+    dims = [(p, d) for p, d, _, _ in cells]
+    # 设备折旧、产量调整不依赖地点：两个地点只预热一次
+    assert dims.count(("machining", "equipment_depreciation")) == 1
+    assert dims.count(("machining", "labor")) == 2
+    # packaging 的设备/能源为静态值，无需预热
+    assert ("packaging", "equipment_depreciation") not in dims
+
+
+def test_warmer_reports_readiness():
+    cells = [("casting", "labor", "Ningbo, Zhejiang", 1000 * i) for i in range(10)]
+    calls = []
+
+    def warm(*cell):
+        calls.append(cell)
+        if len(calls) == 3:
+            raise RuntimeError("boom")
+
+    warmer = CacheWarmer(cells, warm=warm, rate=0, concurrency=2, ready_threshold=50)
+    assert warmer.readiness()["ready"] is False
+    warmer.start().join(5)
+    state = warmer.readiness()
+    assert state["ready"] and state["finished"]
+    assert state["ready_percent"] == 90.0 and state["failed"] == 1    # 失败的单元不计入
+    assert CacheWarmer([], warm=warm).readiness()["ready"] is True
+
+
+def test_warmer_not_ready_when_endpoint_always_fails():
+    cells = [("casting", "labor", "Ningbo, Zhejiang", 1000 * i) for i in range(5)]
+
+    def warm(*cell):
+        raise RuntimeError("endpoint down")
+
+    warmer = CacheWarmer(cells, warm=warm, rate=0, concurrency=2, ready_threshold=50)
+    warmer.start().join(5)
+    state = warmer.readiness()
+    assert state["finished"] and state["failed"] == 5
+    assert state["ready"] is False and state["ready_percent"] == 0.0 and not state["timed_out"]
+
+    # 显式的最长等待：超时后就绪，并单独报告
+    warmer = CacheWarmer(cells, warm=warm, rate=0, concurrency=2, ready_threshold=50, max_wait=0.05)
+    warmer.start().join(5)
+    time.sleep(0.06)
+    state = warmer.readiness()
+    assert state["ready"] and state["timed_out"] and state["ready_percent"] == 0.0
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_hot_combinations_from_history():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = QuoteStore(os.path.join(tmp, "quotes.db"))
+        cell = {"equipment_depreciation": 1.0, "energy": 1.0, "labor": 1.0, "volume_adjustment": 0.0, "total": 3.0}
+        for volume in (1100000, 1300000):
+            store.save({"location": "宁波", "production_volume": volume,
+                        "processes": {"casting": cell, "machining": cell}})
+        store.save({"location": "苏州", "production_volume": 200000, "processes": {"casting": cell}})
+        hot = store.hot_combinations(limit=10)
+        assert hot[0]["count"] == 2 and hot[0]["volume_bucket"] == "xlarge"
+        assert hot[0]["production_volume"] == 1200000
+        assert len(hot) == 3
+        store.close()
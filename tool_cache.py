@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+tool_cache.py
+成本工具结果缓存（进程内，线程安全）
+
+- key = (成本维度, 工艺, 规范化地点, 产量档位[, 几何 / 合金 / 计价日期])：只包含该维度工具真正依赖的输入
+  （agent_types.DIMENSION_INPUTS）：设备折旧 / 产量调整与地点无关，能源与产量无关，几何只影响能源成本
+- 容量有上限（LRU 淘汰），条目带写入时间
+- stale-while-revalidate：软 TTL 内直接返回；软/硬 TTL 之间先返回旧值，同时后台刷新一次
+  （同一 key 同时只有一个刷新）；超过硬 TTL 视为未命中，调用方同步估算
+- 软/硬 TTL 按维度配置：设备折旧、产量调整变化慢，能源价格变化快
+  （TOOL_CACHE_TTL_<DIMENSION>=软,硬 秒，如 TOOL_CACHE_TTL_ENERGY=86400,604800）
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from agent_types import DIMENSION_INPUTS
+from tools.production_volume_tool import volume_tier
+
+
+CacheKey = str
+
+_DAY = 86400
+
+# 各维度默认 (软 TTL, 硬 TTL)，秒
+DEFAULT_TTLS: Dict[str, Tuple[float, float]] = {
+    "equipment_depreciation": (30 * _DAY, 180 * _DAY),
+    "energy": (1 * _DAY, 14 * _DAY),
+    "labor": (7 * _DAY, 60 * _DAY),
+    "volume_adjustment": (30 * _DAY, 180 * _DAY),
+    "material": (0.25 * _DAY, 3 * _DAY),
+}
+_FALLBACK_TTL = (1 * _DAY, 7 * _DAY)
+
+
+def dimension_ttls(overrides: Optional[Dict[str, Tuple[float, float]]] = None) -> Dict[str, Tuple[float, float]]:
+    """各维度 (软, 硬) TTL：默认值 ← 环境变量 TOOL_CACHE_TTL_<DIMENSION> ← overrides"""
+    ttls = dict(DEFAULT_TTLS)
+    for dimension in ttls:
+        value = os.getenv(f"TOOL_CACHE_TTL_{dimension.upper()}")
+        if value:
+            soft, _, hard = value.partition(",")
+            ttls[dimension] = (float(soft), float(hard or soft))
+    ttls.update(overrides or {})
+    return ttls
+
+
+def cache_key(
+    dimension: str,
+    process: str,
+    location: Optional[str],
+    volume: int,
+    drawing_data: Optional[Dict[str, Any]] = None,
+    as_of: Optional[str] = None,
+) -> CacheKey:
+    """
+    Args:
+        location: 规范化地点（RegionRates.canonical）
+        volume: 年产量（按档位归并）
+        drawing_data: 几何（仅能源成本使用，表面积/体积取 3 位有效数字）与合金牌号（仅原材料）
+        as_of: 原材料计价日期（缺省为当前价格）
+    """
+    inputs = DIMENSION_INPUTS.get(dimension, frozenset({"process", "location", "volume"}))
+    drawing_data = drawing_data or {}
+    parts = [
+        dimension,
+        process.lower(),
+        location if "location" in inputs else "",
+        volume_tier(volume) if "volume" in inputs else "",
+    ]
+    if "geometry" in inputs and drawing_data.get("surface_area") and drawing_data.get("volume"):
+        parts.append(f"{drawing_data['surface_area']:.2e}/{drawing_data['volume']:.2e}")
+    if "alloy" in inputs and drawing_data.get("alloy"):
+        parts.append(drawing_data["alloy"])
+    if "as_of" in inputs and as_of:
+        parts.append(f"@{as_of}")
+    return "|".join(parts)
+
+
+class ToolResultCache:
+    """工具结果缓存（stale-while-revalidate）"""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttls: Optional[Dict[str, Tuple[float, float]]] = None,
+        refresh_workers: int = 2,
+    ):
+        """
+        Args:
+            max_entries: 最大条目数（LRU 淘汰）
+            ttls: 按维度覆盖 (软 TTL, 硬 TTL)，见 dimension_ttls()
+            refresh_workers: 后台刷新线程数
+        """
+        self.max_entries = max_entries
+        self.ttls = dimension_ttls(ttls)
+        self.refresh_workers = refresh_workers
+        self._entries: "OrderedDict[CacheKey, Tuple[float, float]]" = OrderedDict()   # key → (值, 写入时间)
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _ttl(self, key: CacheKey) -> Tuple[float, float]:
+        return self.ttls.get(key.split("|", 1)[0], _FALLBACK_TTL)
+
+    def get(self, key: CacheKey, refresh: Optional[Callable[[], float]] = None) -> Optional[float]:
+        """
+        取缓存值
+
+        Args:
+            refresh: 重新估算的函数；条目处于软/硬 TTL 之间时在后台调用一次并写回
+
+        Returns:
+            新鲜或过期未超硬 TTL 的值；未命中或超过硬 TTL 时为 None
+        """
+        now = time.time()
+        soft, hard = self._ttl(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            age = None if entry is None else now - entry[1]
+            if age is None or age > hard:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if age <= soft:
+                self.hits += 1
+                return entry[0]
+            self.stale_hits += 1
+            start_refresh = refresh is not None and key not in self._refreshing
+            if start_refresh:
+                self._refreshing.add(key)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.refresh_workers, thread_name_prefix="cache-refresh")
+                executor = self._executor
+        if start_refresh:
+            executor.submit(self._refresh, key, refresh)
+        return entry[0]
+
+    def _refresh(self, key: CacheKey, refresh: Callable[[], float]) -> None:
+        try:
+            value = refresh()
+            self.put(key, value)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            print(f"⚠️ 缓存后台刷新失败 {key}: {e}")
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def put(self, key: CacheKey, value: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key: CacheKey) -> bool:
+        # 未超过硬 TTL 即可服务；不计入命中统计
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry[1] <= self._ttl(key)[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.hits + self.stale_hits
+        total = served + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round(served / total, 3) if total else None,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "refreshing": len(self._refreshing),
+        }
@@ -8,11 +8,31 @@ from .equipment_depreciation_tool import EquipmentDepreciationTool
 from .production_volume_tool import ProductionVolumeTool
 from .energy_cost_tool import EnergyCostTool
 from .labor_cost_tool import LaborCostTool
+from .material_price_tool import MaterialCostTool, MaterialPriceFinder, parse_price_from_text
+from .region_rates import RegionIndex, RegionRates, get_region_index, resolve_location
+from .process_catalog import ProcessCatalog, get_process_catalog
+from .consensus import Consensus, estimate, robust_consensus
+from .search_cache import SearchCache, cached_search_tool, get_search_cache
 
 __all__ = [
     'DrawingParserTool',
     'EquipmentDepreciationTool',
     'ProductionVolumeTool',
     'EnergyCostTool',
-    'LaborCostTool'
+    'LaborCostTool',
+    'MaterialCostTool',
+    'MaterialPriceFinder',
+    'parse_price_from_text',
+    'RegionIndex',
+    'RegionRates',
+    'get_region_index',
+    'resolve_location',
+    'ProcessCatalog',
+    'get_process_catalog',
+    'Consensus',
+    'estimate',
+    'robust_consensus',
+    'SearchCache',
+    'cached_search_tool',
+    'get_search_cache',
 ]
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+circuit_breaker.py
+LLM 调用熔断器（进程内共享）与兜底值标记
+
+端点宕机或代理配置错误时，每个成本单元都要等满 httpx 超时才走默认值，一次报价会挂起数分钟。
+熔断器按滚动窗口统计错误率与慢调用率：
+
+    closed     正常放行；窗口内调用数 ≥ min_calls 且错误率或慢调用率超过阈值 → open
+    open       直接抛 CircuitOpenError（工具立即返回兜底值），open_seconds 后 → half_open
+    half_open  放行少量探测调用；全部成功 → closed，任一失败 → open
+
+工具走兜底值时调用 report_fallback()，agent 用 collect_fallbacks() 收集后把这些单元标记为 degraded
+（不写入缓存 / 记忆 / 检查点，报告中列出）。
+
+环境变量（LLM_BREAKER_*）：
+    ENABLED=true  WINDOW_SECONDS=60  MIN_CALLS=4  ERROR_RATE=0.5
+    SLOW_CALL_SECONDS=10  SLOW_RATE=0.8  OPEN_SECONDS=30  HALF_OPEN_CALLS=1
+"""
+
+import os
+import time
+import threading
+import contextlib
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from .deadline import DeadlineExceeded
+
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """滚动窗口熔断器（线程安全）"""
+
+    def __init__(
+        self,
+        name: str = "llm",
+        window_seconds: float = 60.0,
+        min_calls: int = 4,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.enabled = enabled
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0            # half_open 下已放行的探测数
+        self._probe_successes = 0
+        self._window: deque = deque()   # (时间, 是否成功, 耗时)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0             # 累计打开次数
+
+    @classmethod
+    def from_env(cls, name: str = "llm") -> "CircuitBreaker":
+        env = lambda key, default: os.getenv(f"LLM_BREAKER_{key}", default)
+        return cls(
+            name=name,
+            window_seconds=float(env("WINDOW_SECONDS", "60")),
+            min_calls=int(env("MIN_CALLS", "4")),
+            error_rate=float(env("ERROR_RATE", "0.5")),
+            slow_call_seconds=float(env("SLOW_CALL_SECONDS", "10")),
+            slow_rate=float(env("SLOW_RATE", "0.8")),
+            open_seconds=float(env("OPEN_SECONDS", "30")),
+            half_open_calls=int(env("HALF_OPEN_CALLS", "1")),
+            enabled=env("ENABLED", "true").lower() == "true",
+        )
+
+    # ---------- 状态 ----------
+    def _trim(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self.opened += 1
+        print(f"🔌 熔断器 {self.name} 打开：{self.open_seconds:.0f}s 内 LLM 调用直接走兜底值")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state
+
+    def _advance(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = self._probe_successes = 0
+
+    # ---------- 调用 ----------
+    def allow(self) -> bool:
+        """是否放行一次调用（half_open 下占用一个探测名额）"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            self._advance(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool, latency: float) -> None:
+        """记录一次已放行调用的结果"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            self.failures += 0 if ok else 1
+            if self._state == HALF_OPEN:
+                if not ok:
+                    self._open(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._state = CLOSED
+                    self._window.clear()
+                    print(f"🔌 熔断器 {self.name} 恢复")
+                return
+            if self._state != CLOSED:
+                return
+            self._window.append((now, ok, latency))
+            self._trim(now)
+            total = len(self._window)
+            if total < self.min_calls:
+                return
+            errors = sum(1 for _, success, _ in self._window if not success)
+            slow = sum(1 for _, _, elapsed in self._window if elapsed >= self.slow_call_seconds)
+            if errors / total >= self.error_rate or slow / total >= self.slow_rate:
+                self._open(now)
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """包裹一次 LLM 调用：未放行时抛 CircuitOpenError，否则按结果与耗时记录"""
+        if not self.allow():
+            raise CircuitOpenError(f"熔断器 {self.name} 已打开，跳过 LLM 调用")
+        start = time.monotonic()
+        try:
+            yield
+        except DeadlineExceeded:
+            # 被本次报价的截止时间截断，不代表端点不健康：不计入窗口，归还探测名额
+            self._release()
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+
+    def _release(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._window.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            self._trim(now)
+            total = len(self._window)
+            errors = sum(1 for _, ok, _ in self._window if not ok)
+            slow = sum(1 for _, _, elapsed in self._window if elapsed >= self.slow_call_seconds)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "enabled": self.enabled,
+                "window_calls": total,
+                "window_error_rate": round(errors / total, 3) if total else 0.0,
+                "window_slow_rate": round(slow / total, 3) if total else 0.0,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+                "retry_in": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+                if self._state == OPEN else 0.0,
+            }
+
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+
+def get_llm_breaker() -> CircuitBreaker:
+    """进程内共享的 LLM 熔断器（所有成本工具共用）"""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker.from_env("llm")
+    return _breaker
+
+
+# ==================== 兜底值标记 ====================
+_fallbacks: ContextVar[Optional[List[str]]] = ContextVar("tool_fallbacks", default=None)
+
+
+def report_fallback(tool: str, reason: Any) -> None:
+    """工具改用兜底值时调用；写入当前 collect_fallbacks() 收集器"""
+    collected = _fallbacks.get()
+    if collected is not None:
+        collected.append(f"{tool}: {reason}")
+
+
+@contextlib.contextmanager
+def collect_fallbacks() -> Iterator[List[str]]:
+    """收集当前上下文内（含工具调用）的兜底原因；非空即该值为降级值"""
+    collected: List[str] = []
+    token = _fallbacks.set(collected)
+    try:
+        yield collected
+    finally:
+        _fallbacks.reset(token)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+consensus.py
+多样本共识估算：一次请求取 N 个补全，剔除离群值后取中位数
+
+- temperature=1.0 下同一提示词每次返回的数值不同；共识模式用 n=N 的单次请求取 N 个样本，
+  延迟约等于一次调用，请求数不变
+- 不支持 n 参数的模型（替身 LLM、其他厂商）或端点拒绝 n 时，退回 N 个并发调用
+- 离群判定：与中位数偏差超过 LLM_CONSENSUS_MAD_K × 1.4826·MAD（中位数绝对偏差）
+- 每次共识结果写入当前 collect_consensus() 收集器，报告据此附带各维度的离散度
+- 所有调用经过共享熔断器（见 circuit_breaker.py）：端点不健康时立即抛 CircuitOpenError
+- 调用受当前报价截止时间约束（见 deadline.py）：时间不足时不发起，到点取消
+
+开启方式：LLM_CONSENSUS_N=5（默认 1，即单次调用）
+"""
+
+import os
+import statistics
+import contextlib
+import contextvars
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.messages import HumanMessage
+
+from .circuit_breaker import get_llm_breaker
+from .deadline import DeadlineExceeded, ensure_time_left, run_within_deadline
+
+try:
+    from langchain_openai.chat_models.base import BaseChatOpenAI
+except ImportError:
+    BaseChatOpenAI = None
+
+
+_collector: ContextVar[Optional[List["Consensus"]]] = ContextVar("consensus_collector", default=None)
+
+
+def _accepts_timeout(llm) -> bool:
+    """OpenAI / Azure 聊天模型（或全由其组成的 LLM 池）可按请求传 timeout（到截止时间由 SDK 取消请求）"""
+    if getattr(llm, "accepts_timeout", False):
+        return True
+    return BaseChatOpenAI is not None and isinstance(llm, BaseChatOpenAI)
+
+
+def consensus_samples() -> int:
+    """共识样本数（LLM_CONSENSUS_N，<= 1 表示关闭）"""
+    return max(1, int(os.getenv("LLM_CONSENSUS_N", "1")))
+
+
+def parse_number(text: str) -> float:
+    """取补全首行的数值（与各工具的输出约定一致）"""
+    return float(text.strip().split('\n')[0].strip())
+
+
+@dataclass(slots=True)
+class Consensus:
+    """一组样本的共识结果"""
+    median: float
+    low: float          # 保留样本的最小值
+    high: float         # 保留样本的最大值
+    samples: int        # 成功解析的样本数
+    rejected: int       # 被剔除的离群样本数
+
+    @property
+    def spread(self) -> float:
+        return self.high - self.low
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "median": round(self.median, 4),
+            "low": round(self.low, 4),
+            "high": round(self.high, 4),
+            "spread": round(self.spread, 4),
+            "samples": self.samples,
+            "rejected": self.rejected,
+        }
+
+
+def robust_consensus(values: List[float], k: Optional[float] = None) -> Consensus:
+    """
+    剔除离群值后取中位数
+
+    Args:
+        values: 样本值（至少一个）
+        k: MAD 倍数阈值，缺省取 LLM_CONSENSUS_MAD_K（默认 3）
+    """
+    if not values:
+        raise ValueError("没有可用的样本")
+    k = k if k is not None else float(os.getenv("LLM_CONSENSUS_MAD_K", "3"))
+    center = statistics.median(values)
+    mad = statistics.median(abs(v - center) for v in values)
+    # 多数样本相同（MAD=0）时，以中位数的 5% 作为尺度，避免把微小差异都当离群
+    scale = max(1.4826 * mad, 0.05 * abs(center), 1e-9)
+    kept = [v for v in values if abs(v - center) <= k * scale]
+    return Consensus(
+        median=statistics.median(kept),
+        low=min(kept),
+        high=max(kept),
+        samples=len(values),
+        rejected=len(values) - len(kept),
+    )
+
+
+def complete_n(llm, prompt: str, n: int) -> List[str]:
+    """
+    取 n 个补全文本：OpenAI / Azure 聊天模型走 n=N 单次请求，否则 N 个并发调用
+    """
+    accepts_timeout = _accepts_timeout(llm)
+    if accepts_timeout:
+        try:
+            result = run_within_deadline(llm.generate, [[HumanMessage(content=prompt)]], n=n, accepts_timeout=True)
+            texts = [g.text for g in result.generations[0]]
+            if len(texts) >= n:
+                return texts
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # 部分部署不支持 n>1：退回并发调用
+            print(f"⚠️ n={n} 补全失败，改为并发调用: {e}")
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="consensus") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, run_within_deadline, llm.invoke, prompt,
+                        accepts_timeout=accepts_timeout)
+            for _ in range(n)
+        ]
+        texts = []
+        for future in futures:
+            try:
+                texts.append(future.result().content)
+            except Exception as e:
+                print(f"⚠️ 共识样本调用失败: {e}")
+        return texts
+
+
+def estimate(llm, prompt: str, n: Optional[int] = None) -> float:
+    """
+    估算单个数值：n <= 1 时为一次调用；否则取 n 个样本的共识中位数
+
+    无法得到任何有效数值时抛异常（工具按原逻辑走默认值兜底）
+    """
+    n = n if n is not None else consensus_samples()
+    breaker = get_llm_breaker()
+    ensure_time_left()
+    if n <= 1:
+        with breaker.guard():
+            response = run_within_deadline(llm.invoke, prompt, accepts_timeout=_accepts_timeout(llm))
+        return parse_number(response.content)
+
+    with breaker.guard():
+        texts = complete_n(llm, prompt, n)
+        if not texts:
+            raise RuntimeError(f"{n} 个共识样本调用均失败")
+    values = []
+    for text in texts:
+        try:
+            values.append(parse_number(text))
+        except (ValueError, AttributeError):
+            continue
+    result = robust_consensus(values)
+    collected = _collector.get()
+    if collected is not None:
+        collected.append(result)
+    return result.median
+
+
+@contextlib.contextmanager
+def collect_consensus() -> Iterator[List[Consensus]]:
+    """收集当前上下文内（含工具调用）产生的共识结果"""
+    collected: List[Consensus] = []
+    token = _collector.set(collected)
+    try:
+        yield collected
+    finally:
+        _collector.reset(token)
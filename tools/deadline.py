@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+deadline.py
+单次报价的截止时间（上下文传播）
+
+- run_agent(deadline=秒) 把截止时刻（epoch 秒）写入图状态，execution 节点用 deadline_scope()
+  设为当前上下文，工具内的 LLM 调用经 run_within_deadline() 读取剩余时间
+- 剩余时间不足 DEADLINE_MIN_CALL_SECONDS 时不再发起调用，直接抛 DeadlineExceeded（工具走兜底值）
+- OpenAI / Azure 模型把剩余时间作为单次请求的 timeout 传给 SDK，到点由 httpx 取消请求；
+  其他模型在后台线程执行，到点放弃等待
+"""
+
+import os
+import time
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("quote_deadline", default=None)
+
+# 不支持 timeout 参数的模型在此执行；超时后线程自然结束，结果丢弃
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="deadline")
+
+
+class DeadlineExceeded(TimeoutError):
+    """报价截止时间已到（或剩余时间不足以完成一次调用）"""
+
+
+def min_call_seconds() -> float:
+    return float(os.getenv("DEADLINE_MIN_CALL_SECONDS", "0.5"))
+
+
+def remaining() -> Optional[float]:
+    """当前上下文的剩余时间（秒）；未设置截止时间时为 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def ensure_time_left() -> None:
+    """剩余时间不足以发起一次调用时抛 DeadlineExceeded"""
+    left = remaining()
+    if left is not None and left < min_call_seconds():
+        raise DeadlineExceeded(f"报价截止时间将至（剩余 {max(left, 0):.2f}s），跳过 LLM 调用")
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """
+    在当前上下文设置截止时刻（epoch 秒）；None 表示不限时
+
+    嵌套时取更早的截止时刻。
+    """
+    outer = _deadline.get()
+    if deadline is None:
+        effective = outer
+    else:
+        effective = deadline if outer is None else min(outer, deadline)
+    token = _deadline.set(effective)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def run_within_deadline(fn: Callable[..., T], *args: Any, accepts_timeout: bool = False, **kwargs: Any) -> T:
+    """
+    在剩余时间内执行 fn
+
+    Args:
+        accepts_timeout: fn 是否接受 timeout 关键字（OpenAI SDK 的单次请求超时）
+    """
+    ensure_time_left()
+    left = remaining()
+    if left is None:
+        return fn(*args, **kwargs)
+    if accepts_timeout:
+        try:
+            return fn(*args, timeout=left, **kwargs)
+        except Exception as e:
+            if (remaining() or 0) <= 0:
+                raise DeadlineExceeded(f"LLM 请求在截止时间前未完成: {e}") from e
+            raise
+    future = _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    try:
+        return future.result(timeout=left)
+    except FutureTimeout:
+        future.cancel()
+        raise DeadlineExceeded(f"LLM 请求在截止时间前未完成（{left:.2f}s）") from None
@@ -2,9 +2,13 @@
 """
 drawing_parser_tool.py
 使用 CadQuery 解析 STP 文件，提取表面积和体积
+
+超过 DRAWING_LARGE_FILE_MB（默认 100MB）的文件走大文件模式：逐实体测量并释放，
+内存峰值有上限，结果含逐实体几何与峰值内存（见 step_geometry.py）。
 """
 
 import os
+import hashlib
 from typing import Dict, Any, Optional
 from pydantic import BaseModel, Field
 from langchain_core.tools import StructuredTool
@@ -16,9 +20,25 @@ except ImportError:
     CADQUERY_AVAILABLE = False
     print("⚠️ CadQuery 未安装，图纸解析功能将不可用")
 
+from .step_geometry import (
+    RssTracker, drawing_fingerprint, iter_step_solids, measure_solid, solids_of, summarize_solids,
+)
+
+LARGE_FILE_MB = float(os.getenv("DRAWING_LARGE_FILE_MB", "100"))
+
+
+def file_sha256(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """按块计算文件 SHA-256（大文件不整体读入内存）"""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 
 class DrawingParserArgs(BaseModel):
     file_path: str = Field(..., description="STP文件的完整路径")
+    large_file: Optional[bool] = Field(None, description="大文件模式（逐实体解析）；缺省按文件大小自动判断")
 
 
 class DrawingParserTool:
@@ -32,12 +52,13 @@ class DrawingParserTool:
             "Returns None if file cannot be parsed."
         )
     
-    def run(self, file_path: str) -> Optional[Dict[str, Any]]:
+    def run(self, file_path: str, large_file: Optional[bool] = None) -> Optional[Dict[str, Any]]:
         """
         解析STP文件
         
         Args:
             file_path: STP文件路径
+            large_file: 是否使用大文件模式；None 时文件超过 DRAWING_LARGE_FILE_MB 自动启用
             
         Returns:
             包含 surface_area 和 volume 的字典，失败返回None
@@ -50,6 +71,11 @@ class DrawingParserTool:
             print(f"❌ 文件不存在: {file_path}")
             return None
         
+        if large_file is None:
+            large_file = os.path.getsize(file_path) >= LARGE_FILE_MB * 1024 * 1024
+        if large_file:
+            return self.run_large(file_path)
+
         try:
             print(f"📐 正在解析图纸: {file_path}")
             
@@ -61,8 +87,8 @@ class DrawingParserTool:
             for face in result.faces().vals():
                 surface_area += face.Area()
             
-            # 计算体积（单位：mm³）
-            volume = result.val().Volume() if hasattr(result.val(), 'Volume') else 0.0
+            # 计算体积（单位：mm³）：所有实体之和，与大文件模式（按实例累计）一致
+            volume = sum(solid.Volume() for solid in result.solids().vals())
             
             data = {
                 "surface_area": round(surface_area, 2),
@@ -70,6 +96,7 @@ class DrawingParserTool:
                 "unit_area": "mm²",
                 "unit_volume": "mm³"
             }
+            data.update(self._fingerprint(result))
             
             print(f"✅ 解析成功: 表面积={data['surface_area']} mm², 体积={data['volume']} mm³")
             return data
@@ -78,6 +105,54 @@ class DrawingParserTool:
             print(f"❌ 解析失败: {e}")
             return None
     
+    @staticmethod
+    def _fingerprint(result) -> Dict[str, Any]:
+        """
+        图纸级几何指纹与拓扑计数（识别改名/重新导出的同一图纸）；失败时不影响解析结果
+
+        指纹按逐实体测量计算（drawing_fingerprint），与大文件模式（summarize_solids）一致。
+        """
+        try:
+            shapes = [v for v in result.vals() if isinstance(v, cq.Shape)]
+            shape = shapes[0] if len(shapes) == 1 else cq.Compound.makeCompound(shapes)
+            geometry = measure_solid(shape.wrapped)
+            return {
+                "fingerprint": drawing_fingerprint(solids_of(shape.wrapped)),
+                "faces": geometry.faces,
+                "edges": geometry.edges,
+                "solid_count": geometry.solids,
+            }
+        except Exception as e:
+            print(f"⚠️ 几何指纹计算失败: {e}")
+            return {}
+
+    def run_large(self, file_path: str, max_detail: int = 500) -> Optional[Dict[str, Any]]:
+        """
+        大文件模式：逐实体测量，测完即释放
+
+        Returns:
+            汇总表面积/体积（按实例数累计）、逐实体明细（最多 max_detail 条）、
+            实体数与峰值内存（peak_rss_mb / rss_delta_mb）
+        """
+        try:
+            print(f"📐 正在逐实体解析大图纸: {file_path} ({os.path.getsize(file_path) / 1024 / 1024:.0f} MB)")
+            tracker = RssTracker()
+            data = summarize_solids(iter_step_solids(file_path, tracker), max_detail=max_detail)
+            data.update({
+                "unit_area": "mm²",
+                "unit_volume": "mm³",
+                "mode": "large",
+                **tracker.to_dict(),
+            })
+            print(f"✅ 解析成功: {data['solid_count']} 个实体（{data['unique_solids']} 种）, "
+                  f"表面积={data['surface_area']} mm², 体积={data['volume']} mm³, "
+                  f"峰值内存 {data['peak_rss_mb']} MB")
+            return data
+
+        except Exception as e:
+            print(f"❌ 解析失败: {e}")
+            return None
+
     def as_tool(self) -> StructuredTool:
         return StructuredTool.from_function(
             func=self.run,
@@ -10,6 +10,11 @@ from langchain_core.tools import StructuredTool
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 
+from .region_rates import RegionIndex, get_region_index
+from .process_catalog import get_process_catalog
+from .consensus import estimate
+from .circuit_breaker import report_fallback
+
 
 class EnergyCostArgs(BaseModel):
     process: str = Field(..., description="工艺名称")
@@ -21,7 +26,7 @@ class EnergyCostArgs(BaseModel):
 class EnergyCostTool:
     """能源成本估算工具（考虑电、水、气和地域差异）"""
     
-    def __init__(self, llm: BaseChatModel):
+    def __init__(self, llm: BaseChatModel, region_index: Optional[RegionIndex] = None):
         self.name = "energy_cost"
         self.description = (
             "Estimate energy costs (electricity, water, natural gas) in CNY/kg "
@@ -29,6 +34,7 @@ class EnergyCostTool:
             "Surface area and volume are optional parameters."
         )
         self.llm = llm
+        self.region_index = region_index or get_region_index()
     
     def run(
         self, 
@@ -50,6 +56,8 @@ class EnergyCostTool:
             能源成本（CNY/kg）
         """
         geo_info = f"\n表面积: {surface_area:.2f} mm²\n体积: {volume:.2f} mm³" if surface_area and volume else ""
+        # 地区能源价格直接查本地数据表，不再交给 LLM 推断
+        region = self.region_index.resolve(location)
         
         prompt = ChatPromptTemplate.from_template("""
 你是一名能源成本分析师。请估算以下工艺的能源成本（单位：CNY/kg）。
@@ -67,10 +75,11 @@ class EnergyCostTool:
    - machining: 中等电耗（CNC设备）+ 高水耗（切削液冷却）
    - inspection: 低电耗（检测设备）
 
-中国主要地区工业电价参考（2024）：
-- 浙江：0.60-0.70 CNY/kWh
-- 江苏：0.55-0.65 CNY/kWh
-- 广东：0.65-0.75 CNY/kWh
+该地区能源价格（本地数据表，直接使用，无需再推断）：
+- 匹配地区: {region}
+- 工业电价: {electricity:.2f} CNY/kWh
+- 工业水价: {water:.2f} CNY/t
+- 工业天然气: {gas:.2f} CNY/m³
 
 仅返回总能源成本数值（CNY/kg），保留2位小数。
 
@@ -79,28 +88,27 @@ class EnergyCostTool:
 """)
         
         try:
-            response = self.llm.invoke(
+            cost = estimate(
+                self.llm,
                 prompt.format(
                     process=process, 
                     location=location, 
-                    geo_info=geo_info
+                    geo_info=geo_info,
+                    region=region.display,
+                    electricity=region.electricity,
+                    water=region.water,
+                    gas=region.gas,
                 )
             )
-            content = response.content.strip()
-            cost = float(content.split('\n')[0].strip())
             print(f"⚡ {process} @ {location} 能源成本: {cost:.2f} CNY/kg")
             return round(cost, 2)
             
         except Exception as e:
             print(f"⚠️ LLM推理失败: {e}")
-            # 默认值
-            defaults = {
-                "melting": 2.50,
-                "casting": 1.20,
-                "machining": 1.80,
-                "inspection": 0.30
-            }
-            return defaults.get(process.lower(), 1.00)
+            report_fallback(self.name, e)
+            # 默认值（见工艺目录 defaults，按地区能源价格系数折算）
+            default = get_process_catalog().default(process, "energy", 1.00)
+            return round(default * region.energy_factor(), 2)
     
     def as_tool(self) -> StructuredTool:
         return StructuredTool.from_function(
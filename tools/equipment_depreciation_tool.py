@@ -11,6 +11,10 @@ from langchain_core.tools import StructuredTool
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 
+from .process_catalog import get_process_catalog
+from .consensus import estimate
+from .circuit_breaker import report_fallback
+
 
 class EquipmentDepreciationArgs(BaseModel):
     process: str = Field(..., description="工艺名称，如 melting, casting, machining, inspection")
@@ -61,24 +65,15 @@ class EquipmentDepreciationTool:
 """)
         
         try:
-            response = self.llm.invoke(prompt.format(process=process, volume=volume))
-            content = response.content.strip()
-            
-            # 提取数字
-            cost = float(content.split('\n')[0].strip())
+            cost = estimate(self.llm, prompt.format(process=process, volume=volume))
             print(f"📊 {process} 设备折旧: {cost:.2f} CNY/kg")
             return round(cost, 2)
             
         except Exception as e:
             print(f"⚠️ LLM推理失败，使用默认值: {e}")
-            # 默认值（基于经验）
-            defaults = {
-                "melting": 0.50,
-                "casting": 1.20,
-                "machining": 0.80,
-                "inspection": 0.30
-            }
-            return defaults.get(process.lower(), 0.50)
+            report_fallback(self.name, e)
+            # 默认值（基于经验，见工艺目录 defaults）
+            return get_process_catalog().default(process, "equipment_depreciation", 0.50)
     
     def as_tool(self) -> StructuredTool:
         return StructuredTool.from_function(
@@ -4,11 +4,17 @@ labor_cost_tool.py
 基于LLM推理的人工成本估算工具（考虑地域差异）
 """
 
+from typing import Optional
 from pydantic import BaseModel, Field
 from langchain_core.tools import StructuredTool
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 
+from .region_rates import RegionIndex, get_region_index
+from .process_catalog import get_process_catalog
+from .consensus import estimate
+from .circuit_breaker import report_fallback
+
 
 class LaborCostArgs(BaseModel):
     process: str = Field(..., description="工艺名称")
@@ -19,7 +25,7 @@ class LaborCostArgs(BaseModel):
 class LaborCostTool:
     """人工成本估算工具（考虑地域工资差异和自动化程度）"""
     
-    def __init__(self, llm: BaseChatModel):
+    def __init__(self, llm: BaseChatModel, region_index: Optional[RegionIndex] = None):
         self.name = "labor_cost"
         self.description = (
             "Estimate labor costs (CNY/kg) considering regional wage levels, "
@@ -27,6 +33,7 @@ class LaborCostTool:
             "Different regions in China have different labor costs."
         )
         self.llm = llm
+        self.region_index = region_index or get_region_index()
     
     def run(self, process: str, location: str, volume: int) -> float:
         """
@@ -40,6 +47,9 @@ class LaborCostTool:
         Returns:
             人工成本（CNY/kg）
         """
+        # 地区工资直接查本地数据表，不再交给 LLM 推断
+        region = self.region_index.resolve(location)
+
         prompt = ChatPromptTemplate.from_template("""
 你是一名人力资源成本分析师。请估算以下工艺的人工成本（单位：CNY/kg）。
 
@@ -48,10 +58,9 @@ class LaborCostTool:
 年产量: {volume:,} 件
 
 请考虑：
-1. 该地区的平均工资水平（2024年数据）
-   - 长三角（浙江、江苏、上海）：5000-8000 CNY/月
-   - 珠三角（广东）：5500-8500 CNY/月
-   - 中西部：4000-6000 CNY/月
+1. 该地区的平均工资水平（本地数据表，直接使用，无需再推断）
+   - 匹配地区: {region}
+   - 制造业一线员工平均工资: {wage:.0f} CNY/月
 
 2. 该工艺的自动化程度
    - melting: 中等自动化，需要2-3名操作工
@@ -71,24 +80,25 @@ class LaborCostTool:
 """)
         
         try:
-            response = self.llm.invoke(
-                prompt.format(process=process, location=location, volume=volume)
+            cost = estimate(
+                self.llm,
+                prompt.format(
+                    process=process,
+                    location=location,
+                    volume=volume,
+                    region=region.display,
+                    wage=region.wage,
+                )
             )
-            content = response.content.strip()
-            cost = float(content.split('\n')[0].strip())
             print(f"👷 {process} @ {location} 人工成本: {cost:.2f} CNY/kg")
             return round(cost, 2)
             
         except Exception as e:
             print(f"⚠️ LLM推理失败: {e}")
-            # 默认值（基于经验）
-            defaults = {
-                "melting": 0.40,
-                "casting": 0.60,
-                "machining": 0.50,
-                "inspection": 0.80
-            }
-            return defaults.get(process.lower(), 0.50)
+            report_fallback(self.name, e)
+            # 默认值（见工艺目录 defaults，按地区工资系数折算）
+            default = get_process_catalog().default(process, "labor", 0.50)
+            return round(default * region.wage_factor(), 2)
     
     def as_tool(self) -> StructuredTool:
         return StructuredTool.from_function(
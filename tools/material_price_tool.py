@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+"""
+material_price_tool.py
+原材料价格工具：抓取 Al / Mn / Si 国内现货价格，按合金成分折算为原材料成本（CNY/kg）
+
+由 tests/test_price_finder_real.py 的异步原型整理而来：
+- 进程内共享一个 aiohttp 会话（连接池 + 每主机连接上限），跑在专用事件循环线程上，
+  同步工具调用经 run_coroutine_threadsafe 提交
+- 同一材料的多个候选来源并发抓取，按搜索排名取第一个解析出合理价格的来源；多种材料也并发
+- 页面流式读取（上限 MATERIAL_PRICE_MAX_BYTES），边解析边匹配，遇到第一个通过
+  MINIMUM_REASONABLE_PRICES 的价格即停止下载；HTML 解析在线程池中执行，不占用事件循环
+- 价格按 (材料, 来源) 缓存 MATERIAL_PRICE_TTL_SECONDS 秒，页面未给出价格的结果同样缓存
+- 来源：MATERIAL_PRICE_SOURCES 指定的 JSON（{材料: [URL, ...]}），否则走搜索
+  （TAVILY_API_KEY 存在时用 Tavily，否则 DuckDuckGo；搜索客户端共享，不再按材料新建；结果经共享搜索缓存）
+- 价格写入材料价格库（storage/price_store.py）：未超过刷新间隔的材料直接用库中价格，
+  只抓取到期的材料；as_of 参数按库中截至某日的价格重算历史报价
+- 抓取失败 / 未找到价格 / 离线（且价格库中也没有）的材料使用兜底价格，并标记为降级（report_fallback）
+- 原材料只计入工艺目录中 material 规则不为 static 的工艺（熔炼），其余工艺为 0，避免重复计价
+"""
+
+import os
+import re
+import ssl
+import json
+import time
+import codecs
+import importlib.util
+import asyncio
+import threading
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from langchain_core.tools import StructuredTool
+
+from .process_catalog import get_process_catalog
+from .circuit_breaker import report_fallback
+from .deadline import ensure_time_left, remaining
+from .search_cache import acached_search
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+# 价格合理性下限（CNY/kg）：防止抓到示例价、运费等过低的数字
+MINIMUM_REASONABLE_PRICES = {
+    "Aluminum": 10.0,
+    "Manganese": 8.0,
+    "Silicon": 10.0,
+}
+
+# 抓取失败时的兜底价格（CNY/kg，近一年国内现货均价量级）
+DEFAULT_PRICES = {
+    "Aluminum": 20.0,
+    "Manganese": 14.0,
+    "Silicon": 13.0,
+}
+
+# 合金成分（质量分数，只计有价格来源的主元素；微量元素并入铝）
+ALLOY_COMPOSITIONS: Dict[str, Dict[str, float]] = {
+    "AlSi9Mn": {"Aluminum": 0.895, "Silicon": 0.100, "Manganese": 0.005},
+    "AlSi10MnMg": {"Aluminum": 0.894, "Silicon": 0.100, "Manganese": 0.006},
+    "AlSi7Mg": {"Aluminum": 0.930, "Silicon": 0.070},
+}
+DEFAULT_ALLOY = "AlSi9Mn"
+
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# 数值 + 可选币种 + /kg（组 2）或 /ton（组 3）；按文档顺序扫描
+_PRICE_PATTERN = re.compile(
+    r'(\d{1,8}(?:\.\d{1,4})?)\s*(?:CNY|¥|元)?\s*/\s*(?:(kg|千克)|(ton|t|吨))', re.IGNORECASE
+)
+
+SearchFn = Callable[[str, int], Awaitable[List[str]]]
+
+
+class _TextExtractor(HTMLParser):
+    """
+    HTML → 可见文本（跳过 script / style），可增量 feed
+
+    文本原样交给 handle_text（增量 feed 时同一文本节点可能分多次到达），标签处补一个空格。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        self.handle_text(" ")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+        self.handle_text(" ")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.handle_text(data)
+
+    def handle_text(self, text: str) -> None:
+        """可见文本回调；基类丢弃文本，子类按需收集或增量扫描"""
+
+
+class _TextCollector(_TextExtractor):
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+
+    def handle_text(self, text: str) -> None:
+        self.parts.append(text)
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextCollector()
+    parser.feed(html)
+    parser.close()
+    return " ".join("".join(parser.parts).split())
+
+
+class PriceScanner(_TextExtractor):
+    """
+    流式价格提取：增量 feed HTML，对可见文本运行价格模式，遇到第一个合理价格即停止
+
+    只保留最近 _OVERLAP 个字符的文本窗口，跨片段（如 "20,1" + "50 元/吨"）的价格也能匹配；
+    低于 MINIMUM_REASONABLE_PRICES 的数字（示例价、运费）跳过，继续向后找。
+    """
+
+    _OVERLAP = 64
+
+    def __init__(self, material_name: str):
+        super().__init__()
+        self.material = material_name
+        self.minimum = MINIMUM_REASONABLE_PRICES.get(material_name, 0.01)
+        self.price: Optional[float] = None
+        self.notes = "Price not found in kg or ton format."
+        self._window = ""
+
+    @property
+    def done(self) -> bool:
+        return self.price is not None
+
+    def handle_text(self, text: str) -> None:
+        if self.done:
+            return
+        text = text.replace(',', '')
+        if not text.strip() and self._window.endswith(" "):
+            return
+        seen = len(self._window)
+        self._window += text
+        for match in _PRICE_PATTERN.finditer(self._window):
+            if match.end() <= seen:
+                continue    # 上一轮已判断过
+            if self._accept(match):
+                return
+        self._window = self._window[-self._OVERLAP:]
+
+    def _accept(self, match: "re.Match") -> bool:
+        value = float(match.group(1))
+        if match.group(2):
+            if value < self.minimum:
+                self.notes = f"Kg price {value} found but rejected as unreasonably low for {self.material}."
+                return False
+            self.price, self.notes = value, f"Found price per kg: {value}"
+            return True
+        kg_price = value / 1000.0
+        if kg_price < self.minimum:
+            self.notes = (f"Ton price {value} found but rejected as unreasonably low for {self.material}. "
+                          f"(Converted to kg: {kg_price:.3f})")
+            return False
+        self.price, self.notes = kg_price, f"Found price per ton: {value}, converted to kg: {kg_price:.3f}"
+        return True
+
+
+def parse_price_from_text(text: str, material_name: str) -> Tuple[Optional[float], str]:
+    """
+    从纯文本中取第一个合理价格（/kg 直接取，/ton 折算为 kg）
+
+    Returns:
+        (CNY/kg 价格或 None, 说明)
+    """
+    scanner = PriceScanner(material_name)
+    scanner.handle_text(text)
+    return scanner.price, scanner.notes
+
+
+@dataclass(slots=True)
+class MaterialPrice:
+    """单个材料的价格查询结果（字段与原型输出一致）"""
+    name: str
+    price_per_unit: Optional[float]
+    source: Optional[str]
+    notes: str
+    query_used: str
+    last_updated: str = ""
+    unit: str = "kg"
+    currency: str = "CNY"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "price_per_unit": self.price_per_unit,
+            "unit": self.unit,
+            "currency": self.currency,
+            "source": self.source,
+            "notes": self.notes,
+            "last_updated": self.last_updated,
+            "query_used": self.query_used,
+        }
+
+
+def price_query(material_name: str) -> str:
+    return f"Latest China domestic price for {material_name} used in AlSi9Mn alloy"
+
+
+def load_sources(path: Optional[str] = None) -> Optional[Dict[str, List[str]]]:
+    """固定来源配置（MATERIAL_PRICE_SOURCES），未配置时返回 None（走搜索）"""
+    path = path or os.getenv("MATERIAL_PRICE_SOURCES")
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class MaterialPriceFinder:
+    """材料价格抓取器：共享 aiohttp 会话 + (材料, 来源) 价格缓存（线程安全）"""
+
+    def __init__(
+        self,
+        search: Optional[SearchFn] = None,
+        sources: Optional[Dict[str, List[str]]] = None,
+        max_results: int = 3,
+        fetch_timeout: float = 10.0,
+        connections: int = 32,
+        per_host: int = 4,
+        ttl: float = 6 * 3600,
+        tls12_only: bool = False,
+        max_bytes: int = 512 * 1024,
+        chunk_size: int = 16 * 1024,
+    ):
+        """
+        Args:
+            search: 异步搜索函数 (query, max_results) -> [URL]，缺省为 Tavily / DuckDuckGo
+            sources: 固定来源 {材料: [URL, ...]}，给出时不再搜索
+            max_results: 每种材料抓取的候选来源数
+            fetch_timeout: 单个页面的抓取超时
+            connections / per_host: 连接池总上限 / 每主机上限
+            ttl: 价格缓存时长
+            tls12_only: 禁用 TLS 1.3（兼容部分企业代理）
+            max_bytes: 每个页面最多读取的字节数（价格通常在页面前部）
+            chunk_size: 流式读取的块大小
+        """
+        if aiohttp is None:
+            raise ImportError("材料价格工具需要 aiohttp：pip install aiohttp")
+        self._custom_search = search is not None
+        self.search = search or default_search(self)
+        self.sources = sources
+        self.max_results = max_results
+        self.fetch_timeout = fetch_timeout
+        self.connections = connections
+        self.per_host = per_host
+        self.ttl = ttl
+        self.tls12_only = tls12_only
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.fetches = 0
+        self.bytes_read = 0
+
+        # (材料, 来源 URL) -> (抓取时刻, 价格或 None, 说明)
+        self._cache: Dict[Tuple[str, str], Tuple[float, Optional[float], str]] = {}
+        self._cache_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "MaterialPriceFinder":
+        env = lambda key, default: os.getenv(f"MATERIAL_PRICE_{key}", default)
+        options = dict(
+            sources=load_sources(),
+            max_results=int(env("MAX_RESULTS", "3")),
+            fetch_timeout=float(env("FETCH_TIMEOUT", "10")),
+            connections=int(env("CONNECTIONS", "32")),
+            per_host=int(env("PER_HOST", "4")),
+            ttl=float(env("TTL_SECONDS", str(6 * 3600))),
+            tls12_only=env("TLS12_ONLY", "false").lower() == "true",
+            max_bytes=int(env("MAX_BYTES", str(512 * 1024))),
+        )
+        options.update(kwargs)
+        return cls(**options)
+
+    @property
+    def can_fetch(self) -> bool:
+        """有固定来源、自定义搜索或可用的搜索提供方时才能抓取（否则不必等到超时才降级）"""
+        return self.sources is not None or self._custom_search or search_provider() is not None
+
+    # ---------- 事件循环与会话 ----------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="material-price", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def session(self) -> "aiohttp.ClientSession":
+        """共享会话（在抓取器的事件循环上首次使用时创建）"""
+        if self._session is None or self._session.closed:
+            ssl_context = ssl.create_default_context()
+            if self.tls12_only:
+                ssl_context.maximum_version = ssl.TLSVersion.TLSv1_2
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, limit_per_host=self.per_host, ssl=ssl_context),
+                timeout=aiohttp.ClientTimeout(total=self.fetch_timeout),
+                headers=_HEADERS,
+                trust_env=True,     # 与 agent 一致，读取 HTTP(S)_PROXY / NO_PROXY
+            )
+        return self._session
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """在抓取器的事件循环上执行协程并等待结果"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        if self._session is not None:
+            self.run(self._session.close(), timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = self._session = None
+
+    # ---------- 缓存 ----------
+    def _cached(self, material: str, url: str) -> Optional[Tuple[Optional[float], str]]:
+        with self._cache_lock:
+            entry = self._cache.get((material, url))
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1], entry[2]
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    # ---------- 抓取 ----------
+    async def _price_from_source(self, material: str, url: str) -> Tuple[Optional[float], str]:
+        cached = self._cached(material, url)
+        if cached is not None:
+            return cached
+        session = await self.session()
+        self.fetches += 1
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None, f"Failed to fetch source URL, status code: {response.status}"
+                price, notes = await self._scan(response, material)
+        except asyncio.TimeoutError:
+            return None, "Timeout while fetching source URL."
+        except aiohttp.ClientError as e:
+            return None, f"Error processing source URL: {e}"
+        with self._cache_lock:
+            self._cache[(material, url)] = (time.time(), price, notes)
+        return price, notes
+
+    async def _scan(self, response: "aiohttp.ClientResponse", material: str) -> Tuple[Optional[float], str]:
+        """
+        流式读取响应体并提取价格：找到合理价格或读满 max_bytes 即停止（剩余内容不再下载）
+
+        HTML 解析在线程池中执行，不阻塞抓取器的事件循环（其他页面的下载照常进行）。
+        """
+        scanner = PriceScanner(material)
+        try:
+            decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        received = 0
+        async for chunk in response.content.iter_chunked(self.chunk_size):
+            chunk = chunk[: self.max_bytes - received]
+            received += len(chunk)
+            await asyncio.to_thread(scanner.feed, decoder.decode(chunk))
+            if scanner.done or received >= self.max_bytes:
+                break
+        else:
+            await asyncio.to_thread(lambda: (scanner.feed(decoder.decode(b"", final=True)), scanner.close()))
+        self.bytes_read += received
+        if not scanner.done and received >= self.max_bytes:
+            return None, f"Price not found within the first {self.max_bytes} bytes."
+        return scanner.price, scanner.notes
+
+    async def _candidate_urls(self, material: str, query: str) -> List[str]:
+        if self.sources is not None:
+            return list(self.sources.get(material, []))[: self.max_results]
+        return (await self.search(query, self.max_results))[: self.max_results]
+
+    async def get_material_price(self, material: str) -> MaterialPrice:
+        """获取单个材料的价格：候选来源并发抓取，按排名取第一个有效价格"""
+        query = price_query(material)
+        result = MaterialPrice(
+            name=material, price_per_unit=None, source=None,
+            notes="Search failed or no suitable source found.", query_used=query,
+            last_updated=datetime.now(timezone.utc).isoformat(),
+        )
+        try:
+            urls = await self._candidate_urls(material, query)
+        except Exception as e:
+            result.notes = f"An unexpected error occurred during search: {e}"
+            return result
+        outcomes = await asyncio.gather(*(self._price_from_source(material, url) for url in urls))
+        for url, (price, notes) in zip(urls, outcomes):
+            result.source, result.notes = url, notes
+            if price is not None:
+                result.price_per_unit = price
+                break
+        return result
+
+    async def get_prices(self, materials: Iterable[str]) -> Dict[str, MaterialPrice]:
+        materials = list(materials)
+        results = await asyncio.gather(*(self.get_material_price(m) for m in materials))
+        return dict(zip(materials, results))
+
+    def prices(self, materials: Iterable[str], timeout: Optional[float] = None) -> Dict[str, MaterialPrice]:
+        """同步入口：并发获取多种材料的价格"""
+        return self.run(self.get_prices(materials), timeout)
+
+
+def search_provider() -> Optional[str]:
+    """默认搜索的提供方：tavily（有 TAVILY_API_KEY）/ ddgs（已安装 duckduckgo-search）/ None"""
+    if os.getenv("TAVILY_API_KEY"):
+        return "tavily"
+    if importlib.util.find_spec("duckduckgo_search") is not None:
+        return "ddgs"
+    return None
+
+
+def default_search(finder: MaterialPriceFinder) -> SearchFn:
+    """
+    默认搜索：TAVILY_API_KEY 存在时走 Tavily（复用抓取器会话），否则 DuckDuckGo（共享一个客户端）
+
+    结果经共享搜索缓存（见 search_cache.py）：相同查询不重复付费，并发的相同查询只发起一次。
+    """
+    ddgs = []
+
+    async def tavily(query: str, max_results: int, key: str) -> List[str]:
+        session = await finder.session()
+        async with session.post(
+            "https://api.tavily.com/search",
+            json={"query": query, "max_results": max_results},
+            headers={"Authorization": f"Bearer {key}"},
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return [r["url"] for r in data.get("results", []) if r.get("url")]
+
+    async def duckduckgo(query: str, max_results: int) -> List[str]:
+        if not ddgs:
+            from duckduckgo_search import DDGS
+            ddgs.append(DDGS())
+        results = await asyncio.to_thread(ddgs[0].text, query, max_results=max_results)
+        return [r["href"] for r in results or [] if r.get("href")]
+
+    async def search(query: str, max_results: int) -> List[str]:
+        provider = search_provider()
+        if provider == "tavily":
+            key = os.getenv("TAVILY_API_KEY")
+            return await acached_search("tavily", query, lambda: tavily(query, max_results, key),
+                                        max_results=max_results)
+        if provider == "ddgs":
+            return await acached_search("ddgs", query, lambda: duckduckgo(query, max_results),
+                                        max_results=max_results)
+        raise RuntimeError("没有可用的搜索提供方（设置 TAVILY_API_KEY、MATERIAL_PRICE_SOURCES 或安装 duckduckgo-search）")
+
+    return search
+
+
+_finder: Optional[MaterialPriceFinder] = None
+_finder_lock = threading.Lock()
+
+
+def get_material_price_finder() -> MaterialPriceFinder:
+    """进程内共享的价格抓取器（一个会话、一份价格缓存）"""
+    global _finder
+    with _finder_lock:
+        if _finder is None:
+            _finder = MaterialPriceFinder.from_env()
+    return _finder
+
+
+class MaterialCostArgs(BaseModel):
+    process: str = Field(..., description="工艺名称")
+    alloy: Optional[str] = Field(None, description="合金牌号，如 'AlSi9Mn'（缺省取 MATERIAL_ALLOY）")
+    as_of: Optional[str] = Field(None, description="按某日价格计价（ISO 日期或时间），缺省为当前价格")
+
+
+class MaterialCostTool:
+    """原材料成本工具（按合金成分加权的现货价格）"""
+
+    def __init__(
+        self,
+        finder: Optional[MaterialPriceFinder] = None,
+        offline: bool = False,
+        store=None,
+        use_store: Optional[bool] = None,
+    ):
+        """
+        Args:
+            finder: 价格抓取器，缺省为进程内共享实例
+            offline: 不联网（只用价格库中已有价格或兜底价格）
+            store: 材料价格库，缺省为进程内共享实例（storage/price_store.py）
+            use_store: 是否使用价格库（缺省 MATERIAL_PRICE_STORE_ENABLED，默认 true）
+        """
+        self.name = "material_cost"
+        self.description = (
+            "Estimate raw material cost in CNY/kg from current China domestic prices "
+            "of aluminum, silicon and manganese, weighted by alloy composition. "
+            "Only the melting step carries the material cost."
+        )
+        self._finder = finder
+        self._store = store
+        self.offline = offline
+        if use_store is None:
+            use_store = os.getenv("MATERIAL_PRICE_STORE_ENABLED", "true").lower() == "true"
+        self.use_store = use_store
+
+    @property
+    def finder(self) -> MaterialPriceFinder:
+        return self._finder or get_material_price_finder()
+
+    @property
+    def store(self):
+        if self._store is None and self.use_store:
+            from storage.price_store import get_material_price_store
+            return get_material_price_store()
+        return self._store
+
+    @staticmethod
+    def composition(alloy: Optional[str]) -> Tuple[str, Dict[str, float]]:
+        alloy = alloy or os.getenv("MATERIAL_ALLOY", DEFAULT_ALLOY)
+        if alloy not in ALLOY_COMPOSITIONS:
+            print(f"⚠️ 未知合金 {alloy}，按 {DEFAULT_ALLOY} 计价")
+            alloy = DEFAULT_ALLOY
+        return alloy, ALLOY_COMPOSITIONS[alloy]
+
+    def _fetch_timeout(self) -> float:
+        ensure_time_left()
+        left = remaining()
+        timeout = float(os.getenv("MATERIAL_PRICE_TIMEOUT", "20"))
+        return timeout if left is None else min(timeout, left)
+
+    def _current_prices(self, materials: List[str]) -> Dict[str, float]:
+        """
+        当前价格：价格库中未过期的直接使用，只为到期的材料抓取并写入价格库；
+        抓取失败时沿用价格库中最近一次的价格
+        """
+        store = self.store
+        prices: Dict[str, float] = {}
+        fetch = not self.offline and getattr(self.finder, "can_fetch", True)
+        if not self.offline and not fetch:
+            print("⚠️ 未配置价格来源且没有可用的搜索提供方，跳过价格抓取")
+        if store is None:
+            if fetch:
+                for material, result in self.finder.prices(materials, timeout=self._fetch_timeout()).items():
+                    if result.price_per_unit is not None:
+                        prices[material] = result.price_per_unit
+            return prices
+        if fetch:
+            try:
+                store.refresh(self.finder, materials, timeout=self._fetch_timeout())
+            except Exception as e:
+                print(f"⚠️ 材料价格刷新失败，沿用价格库中的最近价格: {e}")
+        for material in materials:
+            point = store.latest(material)
+            if point is not None:
+                prices[material] = point.price
+        return prices
+
+    def _prices_as_of(self, materials: List[str], as_of: str) -> Dict[str, float]:
+        store = self.store
+        if store is None:
+            raise RuntimeError("按历史日期计价需要材料价格库（MATERIAL_PRICE_STORE_ENABLED=true）")
+        prices = {}
+        for material in materials:
+            point = store.as_of(material, as_of)
+            if point is not None:
+                prices[material] = point.price
+        return prices
+
+    def run(self, process: str, alloy: Optional[str] = None, as_of: Optional[str] = None) -> float:
+        """
+        估算原材料成本
+
+        Args:
+            process: 工艺类型（只有目录中计入原材料的工艺返回非零值）
+            alloy: 合金牌号
+            as_of: 按价格库中截至该时间的价格计价（重算历史报价）；缺省为当前价格
+
+        Returns:
+            原材料成本（CNY/kg）
+        """
+        if get_process_catalog().plan_rule(process, "material").get("mode") == "static":
+            return 0.0
+        alloy, composition = self.composition(alloy)
+        materials = list(composition)
+
+        try:
+            found = self._prices_as_of(materials, as_of) if as_of else self._current_prices(materials)
+        except Exception as e:
+            print(f"⚠️ 材料价格获取失败: {e}")
+            found = {}
+        missing = [m for m in materials if m not in found]
+        if missing:
+            # 离线时同样标记：兜底价格不是真实价格，不得写入缓存 / 记忆 / 报价库
+            report_fallback(self.name, f"未取得价格，使用兜底值: {', '.join(missing)}")
+
+        prices = {**DEFAULT_PRICES, **found}
+        cost = sum(prices[m] * share for m, share in composition.items())
+        print(f"🧱 {process} 原材料 {alloy}{f' @ {as_of}' if as_of else ''}: {cost:.2f} CNY/kg")
+        return round(cost, 2)
+
+    def as_tool(self) -> StructuredTool:
+        return StructuredTool.from_function(
+            func=self.run,
+            name=self.name,
+            description=self.description,
+            args_schema=MaterialCostArgs
+        )
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+process_catalog.py
+数据驱动的工艺目录（config/process_catalog.json）与多模式匹配器
+
+- 目录中每个工艺带中/英文别名、OP 工序号约定和兜底默认值
+- 所有别名编译进一个 Aho-Corasick 自动机，工艺提取与消息长度成线性，
+  与目录规模无关
+- 英文别名要求单词边界（"op" 不会命中 "shop" / "cooperation"，但能命中 "OP10"）
+- 每个 (工艺, 成本维度) 的取值规则（plan）供 cost_planner 决定是否调用 LLM
+"""
+
+import os
+import json
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+
+DEFAULT_CATALOG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "process_catalog.json"
+)
+
+
+def _is_ascii_letter(ch: str) -> bool:
+    return "a" <= ch <= "z"
+
+
+class AhoCorasick:
+    """多模式字符串匹配自动机（模式需预先小写化）"""
+
+    def __init__(self, patterns: Dict[str, Any]):
+        """
+        Args:
+            patterns: {模式串: 值}
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]   # (模式长度, 值)
+
+        for pattern, value in patterns.items():
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(pattern), value))
+
+        # BFS 构建失败指针，并把失败链上的输出合并到当前节点
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """逐个返回 (起始位置, 结束位置, 值)"""
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, value in out[node]:
+                yield i - length + 1, i + 1, value
+
+
+class ProcessCatalog:
+    """工艺目录"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._order: Dict[str, int] = {}
+        patterns: Dict[str, Tuple[str, bool]] = {}
+        for i, entry in enumerate(data.get("processes", [])):
+            key = entry["key"]
+            self._entries[key] = entry
+            self._order[key] = i
+            for alias in [key.replace("_", " "), *entry.get("aliases", [])]:
+                alias = alias.lower().strip()
+                if alias:
+                    # 值：(工艺, 是否需要英文单词边界)
+                    patterns.setdefault(alias, (key, alias.isascii()))
+        self._matcher = AhoCorasick(patterns)
+        self.default_processes = [e["key"] for e in data.get("processes", []) if e.get("default")]
+        self.plan_defaults: Dict[str, Any] = data.get("plan_defaults", {})
+        self.volume_adjustment_by_tier: Dict[str, float] = data.get("volume_adjustment_by_tier", {})
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "ProcessCatalog":
+        path = path or os.getenv("PROCESS_CATALOG_PATH") or DEFAULT_CATALOG_PATH
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def default(self, process: str, dimension: str, fallback: float) -> float:
+        """某工艺某成本维度的兜底默认值（CNY/kg）"""
+        entry = self._entries.get(process.lower())
+        if entry is None:
+            return fallback
+        return float(entry.get("defaults", {}).get(dimension, fallback))
+
+    def plan_rule(self, process: str, dimension: str) -> Dict[str, Any]:
+        """
+        某工艺某成本维度的取值规则，统一为 {"mode": ..., ...}
+
+        工艺自身 plan > 目录 plan_defaults > {"mode": "llm"}；规则可简写为模式名字符串。
+        """
+        entry = self._entries.get(process.lower()) or {}
+        rule = entry.get("plan", {}).get(dimension) or self.plan_defaults.get(dimension) or "llm"
+        return {"mode": rule} if isinstance(rule, str) else dict(rule)
+
+    @staticmethod
+    def _at_word_boundary(text: str, start: int, end: int) -> bool:
+        if start > 0 and _is_ascii_letter(text[start - 1]):
+            return False
+        if end < len(text) and _is_ascii_letter(text[end]):
+            # 允许英文复数（castings / processes）
+            if text[end] == "s" and (end + 1 == len(text) or not _is_ascii_letter(text[end + 1])):
+                return True
+            return False
+        return True
+
+    def match(self, text: str) -> List[str]:
+        """
+        提取文本中提到的工艺（按工艺流程顺序去重）
+
+        重叠命中取最左最长（"die casting" 优先于 "casting"，"气密检测" 优先于 "检测"）
+        """
+        text = text.lower()
+        hits = []
+        for start, end, (key, needs_boundary) in self._matcher.iter_matches(text):
+            if needs_boundary and not self._at_word_boundary(text, start, end):
+                continue
+            hits.append((start, -(end - start), end, key))
+        hits.sort()
+
+        found = set()
+        last_end = 0
+        for start, _, end, key in hits:
+            if start < last_end:
+                continue
+            found.add(key)
+            last_end = end
+        return sorted(found, key=self._order.__getitem__)
+
+    def extract(self, text: str) -> List[str]:
+        """提取工艺；未提及任何工艺时返回默认工艺列表"""
+        return self.match(text) or list(self.default_processes)
+
+
+_default_catalog: Optional[ProcessCatalog] = None
+
+
+def get_process_catalog() -> ProcessCatalog:
+    """进程内共享的工艺目录（首次调用时加载并编译匹配器）"""
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = ProcessCatalog.from_file()
+    return _default_catalog
@@ -9,6 +9,27 @@ from langchain_core.tools import StructuredTool
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 
+from .consensus import estimate
+from .circuit_breaker import report_fallback
+from .process_catalog import get_process_catalog
+
+
+def volume_tier(volume: int) -> str:
+    """
+    产量档位（与提示词中的规模效应区间一致）
+
+    Returns:
+        "small" (≤10万) / "medium" (10-50万) / "large" (50-100万) / "xlarge" (>100万)
+    """
+    if volume > 1000000:
+        return "xlarge"
+    elif volume > 500000:
+        return "large"
+    elif volume > 100000:
+        return "medium"
+    else:
+        return "small"
+
 
 class ProductionVolumeArgs(BaseModel):
     process: str = Field(..., description="工艺名称")
@@ -60,23 +81,15 @@ class ProductionVolumeTool:
 """)
         
         try:
-            response = self.llm.invoke(prompt.format(process=process, volume=volume))
-            content = response.content.strip()
-            adjustment = float(content.split('\n')[0].strip())
+            adjustment = estimate(self.llm, prompt.format(process=process, volume=volume))
             print(f"📈 {process} 产量影响: {adjustment:+.2f} CNY/kg")
             return round(adjustment, 2)
             
         except Exception as e:
             print(f"⚠️ LLM推理失败: {e}")
-            # 简单规则
-            if volume > 1000000:
-                return -0.30
-            elif volume > 500000:
-                return -0.15
-            elif volume > 100000:
-                return 0.0
-            else:
-                return 0.20
+            report_fallback(self.name, e)
+            # 按产量档位取工艺目录中的兜底值（volume_adjustment_by_tier）
+            return float(get_process_catalog().volume_adjustment_by_tier.get(volume_tier(volume), 0.0))
     
     def as_tool(self) -> StructuredTool:
         return StructuredTool.from_function(
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+region_rates.py
+本地地区费率数据表（工业电价/水价/天然气/制造业工资）与地点解析索引
+
+- 数据来自 config/region_rates.json（可用 REGION_RATES_PATH 覆盖）
+- 通过别名索引 + 前缀索引，将自由文本地点（中/英文）解析为省/市，
+  解析结果缓存，重复查询为一次字典命中
+"""
+
+import os
+import re
+import json
+import bisect
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+
+DEFAULT_RATES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "region_rates.json"
+)
+
+# 英文地点中无区分意义的词
+_STOPWORDS = {"china", "prc", "pr", "province", "city", "shi", "sheng", "district", "new", "area", "zone", "cn"}
+
+_CJK_RUN = re.compile(r"[一-鿿]+")
+_ASCII_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class RegionRates:
+    """某一地区的费率（城市数据覆盖省级数据，缺省项取省级/全国值）"""
+    province: Optional[str]
+    province_zh: Optional[str]
+    city: Optional[str]
+    city_zh: Optional[str]
+    electricity: float      # CNY/kWh
+    water: float            # CNY/t
+    gas: float              # CNY/m³
+    wage: float             # CNY/月
+    national: Tuple[float, float, float, float]
+
+    @property
+    def matched(self) -> bool:
+        return self.province is not None
+
+    @property
+    def canonical(self) -> str:
+        """规范化地点名，如 'Ningbo, Zhejiang'；未匹配时为 'China'"""
+        if self.city:
+            return f"{self.city}, {self.province}"
+        return self.province or "China"
+
+    @property
+    def display(self) -> str:
+        if not self.matched:
+            return "全国平均"
+        return " ".join(x for x in (self.province_zh, self.city_zh) if x)
+
+    def energy_factor(self) -> float:
+        """能源价格相对全国均值的系数（电 0.7 / 气 0.2 / 水 0.1 加权）"""
+        elec, water, gas, _ = self.national
+        return 0.7 * self.electricity / elec + 0.2 * self.gas / gas + 0.1 * self.water / water
+
+    def wage_factor(self) -> float:
+        """工资水平相对全国均值的系数"""
+        return self.wage / self.national[3]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "canonical": self.canonical,
+            "province": self.province,
+            "city": self.city,
+            "electricity": self.electricity,
+            "water": self.water,
+            "gas": self.gas,
+            "wage": self.wage,
+        }
+
+
+def _norm_ascii(text: str) -> str:
+    return "".join(_ASCII_TOKEN.findall(text.lower().replace("'", "")))
+
+
+class RegionIndex:
+    """地点解析索引：别名精确匹配 → 中文子串扫描 → 英文前缀匹配"""
+
+    def __init__(self, data: Dict[str, Any]):
+        national = data["national"]
+        self._national = (
+            float(national["electricity"]), float(national["water"]),
+            float(national["gas"]), float(national["wage"]),
+        )
+        self._provinces: Dict[str, Dict[str, Any]] = data.get("provinces", {})
+        self._cities: Dict[str, Dict[str, Any]] = data.get("cities", {})
+
+        # alias -> [(kind, key)]，kind 为 "city" 或 "province"
+        self._aliases: Dict[str, List[Tuple[str, str]]] = {}
+        for key, p in self._provinces.items():
+            self._add_aliases("province", key, [key, p.get("zh"), p.get("en"), *p.get("aliases", [])])
+        for key, c in self._cities.items():
+            self._add_aliases("city", key, [c.get("zh"), c.get("en"), *c.get("aliases", [])])
+
+        self._cjk_lengths = sorted(
+            {len(a) for a in self._aliases if _CJK_RUN.fullmatch(a)}, reverse=True
+        )
+        self._ascii_keys = sorted(a for a in self._aliases if not _CJK_RUN.search(a))
+        self._cache: Dict[str, RegionRates] = {}
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "RegionIndex":
+        path = path or os.getenv("REGION_RATES_PATH") or DEFAULT_RATES_PATH
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _add_aliases(self, kind: str, key: str, names: List[Optional[str]]) -> None:
+        for name in names:
+            if not name:
+                continue
+            alias = name if _CJK_RUN.fullmatch(name) else _norm_ascii(name)
+            if len(alias) < 2:
+                continue
+            entries = self._aliases.setdefault(alias, [])
+            if (kind, key) not in entries:
+                entries.append((kind, key))
+
+    # ------------------------------------------------------------------
+    def _scan(self, location: str) -> List[Tuple[str, str]]:
+        """收集地点文本中命中的所有 (kind, key)，按出现顺序"""
+        text = location.lower()
+        hits: List[Tuple[str, str]] = []
+
+        # 1. 中文：在每个中文片段内做最长别名匹配
+        for run in _CJK_RUN.findall(text):
+            i = 0
+            while i < len(run):
+                for n in self._cjk_lengths:
+                    entries = self._aliases.get(run[i:i + n])
+                    if entries:
+                        hits.extend(entries)
+                        i += n
+                        break
+                else:
+                    i += 1
+
+        # 2. 英文：单词及相邻双词拼接（inner mongolia / xi an）精确匹配，失败再做唯一前缀匹配
+        tokens = [t for t in _ASCII_TOKEN.findall(text.replace("'", "")) if t not in _STOPWORDS]
+        i = 0
+        while i < len(tokens):
+            pair = tokens[i] + tokens[i + 1] if i + 1 < len(tokens) else None
+            if pair and pair in self._aliases:
+                hits.extend(self._aliases[pair])
+                i += 2
+                continue
+            token = tokens[i]
+            if token in self._aliases:
+                hits.extend(self._aliases[token])
+            elif len(token) >= 3:
+                hits.extend(self._prefix_lookup(token))
+            i += 1
+        return hits
+
+    def _prefix_lookup(self, token: str) -> List[Tuple[str, str]]:
+        pos = bisect.bisect_left(self._ascii_keys, token)
+        found: List[Tuple[str, str]] = []
+        while pos < len(self._ascii_keys) and self._ascii_keys[pos].startswith(token):
+            for entry in self._aliases[self._ascii_keys[pos]]:
+                if entry not in found:
+                    found.append(entry)
+            pos += 1
+        # 前缀有歧义时放弃，避免误判
+        return found if len(found) == 1 else []
+
+    def _build(self, province_key: Optional[str], city_key: Optional[str]) -> RegionRates:
+        elec, water, gas, wage = self._national
+        province = self._provinces.get(province_key, {}) if province_key else {}
+        city = self._cities.get(city_key, {}) if city_key else {}
+
+        def pick(field: str, default: float) -> float:
+            return float(city.get(field, province.get(field, default)))
+
+        return RegionRates(
+            province=province.get("en"),
+            province_zh=province.get("zh"),
+            city=city.get("en"),
+            city_zh=city.get("zh"),
+            electricity=pick("electricity", elec),
+            water=pick("water", water),
+            gas=pick("gas", gas),
+            wage=pick("wage", wage),
+            national=self._national,
+        )
+
+    def resolve(self, location: Optional[str]) -> RegionRates:
+        """
+        解析地点文本，返回该地区费率；无法识别时返回全国平均值（matched=False）
+
+        Args:
+            location: 自由文本地点，如 'Ningbo, Zhejiang'、'浙江省宁波市北仑区'
+        """
+        key = (location or "").strip()
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        hits = self._scan(key) if key else []
+        provinces = [k for kind, k in hits if kind == "province"]
+        cities = [k for kind, k in hits if kind == "city"]
+
+        city_key = None
+        if cities:
+            # 同名城市（如台州/泰州的英文 Taizhou）用已识别的省份消歧
+            in_province = [c for c in cities if self._cities[c].get("province") in provinces]
+            city_key = (in_province or cities)[0]
+        province_key = self._cities[city_key]["province"] if city_key else (provinces[0] if provinces else None)
+
+        rates = self._build(province_key, city_key)
+        if len(self._cache) >= 4096:
+            self._cache.clear()
+        self._cache[key] = rates
+        return rates
+
+
+_default_index: Optional[RegionIndex] = None
+
+
+def get_region_index() -> RegionIndex:
+    """进程内共享的地区索引（首次调用时加载数据表）"""
+    global _default_index
+    if _default_index is None:
+        _default_index = RegionIndex.from_file()
+    return _default_index
+
+
+def resolve_location(location: Optional[str]) -> RegionRates:
+    return get_region_index().resolve(location)
+
+
+if __name__ == "__main__":
+    for loc in ["Ningbo, Zhejiang", "浙江省宁波市北仑区", "Taizhou, Jiangsu", "chengdu", "Xi'an", "Mars"]:
+        r = resolve_location(loc)
+        print(f"{loc!r:24} -> {r.canonical:22} 电价 {r.electricity:.2f}  工资 {r.wage:.0f}")
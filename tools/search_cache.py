@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+search_cache.py
+网页搜索结果缓存（Tavily / DuckDuckGo 等，进程内共享，线程安全）
+
+- key = (提供方, 规范化查询, 参数)：查询做 NFKC、小写、空白折叠，参数按名称排序
+- 有结果的条目缓存 SEARCH_CACHE_TTL_SECONDS；空结果按较短的 SEARCH_CACHE_NEGATIVE_TTL_SECONDS 缓存
+  （避免反复为无结果的查询付费，又不会长期屏蔽新出现的结果）
+- 同一 key 的并发请求只发起一次搜索，其余调用方等待同一结果（同步线程与 asyncio 调用方都适用）
+- 搜索失败不缓存，异常传给所有等待者
+- 容量有上限（LRU 淘汰）
+
+联网工具加入 agent.py 的 tools 列表前用 cached_search_tool() 包装即可共享缓存。
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+
+SearchKey = str
+
+
+def normalize_query(query: str) -> str:
+    """NFKC + 小写 + 空白折叠（全角/半角、大小写、多余空格不同的查询视为同一查询）"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def is_empty_result(result: Any) -> bool:
+    """空结果：None、空列表，或 Tavily 风格的 {"results": []}"""
+    if result is None:
+        return True
+    if isinstance(result, dict) and "results" in result:
+        return not result["results"]
+    if isinstance(result, (list, tuple, str)):
+        return not result
+    return False
+
+
+class SearchCache:
+    """搜索结果缓存（TTL + 负缓存 + 并发去重）"""
+
+    def __init__(
+        self,
+        ttl: float = 86400.0,
+        negative_ttl: float = 600.0,
+        max_entries: int = 2000,
+        is_empty: Callable[[Any], bool] = is_empty_result,
+    ):
+        """
+        Args:
+            ttl: 有结果条目的缓存时长
+            negative_ttl: 空结果条目的缓存时长
+            max_entries: 最大条目数（LRU 淘汰）
+            is_empty: 判断结果是否为空
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.is_empty = is_empty
+        self._entries: "OrderedDict[SearchKey, Tuple[Any, float, bool]]" = OrderedDict()   # → (结果, 写入时间, 是否为空)
+        self._inflight: Dict[SearchKey, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.deduped = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "SearchCache":
+        env = lambda key, default: os.getenv(f"SEARCH_CACHE_{key}", default)
+        return cls(
+            ttl=float(env("TTL_SECONDS", "86400")),
+            negative_ttl=float(env("NEGATIVE_TTL_SECONDS", "600")),
+            max_entries=int(env("MAX_ENTRIES", "2000")),
+        )
+
+    @staticmethod
+    def key(provider: str, query: str, **params: Any) -> SearchKey:
+        return "|".join([provider, normalize_query(query), json.dumps(params, sort_keys=True, default=str)])
+
+    # ---------- 内部 ----------
+    def _lookup(self, key: SearchKey) -> Tuple[bool, Any, Optional[Future], bool]:
+        """
+        Returns:
+            (命中, 结果, 等待中的 Future, 是否由本调用方发起搜索)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, stored_at, empty = entry
+                if now - stored_at <= (self.negative_ttl if empty else self.ttl):
+                    self._entries.move_to_end(key)
+                    if empty:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return True, result, None, False
+                del self._entries[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduped += 1
+                return False, None, future, False
+            self.misses += 1
+            future = self._inflight[key] = Future()
+            return False, None, future, True
+
+    def _finish(self, key: SearchKey, future: Future, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None:
+                self._entries[key] = (result, time.time(), self.is_empty(result))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self.errors += 1
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    # ---------- 调用入口 ----------
+    def search(self, provider: str, query: str, fn: Callable[[], Any], **params: Any) -> Any:
+        """
+        同步搜索：命中直接返回；同一 key 已有搜索进行中时等待其结果；否则调用 fn() 并缓存
+
+        Args:
+            provider: 提供方（tavily / ddgs / ...），参与 key
+            fn: 实际执行搜索的无参函数
+            params: 影响结果的搜索参数（max_results 等），参与 key
+        """
+        key = self.key(provider, query, **params)
+        hit, result, future, leader = self._lookup(key)
+        if hit:
+            return result
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def asearch(self, provider: str, query: str, fn: Callable[[], Awaitable[Any]], **params: Any) -> Any:
+        """异步版本：fn 返回协程；等待其他调用方（含其他线程 / 事件循环）的同一搜索时不阻塞事件循环"""
+        key = self.key(provider, query, **params)
+        hit, result, future, leader = self._lookup(key)
+        if hit:
+            return result
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.hits + self.negative_hits + self.deduped
+        total = served + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "deduped": self.deduped,
+            "misses": self.misses,
+            "hit_rate": round(served / total, 3) if total else None,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+        }
+
+
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """进程内共享的搜索缓存（SEARCH_CACHE_ENABLED=false 时为 None）"""
+    global _search_cache
+    if os.getenv("SEARCH_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SearchCache.from_env()
+    return _search_cache
+
+
+def cached_search(provider: str, query: str, fn: Callable[[], Any], **params: Any) -> Any:
+    """经共享缓存执行同步搜索（缓存关闭时直接调用 fn）"""
+    cache = get_search_cache()
+    return fn() if cache is None else cache.search(provider, query, fn, **params)
+
+
+async def acached_search(provider: str, query: str, fn: Callable[[], Awaitable[Any]], **params: Any) -> Any:
+    """经共享缓存执行异步搜索（缓存关闭时直接 await fn()）"""
+    cache = get_search_cache()
+    return await fn() if cache is None else await cache.asearch(provider, query, fn, **params)
+
+
+def cached_search_tool(tool: BaseTool, provider: Optional[str] = None, query_field: str = "query") -> StructuredTool:
+    """
+    包装搜索类 LangChain 工具（如 TavilySearch），调用经共享搜索缓存
+
+    Args:
+        tool: 原工具（参数中含查询字段）
+        provider: 缓存 key 中的提供方，缺省为工具名
+        query_field: 查询参数名
+    """
+    provider = provider or tool.name
+
+    def run(**kwargs: Any) -> Any:
+        params = {k: v for k, v in kwargs.items() if k != query_field and v is not None}
+        return cached_search(provider, kwargs[query_field], lambda: tool.invoke(kwargs), **params)
+
+    return StructuredTool.from_function(
+        func=run,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+step_geometry.py
+STEP 装配体逐实体（solid）测量，内存占用有上限
+
+- 按实体（MANIFOLD_SOLID_BREP 及其子类型）逐个转换（TransferEntity），测量后立即 ClearShapes()
+  释放 OpenCascade 形状；峰值 ≈ STEP 实体图 + 最大单个实体的 B-rep（单根装配也不会整体构建）
+- 每个实体只转换、测量一次，数量由 STEP 引用关系推算（装配 NAUO、MAPPED_ITEM、同一零件的表示关联）；
+  文件中找不到实体类型（如纯曲面模型）时退回按根转换
+- 不构造 cadquery Workplane，不物化整张面列表
+- 逐实体采样进程 RSS，报告峰值内存
+- 几何指纹（体积/表面积/包围盒/主惯性矩取有效数字）用于装配体内相同零件去重；
+  图纸级指纹（drawing_fingerprint）由逐实体指纹（含面/边数）× 数量构成，用于识别改名或重新导出的图纸，
+  普通解析与大文件模式得到相同结果
+"""
+
+import gc
+import math
+import hashlib
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from OCP.STEPControl import STEPControl_Reader
+    from OCP.IFSelect import IFSelect_RetDone
+    from OCP.TopExp import TopExp, TopExp_Explorer
+    from OCP.TopAbs import TopAbs_SOLID, TopAbs_FACE, TopAbs_EDGE
+    from OCP.TopLoc import TopLoc_Location
+    from OCP.TopTools import TopTools_IndexedMapOfShape
+    from OCP.GProp import GProp_GProps
+    from OCP.BRepGProp import BRepGProp
+    from OCP.Bnd import Bnd_Box
+    from OCP.BRepBndLib import BRepBndLib
+    from OCP.StepRepr import (
+        StepRepr_MappedItem, StepRepr_NextAssemblyUsageOccurrence, StepRepr_Representation,
+        StepRepr_ShapeRepresentationRelationship, StepRepr_ShapeRepresentationRelationshipWithTransformation,
+    )
+    from OCP.StepShape import StepShape_ManifoldSolidBrep, StepShape_ShapeDefinitionRepresentation
+    OCP_AVAILABLE = True
+except ImportError:
+    OCP_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+
+# ==================== 内存 ====================
+def current_rss_mb() -> Optional[float]:
+    """当前进程常驻内存（MiB）；Linux 读 /proc，其他平台退回历史峰值"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+class RssTracker:
+    """逐步采样 RSS，记录基线与峰值"""
+
+    def __init__(self):
+        self.baseline = current_rss_mb()
+        self.peak = self.baseline
+
+    def sample(self) -> None:
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        delta = None if self.peak is None or self.baseline is None else self.peak - self.baseline
+        return {
+            "peak_rss_mb": None if self.peak is None else round(self.peak, 1),
+            "rss_delta_mb": None if delta is None else round(delta, 1),
+        }
+
+
+# ==================== 几何 ====================
+def principal_moments(m: List[List[float]]) -> Tuple[float, float, float]:
+    """对称 3×3 惯性矩阵的特征值（主惯性矩，降序），与零件摆放方向无关"""
+    p1 = m[0][1] ** 2 + m[0][2] ** 2 + m[1][2] ** 2
+    trace = m[0][0] + m[1][1] + m[2][2]
+    if p1 == 0:
+        return tuple(sorted((m[0][0], m[1][1], m[2][2]), reverse=True))
+    q = trace / 3
+    p2 = (m[0][0] - q) ** 2 + (m[1][1] - q) ** 2 + (m[2][2] - q) ** 2 + 2 * p1
+    p = math.sqrt(p2 / 6)
+    b = [[(m[i][j] - (q if i == j else 0.0)) / p for j in range(3)] for i in range(3)]
+    det_b = (
+        b[0][0] * (b[1][1] * b[2][2] - b[1][2] * b[2][1])
+        - b[0][1] * (b[1][0] * b[2][2] - b[1][2] * b[2][0])
+        + b[0][2] * (b[1][0] * b[2][1] - b[1][1] * b[2][0])
+    )
+    phi = math.acos(max(-1.0, min(1.0, det_b / 2))) / 3
+    e1 = q + 2 * p * math.cos(phi)
+    e3 = q + 2 * p * math.cos(phi + 2 * math.pi / 3)
+    return (e1, trace - e1 - e3, e3)
+
+
+def _sig(value: float, digits: int) -> str:
+    """保留有效数字的规范化字符串（-0 与 0 视为相同）"""
+    text = f"{value:.{digits - 1}e}"
+    return "0" if float(text) == 0 else text
+
+
+@dataclass(slots=True)
+class SolidGeometry:
+    """单个实体（solid）的测量结果，单位 mm / mm² / mm³"""
+    index: int
+    volume: float
+    surface_area: float
+    bbox: Tuple[float, float, float]       # 包围盒边长，降序
+    inertia: Tuple[float, float, float]    # 主惯性矩（按体积归一化，mm²），降序
+    faces: int
+    edges: int
+    quantity: int = 1
+    solids: int = 1
+
+    def fingerprint(self, digits: int = 4, topology: bool = False) -> str:
+        """
+        几何指纹：各量保留 digits 位有效数字后取哈希
+
+        与零件摆放无关（包围盒边长排序、惯性矩取主值），不同 CAD 导出的微小数值误差被舍入吸收。
+        topology=True 时再加入面/边/实体数（图纸级指纹）。
+        """
+        values = (self.volume, self.surface_area, *self.bbox, *self.inertia)
+        canonical = ",".join(_sig(v, digits) for v in values)
+        if topology:
+            canonical += f"|{self.faces},{self.edges},{self.solids}"
+        return hashlib.sha1(canonical.encode("ascii")).hexdigest()[:16]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "volume": round(self.volume, 2),
+            "surface_area": round(self.surface_area, 2),
+            "bbox": [round(x, 2) for x in self.bbox],
+            "faces": self.faces,
+            "edges": self.edges,
+            "quantity": self.quantity,
+        }
+
+
+def _count(shape, kind) -> int:
+    shapes = TopTools_IndexedMapOfShape()
+    TopExp.MapShapes_s(shape, kind, shapes)
+    return shapes.Extent()
+
+
+def measure_solid(shape, index: int = 0) -> SolidGeometry:
+    """测量单个实体（或整张图纸的复合体）：体积、表面积、包围盒、主惯性矩、面/边/实体数"""
+    vprops = GProp_GProps()
+    BRepGProp.VolumeProperties_s(shape, vprops)
+    volume = vprops.Mass()
+
+    sprops = GProp_GProps()
+    BRepGProp.SurfaceProperties_s(shape, sprops)
+
+    box = Bnd_Box()
+    BRepBndLib.Add_s(shape, box)
+    xmin, ymin, zmin, xmax, ymax, zmax = box.Get()
+
+    mat = vprops.MatrixOfInertia()
+    matrix = [[mat.Value(i, j) for j in (1, 2, 3)] for i in (1, 2, 3)]
+    scale = volume if volume else 1.0
+    moments = principal_moments(matrix)
+
+    return SolidGeometry(
+        index=index,
+        volume=volume,
+        surface_area=sprops.Mass(),
+        bbox=tuple(sorted((xmax - xmin, ymax - ymin, zmax - zmin), reverse=True)),
+        inertia=tuple(m / scale for m in moments),
+        faces=_count(shape, TopAbs_FACE),
+        edges=_count(shape, TopAbs_EDGE),
+        solids=max(1, _count(shape, TopAbs_SOLID)),
+    )
+
+
+def solids_of(shape, start_index: int = 0, tracker: Optional[RssTracker] = None) -> List[SolidGeometry]:
+    """测量形状内的各实体；共享同一 TShape 的实例只测量一次，quantity 为实例数"""
+    identity = TopLoc_Location()
+    seen = TopTools_IndexedMapOfShape()
+    measured: List[SolidGeometry] = []
+    explorer = TopExp_Explorer(shape, TopAbs_SOLID)
+    while explorer.More():
+        solid = explorer.Current().Located(identity)
+        found = seen.FindIndex(solid)
+        if found:
+            measured[found - 1].quantity += 1
+        else:
+            seen.Add(solid)
+            measured.append(measure_solid(solid, start_index + len(measured)))
+            if tracker is not None:
+                tracker.sample()
+        del solid
+        explorer.Next()
+    return measured
+
+
+@dataclass
+class StepUsage:
+    """STEP 模型中与实体数量有关的引用关系（均为实体编号，见 _step_usage）"""
+    solids: Dict[int, List[int]] = field(default_factory=dict)   # 表示 → 其中的实体（solid），按文件顺序
+    product_reps: List[Tuple[int, int]] = field(default_factory=list)   # (产品定义, 表示)：SDR
+    assembly: List[Tuple[int, int]] = field(default_factory=list)       # (父产品定义, 子产品定义)：NAUO
+    rep_links: List[Tuple[int, int]] = field(default_factory=list)      # (零件表示, 同一零件的几何表示)：无变换 SRR
+    mapped: List[Tuple[int, int]] = field(default_factory=list)         # (所在表示, 被映射表示)：MAPPED_ITEM
+
+
+def solid_quantities(usage: StepUsage) -> Dict[int, int]:
+    """
+    每个实体在装配中的实例数 {实体编号: 数量}，按文件顺序
+
+    产品定义的实例数 = 各父装配实例数之和（顶层为 1）；表示的使用次数 = 引用它的产品定义、
+    映射它的表示与关联它的零件表示之和；未被引用的表示按 1 计。
+    """
+    parents: Dict[int, List[int]] = {}
+    for parent, child in usage.assembly:
+        parents.setdefault(child, []).append(parent)
+    users: Dict[int, List[Tuple[str, int]]] = {}
+    for product, rep in usage.product_reps:
+        users.setdefault(rep, []).append(("product", product))
+    for owner, rep in usage.mapped:
+        users.setdefault(rep, []).append(("rep", owner))
+    for part_rep, rep in usage.rep_links:
+        users.setdefault(rep, []).append(("rep", part_rep))
+
+    products: Dict[int, int] = {}
+    reps: Dict[int, int] = {}
+
+    def product_count(product: int, visiting=frozenset()) -> int:
+        if product not in products:
+            above = [p for p in parents.get(product, []) if p not in visiting]
+            products[product] = sum(product_count(p, visiting | {product}) for p in above) if above else 1
+        return products[product]
+
+    def rep_count(rep: int, visiting=frozenset()) -> int:
+        if rep not in reps:
+            total = 0
+            for kind, ref in users.get(rep, []):
+                if kind == "product":
+                    total += product_count(ref)
+                elif ref not in visiting:
+                    total += rep_count(ref, visiting | {rep})
+            reps[rep] = total
+        return reps[rep]
+
+    quantities: Dict[int, int] = {}
+    for rep, solids in usage.solids.items():
+        uses = max(1, rep_count(rep))
+        for solid in solids:
+            quantities[solid] = quantities.get(solid, 0) + uses
+    return dict(sorted(quantities.items()))
+
+
+def _step_usage(model) -> StepUsage:
+    """从 StepData_StepModel 提取实体、表示、产品定义之间的引用关系"""
+    usage = StepUsage()
+    product_reps = set()
+    links = []
+    for number in range(1, model.NbEntities() + 1):
+        entity = model.Value(number)
+        try:
+            if isinstance(entity, StepRepr_Representation):
+                items = entity.Items()
+                for i in range(1, (items.Length() if items is not None else 0) + 1):
+                    item = items.Value(i)
+                    if isinstance(item, StepShape_ManifoldSolidBrep) and model.Number(item):
+                        usage.solids.setdefault(number, []).append(model.Number(item))
+                    elif isinstance(item, StepRepr_MappedItem):
+                        mapped = item.MappingSource().MappedRepresentation()
+                        usage.mapped.append((number, model.Number(mapped)))
+            elif isinstance(entity, StepShape_ShapeDefinitionRepresentation):
+                product = entity.Definition().PropertyDefinition().Definition().ProductDefinition()
+                rep = model.Number(entity.UsedRepresentation())
+                usage.product_reps.append((model.Number(product), rep))
+                product_reps.add(rep)
+            elif isinstance(entity, StepRepr_NextAssemblyUsageOccurrence):
+                usage.assembly.append((model.Number(entity.RelatingProductDefinition()),
+                                       model.Number(entity.RelatedProductDefinition())))
+            elif isinstance(entity, StepRepr_ShapeRepresentationRelationship) \
+                    and not isinstance(entity, StepRepr_ShapeRepresentationRelationshipWithTransformation):
+                links.append((model.Number(entity.Rep1()), model.Number(entity.Rep2())))
+        except (AttributeError, TypeError):
+            continue   # 缺少引用的残缺实体：不影响其余实体的计数
+    # 无变换的 SRR 把零件表示（被 SDR 引用）关联到几何表示；装配层级的关联带变换，已由 NAUO 计数
+    for rep1, rep2 in links:
+        if (rep1 in product_reps) != (rep2 in product_reps):
+            usage.rep_links.append((rep1, rep2) if rep1 in product_reps else (rep2, rep1))
+    return usage
+
+
+def iter_step_solids(file_path: str, tracker: Optional[RssTracker] = None) -> Iterator[SolidGeometry]:
+    """
+    逐实体读取 STEP 文件
+
+    每个实体单独转换、测量后立即释放，quantity 为该实体在装配中的实例数；
+    文件中没有实体类型时退回按根转换（同一根内的重复实例合并为一条记录）。
+    """
+    if not OCP_AVAILABLE:
+        raise ImportError("逐实体解析需要 OCP（随 cadquery 安装）")
+
+    reader = STEPControl_Reader()
+    if reader.ReadFile(file_path) != IFSelect_RetDone:
+        raise ValueError(f"无法读取 STEP 文件: {file_path}")
+
+    model = reader.StepModel()
+    quantities = solid_quantities(_step_usage(model))
+    if not quantities:
+        yield from _iter_roots(reader, tracker)
+        return
+
+    index = 0
+    for number, quantity in quantities.items():
+        # 单独转换一个实体：单位由其所在表示的上下文决定，不依赖装配其余部分
+        reader.TransferEntity(model.Value(number))
+        shape = reader.Shape(reader.NbShapes())
+        measured = solids_of(shape, index, tracker)
+        for solid in measured:
+            solid.quantity *= quantity
+        index += len(measured)
+
+        del shape
+        reader.ClearShapes()
+        yield from measured
+    gc.collect()
+    if tracker is not None:
+        tracker.sample()
+
+
+def _iter_roots(reader, tracker: Optional[RssTracker] = None) -> Iterator[SolidGeometry]:
+    """按根转换（无实体类型的文件）：根处理完后释放其形状再转换下一个根"""
+    index = 0
+    for root in range(1, reader.NbRootsForTransfer() + 1):
+        reader.TransferRoot(root)
+        shape = reader.Shape(reader.NbShapes())
+        # 同一根内相同 TShape 只测一次
+        measured = solids_of(shape, index, tracker)
+        index += len(measured)
+
+        del shape
+        reader.ClearShapes()
+        gc.collect()
+        if tracker is not None:
+            tracker.sample()
+        yield from measured
+
+
+def drawing_fingerprint(solids: Iterable[SolidGeometry]) -> str:
+    """
+    图纸级指纹：逐实体指纹（含面/边数）→ 总数量的有序集合
+
+    与实体顺序、文件名无关；同一零件无论按实例合并（大文件模式）还是分别出现（普通解析模式）
+    都按总数量计，两种解析模式结果一致。
+    """
+    counts: Counter = Counter()
+    for solid in solids:
+        counts[solid.fingerprint(topology=True)] += solid.quantity
+    return _hash_counts(counts)
+
+
+def _hash_counts(counts: Counter) -> str:
+    return hashlib.sha1("|".join(f"{fp}x{n}" for fp, n in sorted(counts.items())).encode("ascii")).hexdigest()[:16]
+
+
+def summarize_solids(solids: Iterator[SolidGeometry], max_detail: int = 500) -> Dict[str, Any]:
+    """
+    汇总逐实体结果（按数量累计总表面积/体积）
+
+    Args:
+        solids: 实体序列（流式消费）
+        max_detail: 结果中保留的逐实体明细上限，超出部分只计入汇总
+    """
+    surface_area = volume = 0.0
+    count = unique = 0
+    detail: List[Dict[str, Any]] = []
+    prints: Counter = Counter()
+    for solid in solids:
+        unique += 1
+        prints[solid.fingerprint(topology=True)] += solid.quantity
+        count += solid.quantity
+        surface_area += solid.surface_area * solid.quantity
+        volume += solid.volume * solid.quantity
+        if len(detail) < max_detail:
+            detail.append(solid.to_dict())
+    return {
+        "surface_area": round(surface_area, 2),
+        "volume": round(volume, 2),
+        "solid_count": count,
+        "unique_solids": unique,
+        "solids": detail,
+        "solids_truncated": max(0, unique - len(detail)),
+        "fingerprint": _hash_counts(prints),
+    }
+
+
+def group_by_fingerprint(solids: Iterator[SolidGeometry], digits: int = 4) -> Dict[str, SolidGeometry]:
+    """
+    按几何指纹合并实体（流式消费），返回 {指纹: 代表实体}，代表实体的 quantity 为总数量
+    """
+    groups: Dict[str, SolidGeometry] = {}
+    for solid in solids:
+        key = solid.fingerprint(digits)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = solid
+        else:
+            group.quantity += solid.quantity
+    return groups
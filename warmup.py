@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+warmup.py
+服务启动后的工具结果缓存预热
+
+- 热点组合 (工艺, 地点, 产量档位) 取自 config/warmup.json（WARMUP_CONFIG），
+  缺省取历史报价库中最常出现的前 WARMUP_TOP_N 个组合
+- 每个组合按调用计划展开，只预热需要调用 LLM 的单元（静态/参数化/记忆化单元本来就不调用）；
+  不依赖地点/几何的维度跨组合去重
+- 令牌桶限速（WARMUP_RATE 次/秒）+ 并发上限（WARMUP_CONCURRENCY），不挤占线上请求的 LLM 配额
+- readiness() 给出预热成功的单元百分比，达到 WARMUP_READY_THRESHOLD 后 /ready 返回 200，
+  负载均衡器据此决定何时放流量；失败的单元不计入（端点故障时不会误报就绪）。
+  预热迟迟达不到阈值时，可用 WARMUP_MAX_SECONDS 设置最长等待，超时后就绪并单独报告 timed_out
+
+config/warmup.json 格式：
+    {"combinations": [{"process": "die_casting", "location": "Ningbo, Zhejiang", "production_volume": 1100000}]}
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agent_types import COST_DIMENSIONS
+from tool_cache import cache_key
+from tools.region_rates import resolve_location
+
+
+DEFAULT_WARMUP_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "warmup.json")
+
+# 各产量档位的代表产量（历史记录缺少产量时使用）
+TIER_VOLUMES = {"small": 50000, "medium": 300000, "large": 800000, "xlarge": 1500000}
+
+# (工艺, 维度, 地点, 产量)
+WarmCell = Tuple[str, str, str, int]
+
+
+class RateLimiter:
+    """令牌桶限速（线程安全）"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: 每秒令牌数；<= 0 表示不限速
+            burst: 桶容量
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """取一个令牌，不足时阻塞等待"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_combinations(config_path: Optional[str] = None, top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    读取热点组合：优先配置文件，否则取历史报价库
+
+    Returns:
+        [{"process", "location", "production_volume"}]
+    """
+    path = config_path or os.getenv("WARMUP_CONFIG") or DEFAULT_WARMUP_CONFIG
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return list(json.load(f).get("combinations", []))
+
+    from storage import get_quote_store
+    top_n = top_n if top_n is not None else int(os.getenv("WARMUP_TOP_N", "50"))
+    return [
+        {
+            "process": row["process"],
+            "location": row["location"],
+            "production_volume": row["production_volume"] or TIER_VOLUMES.get(row["volume_bucket"], TIER_VOLUMES["medium"]),
+        }
+        for row in get_quote_store().hot_combinations(limit=top_n)
+    ]
+
+
+def expand_cells(combinations: List[Dict[str, Any]], planner=None) -> List[WarmCell]:
+    """
+    把热点组合展开为需要预热的单元（只保留计划中需调用 LLM 的维度，按缓存键去重）
+    """
+    if planner is None:
+        from agent import get_cost_planner
+        planner = get_cost_planner()
+    cells: List[WarmCell] = []
+    seen = set()
+    for combo in combinations:
+        process = combo["process"]
+        location = combo.get("location") or os.getenv("DEFAULT_LOCATION", "Ningbo, Zhejiang")
+        volume = int(combo.get("production_volume") or TIER_VOLUMES["medium"])
+        region = resolve_location(location)
+        plan = planner.plan([process], volume, region)
+        for dimension in COST_DIMENSIONS:
+            step = plan.step(process, dimension)
+            if step.mode != "llm":
+                continue
+            key = cache_key(dimension, process, region.canonical, volume)
+            if key in seen:
+                continue
+            seen.add(key)
+            cells.append((process, dimension, location, volume))
+    return cells
+
+
+class CacheWarmer:
+    """后台缓存预热（限速、有界并发），提供就绪进度"""
+
+    def __init__(
+        self,
+        cells: List[WarmCell],
+        warm: Optional[Callable[[str, str, str, int], Any]] = None,
+        rate: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        ready_threshold: Optional[float] = None,
+        max_wait: Optional[float] = None,
+    ):
+        """
+        Args:
+            cells: 待预热单元（见 expand_cells）
+            warm: 预热单个单元的函数，缺省为 agent.warm_cell
+            rate: 每秒最多发起的 LLM 调用数（WARMUP_RATE，默认 2）
+            concurrency: 并发预热数（WARMUP_CONCURRENCY，默认 4）
+            ready_threshold: 就绪阈值百分比（WARMUP_READY_THRESHOLD，默认 80）
+            max_wait: 开始预热后最多等待多少秒即视为就绪（WARMUP_MAX_SECONDS，缺省不限）
+        """
+        if warm is None:
+            from agent import warm_cell as warm
+        self.cells = list(cells)
+        self.warm = warm
+        self.limiter = RateLimiter(rate if rate is not None else float(os.getenv("WARMUP_RATE", "2")))
+        self.concurrency = concurrency or int(os.getenv("WARMUP_CONCURRENCY", "4"))
+        self.ready_threshold = (
+            ready_threshold if ready_threshold is not None
+            else float(os.getenv("WARMUP_READY_THRESHOLD", "80"))
+        )
+        if max_wait is None and os.getenv("WARMUP_MAX_SECONDS"):
+            max_wait = float(os.getenv("WARMUP_MAX_SECONDS"))
+        self.max_wait = max_wait or None
+        self.done = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _warm_one(self, cell: WarmCell) -> None:
+        self.limiter.acquire()
+        try:
+            self.warm(*cell)
+        except Exception as e:
+            print(f"⚠️ 预热失败 {cell[0]}/{cell[1]}: {e}")
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self.done += 1
+
+    def run(self) -> None:
+        """同步预热全部单元"""
+        self.started_at = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as pool:
+            list(pool.map(self._warm_one, self.cells))
+        self.finished_at = time.time()
+        print(f"🔥 缓存预热完成: {self.done - self.failed}/{len(self.cells)} 个单元, "
+              f"用时 {self.finished_at - self.started_at:.1f}s")
+
+    def start(self) -> "CacheWarmer":
+        """后台线程预热，立即返回"""
+        self._thread = threading.Thread(target=self.run, name="cache-warmer", daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        预热进度：按成功预热的单元计算（失败的单元不算就绪）；
+        设置了 max_wait 时，开始预热超过该时长仍未达到阈值也视为就绪，并标记 timed_out
+
+        Returns:
+            {"ready", "ready_percent", "total", "done", "failed", "finished", "timed_out", "elapsed"}
+        """
+        total = len(self.cells)
+        with self._lock:
+            done, failed = self.done, self.failed
+        percent = 100.0 if total == 0 else round((done - failed) * 100 / total, 1)
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        warm_enough = percent >= self.ready_threshold
+        timed_out = not warm_enough and self.max_wait is not None and self.started_at is not None \
+            and time.time() - self.started_at >= self.max_wait
+        return {
+            "ready": warm_enough or timed_out,
+            "ready_percent": percent,
+            "total": total,
+            "done": done,
+            "failed": failed,
+            "finished": self.finished_at is not None,
+            "timed_out": timed_out,
+            "elapsed": round(elapsed, 3),
+        }
+
+
+def start_warmup(config_path: Optional[str] = None, **kwargs) -> CacheWarmer:
+    """读取热点组合、展开并在后台开始预热"""
+    combinations = load_combinations(config_path)
+    cells = expand_cells(combinations)
+    print(f"🔥 缓存预热: {len(combinations)} 个热点组合 → {len(cells)} 个 LLM 单元")
+    return CacheWarmer(cells, **kwargs).start()